@@ -0,0 +1,109 @@
+"""
+Aggregation run telemetry for the Portfolio Click Tracker
+Times each phase of an aggregation run and persists one row per run
+into aggregation_runs so slowdowns show up as the data grows.
+
+Peak memory is how far the Python heap grew above its size at the start
+of the run, from tracemalloc (the process RSS peak would include every
+earlier run and request). Tracing covers every thread and slows all
+allocations, so it is only on where start_memory_tracing() was called:
+the cron and command-line entry points always, the API process only with
+AGGREGATION_TRACE_MEMORY=true (and there the peak includes ingest threads).
+Without tracing peak_memory_kb stays NULL.
+"""
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+PHASES = ("fetch", "dedupe", "compute", "write")
+
+
+def start_memory_tracing():
+    """Trace Python heap allocations for the rest of the process, so runs report their peak"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+class RunTelemetry:
+    """Collects timing and volume stats for one aggregation run"""
+
+    def __init__(self, target_date, engine):
+        self.target_date = target_date
+        self.engine = engine
+        self.status = "running"
+        self.error = None
+        self.rows_scanned = 0
+        self.rows_filtered = 0
+        self.pageviews = 0
+        self.phase_seconds = {phase: 0.0 for phase in PHASES}
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at = None
+        self._started = time.perf_counter()
+        self.duration_seconds = 0.0
+        self.peak_memory_kb = None
+        self._heap_at_start = None
+        if tracemalloc.is_tracing():
+            # Each run (each backfilled day) measures from its own start
+            tracemalloc.reset_peak()
+            self._heap_at_start = tracemalloc.get_traced_memory()[0]
+
+    @contextmanager
+    def phase(self, name):
+        """Accumulate wall time spent in one phase of the run"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + time.perf_counter() - started
+
+    def sample_memory(self):
+        """Record the heap peak since the run started (finish() does this unless done earlier)"""
+        if self._heap_at_start is not None and tracemalloc.is_tracing():
+            self.peak_memory_kb = max(tracemalloc.get_traced_memory()[1] - self._heap_at_start, 0) // 1024
+            self._heap_at_start = None
+
+    def finish(self, status, error=None):
+        self.status = status
+        self.error = str(error) if error else None
+        self.finished_at = datetime.now(timezone.utc)
+        self.duration_seconds = time.perf_counter() - self._started
+        self.sample_memory()
+
+    def summary_line(self):
+        phases = ", ".join(f"{p} {self.phase_seconds[p]:.3f}s" for p in PHASES)
+        memory = f", peak {self.peak_memory_kb / 1024:.1f}MB" if self.peak_memory_kb is not None else ""
+        return f"⏱️  {self.status} in {self.duration_seconds:.3f}s ({phases}{memory})"
+
+
+def record_run(conn, telemetry):
+    """Persist a finished run into aggregation_runs"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO aggregation_runs
+            (target_date, engine, status, started_at, finished_at, duration_seconds,
+             rows_scanned, rows_filtered, pageviews, fetch_seconds, dedupe_seconds, compute_seconds,
+             write_seconds, peak_memory_kb, error)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (
+            telemetry.target_date,
+            telemetry.engine,
+            telemetry.status,
+            telemetry.started_at,
+            telemetry.finished_at,
+            round(telemetry.duration_seconds, 4),
+            telemetry.rows_scanned,
+            telemetry.rows_filtered,
+            telemetry.pageviews,
+            round(telemetry.phase_seconds["fetch"], 4),
+            round(telemetry.phase_seconds["dedupe"], 4),
+            round(telemetry.phase_seconds["compute"], 4),
+            round(telemetry.phase_seconds["write"], 4),
+            telemetry.peak_memory_kb,
+            telemetry.error,
+        ))
+        conn.commit()
+    finally:
+        cursor.close()
@@ -4,17 +4,34 @@
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
-import hashlib
-from datetime import datetime
-import uvicorn
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
+import time
+from datetime import datetime, date, timedelta
 import threading
+from metrics import REGISTRY, STAGE_DURATION, MetricsMiddleware
+from db_pool import create_pool_from_env, PoolTimeout
+from ip_hash import hash_ip, check_secret as check_ip_hash_secret, cache_info as ip_hash_cache_info
+from dimensions import (DimensionCache, PAGES, REFERRERS, USER_AGENTS, PROJECTS,
+                        EVENT_TYPES, encode_event_type, session_uuid)
+from response_cache import ResponseCache
+import recent_clicks
+from event_bus import EventBus, TooManySubscribers
+import asyncio
+import json
+from jobs import JobRunner
+from rate_limiter import IngestRateLimiter
+from ingest_dedup import IngestDeduplicator
+from bot_filter import BOT_FILTER_MODE, BotFilter, record_bot_click
+from projects import UnknownApiKey, resolve_project, project_filter
+from live_counters import LiveCounters, save_snapshot, load_snapshot
+from leader import LeaderElection
+from downsample import CHART_MAX_POINTS, CHART_MAX_CATEGORIES, lttb, fold_other, top_n
+from labels import page_label
 
 # Create FastAPI app instance
 app = FastAPI(
@@ -23,65 +40,225 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Initialize scheduler
-scheduler = AsyncIOScheduler()
+# APScheduler instance, created (and imported) by start_scheduler()
+scheduler = None
+
+# Which process runs the scheduled jobs:
+#   leader - one worker/replica elected through a Postgres advisory lock (safe with --workers N)
+#   always - every process (single-process deployments without leader election)
+#   off    - none (web-only replicas)
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "leader")
+leader_election = None
+
+# Schema changes run as a separate `python migrate.py` step; set to 1 for local development
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "0") == "1"
 
 # Add CORS middleware to allow requests from Framer website
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins for testing
     allow_credentials=False,  # Set to False when using allow_origins=["*"]
-    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
     allow_headers=["*"],
 )
 
-# Startup event to create database tables and start scheduler
+# Record per-route request latency (outermost so it includes CORS handling)
+app.add_middleware(MetricsMiddleware, route_app=app)
+
+# Shared database connection pool, created lazily on first use
+db_pool = None
+db_pool_lock = threading.Lock()
+
+# Shared cache for the read-only analytics API (one computation per key for all viewers)
+ANALYTICS_CACHE_SECONDS = int(os.getenv("ANALYTICS_CACHE_SECONDS", "60"))
+analytics_cache = ResponseCache(ttl=ANALYTICS_CACHE_SECONDS)
+
+# Live fan-out of newly stored clicks to /api/stream subscribers
+click_stream = EventBus()
+STREAM_KEEPALIVE_SECONDS = 15
+
+# Per-IP / per-session token buckets in front of the database
+ingest_rate_limiter = IngestRateLimiter()
+
+# Recently stored (session, page, tag) events, to drop repeats before insert
+ingest_dedup = IngestDeduplicator()
+
+# Ingest-time bot/crawler filter (rules and counters shared across requests)
+ingest_bot_filter = BotFilter()
+
+# Today's traffic in rolling minute buckets, updated on ingest and snapshotted to Postgres
+live_counters = LiveCounters()
+LIVE_SNAPSHOT_SECONDS = int(os.getenv("LIVE_SNAPSHOT_SECONDS", "60"))
+
+# Aggregation jobs: bounded workers, one active job per date
+aggregation_jobs = JobRunner(max_workers=int(os.getenv("AGGREGATION_WORKERS", "1")))
+# tracemalloc would slow every ingest thread too, so run peak memory is opt-in here
+AGGREGATION_TRACE_MEMORY = os.getenv("AGGREGATION_TRACE_MEMORY", "false").lower() in ("1", "true", "yes")
+
+# Ingest-side caches resolving text dimensions to integer ids
+page_ids = DimensionCache(PAGES)
+referrer_ids = DimensionCache(REFERRERS)
+user_agent_ids = DimensionCache(USER_AGENTS)
+project_ids = DimensionCache(PROJECTS, max_size=1000)
+
+# Startup event to restore state and start scheduler
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database tables and start scheduler on startup"""
+    """Restore live counters and start the scheduler on startup"""
+    started = time.perf_counter()
     print("Starting up Portfolio Click Tracker API...")
+    # Outside the try below: a missing secret in production must stop the process
+    check_ip_hash_secret()
+    if AGGREGATION_TRACE_MEMORY:
+        from aggregation_telemetry import start_memory_tracing
+        start_memory_tracing()
+    if REGISTRY.enabled:
+        overhead = REGISTRY.calibrate_overhead()
+        print(f"📏 Metrics enabled, instrumentation overhead ~{overhead * 1e6:.2f}µs per timer")
     try:
-        create_tables()
-        print("API startup complete!")
+        if MIGRATE_ON_STARTUP:
+            import migrate
+            migrate.migrate_database()
         
-        # Start the scheduler
-        start_scheduler()
-        print("✅ Daily aggregation scheduler started!")
+        # Open the pool before the first beacon
+        try:
+            get_db_pool()
+        except Exception as e:
+            print(f"⚠️  Could not open the database pool: {e}")
+        
+        # Start the scheduler (in the elected leader only, by default)
+        if SCHEDULER_MODE == "leader":
+            start_leader_election(asyncio.get_running_loop())
+        elif SCHEDULER_MODE == "always":
+            restore_live_counters()
+            start_scheduler()
+        else:
+            print("ℹ️  Scheduler disabled in this process (SCHEDULER_MODE=off)")
         
     except Exception as e:
         print(f"Warning: Database initialization failed: {e}")
         print("API will start anyway - database may be created later")
+    print(f"API startup complete in {(time.perf_counter() - started) * 1000:.0f}ms")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean shutdown of scheduler"""
-    print("Shutting down scheduler...")
-    scheduler.shutdown()
-    print("✅ Scheduler stopped")
+    runs_scheduler = scheduler is not None
+    stop_scheduler()
+    aggregation_jobs.shutdown()
+    # Only the process that owns the scheduled snapshot writes one; followers would overwrite it
+    if runs_scheduler:
+        snapshot_live_counters()
+    if leader_election is not None:
+        leader_election.stop()
+    if db_pool is not None:
+        db_pool.close()
+        print("✅ Database pool closed")
+
+def aggregation_job(target_date):
+    """Job body for one date: sessionize, aggregate, refresh views, invalidate cached reads"""
+    def run(job):
+        from daily_aggregator import DailyAggregator
+        summaries = DailyAggregator().run_for_date(target_date, job.check_cancelled)
+        analytics_cache.clear()
+        if summaries is None:
+            return {"date": target_date.isoformat(), "aggregated": False}
+        print(f"✅ Aggregation for {target_date} completed successfully!")
+        return {
+            "date": target_date.isoformat(),
+            "aggregated": True,
+            "projects": {
+                summary["project_name"]: {
+                    "total_clicks": summary["total_clicks"],
+                    "unique_sessions": summary["unique_sessions"],
+                    "avg_time_on_page": summary["avg_time_on_page"]
+                }
+                for summary in summaries
+            }
+        }
+    return run
+
+def submit_aggregation(target_date):
+    """Queue aggregation for a date, coalescing with a queued or running job for the same date"""
+    job, coalesced = aggregation_jobs.submit(("aggregation", target_date),
+                                             f"aggregation {target_date}",
+                                             aggregation_job(target_date))
+    if coalesced:
+        print(f"🔁 Aggregation for {target_date} already {job.status} as job {job.id}")
+    return job, coalesced
 
 def run_daily_aggregation():
     """Run daily aggregation for yesterday only"""
     print(f"🕛 Running daily aggregation at {datetime.now()}")
+    try:
+        submit_aggregation(date.today() - timedelta(days=1))
+    except Exception as e:
+        print(f"❌ Error starting daily aggregation: {e}")
+
+def run_sessionizer():
+    """Incrementally sessionize new click events (runs in the scheduler's thread pool)"""
     try:
         from daily_aggregator import DailyAggregator
-        
-        def run_aggregation():
-            try:
-                aggregator = DailyAggregator()
-                aggregator.run_daily_aggregation(days_back=1)
-                print("✅ Daily aggregation completed successfully!")
-            except Exception as e:
-                print(f"❌ Daily aggregation failed: {e}")
-        
-        thread = threading.Thread(target=run_aggregation)
-        thread.start()
+        DailyAggregator().run_sessionizer()
+    except Exception as e:
+        print(f"❌ Error running sessionizer: {e}")
+
+def snapshot_live_counters():
+    """Persist the in-memory live counters (runs in the scheduler's thread pool)"""
+    try:
+        with get_db_pool().connection() as conn:
+            save_snapshot(conn, live_counters)
+    except Exception as e:
+        print(f"❌ Error saving live counters snapshot: {e}")
 
+def restore_live_counters():
+    """Replace this process's live counters with the last snapshot"""
+    try:
+        with get_db_pool().connection() as conn:
+            # Replace, not merge: a worker regaining leadership already counted part of the snapshot
+            if load_snapshot(conn, live_counters, replace=True):
+                print(f"♻️  Restored live counters ({live_counters.bucket_count} minute buckets)")
     except Exception as e:
-        print(f"❌ Error starting daily aggregation: {e}")
+        print(f"⚠️  Could not restore live counters: {e}")
+
+def start_leader_election(loop):
+    """Compete for scheduler leadership; the winner restores live counters and starts the scheduler"""
+    global leader_election
+    async def start_on_loop():
+        start_scheduler()
+    def on_acquired():
+        restore_live_counters()
+        # AsyncIOScheduler must be started and stopped on the event loop's thread. Wait for it,
+        # so a failed start raises here and LeaderElection hands the lock to a follower.
+        asyncio.run_coroutine_threadsafe(start_on_loop(), loop).result(timeout=30)
+    def on_lost():
+        loop.call_soon_threadsafe(stop_scheduler)
+    db_url = os.getenv("DATABASE_URL") or os.getenv("DB_URL")
+    leader_election = LeaderElection(db_url, on_acquired, on_lost)
+    leader_election.start()
+    print(f"🗳️  Competing for scheduler leadership (pid {os.getpid()})")
+
+def stop_scheduler():
+    """Stop the scheduler if this process is running one"""
+    global scheduler
+    if scheduler is not None:
+        if scheduler.running:
+            print("Shutting down scheduler...")
+            scheduler.shutdown(wait=False)
+            print("✅ Scheduler stopped")
+        scheduler = None
 
 def start_scheduler():
     """Start APScheduler for daily aggregation at 05:30 AM UTC (12:30 AM Central Time)"""
+    global scheduler
+    if scheduler is not None:
+        return
     try:
+        # Imported here so the scheduler's dependencies stay off the import path
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        from apscheduler.triggers.cron import CronTrigger
+        from apscheduler.triggers.interval import IntervalTrigger
+        scheduler = AsyncIOScheduler()
         scheduler.add_job(
             run_daily_aggregation,
             CronTrigger(hour=5, minute=30, timezone='UTC'),
@@ -89,10 +266,31 @@ def start_scheduler():
             name='Daily Analytics Aggregation',
             replace_existing=True
         )
+        scheduler.add_job(
+            run_sessionizer,
+            IntervalTrigger(minutes=int(os.getenv("SESSIONIZE_INTERVAL_MINUTES", "10"))),
+            id='sessionizer',
+            name='Incremental Sessionization',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        scheduler.add_job(
+            snapshot_live_counters,
+            IntervalTrigger(seconds=LIVE_SNAPSHOT_SECONDS),
+            id='live_counters_snapshot',
+            name='Live Counters Snapshot',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
         scheduler.start()
         print("📅 Scheduler configured to run daily at 05:30 AM UTC (12:30 AM Central Time)")
+        print("✅ Daily aggregation scheduler started!")
     except Exception as e:
+        scheduler = None
         print(f"❌ Failed to start scheduler: {e}")
+        raise
 
 # Define Pydantic model for incoming click data
 class ClickEvent(BaseModel):
@@ -102,7 +300,7 @@ class ClickEvent(BaseModel):
     session_id: str = Field(..., description="Unique session identifier")
     referrer: Optional[str] = Field(None, description="Source URL that led to this page")
     user_agent: str = Field(..., description="Browser user agent string")
-    ip: Optional[str] = Field(None, description="Client IP address (optional)")
+    ip: Optional[str] = Field(None, description="Ignored; the client IP is taken from the connection")
 
 # Database connection function
 def get_db_connection():
@@ -119,45 +317,32 @@ def get_db_connection():
         print(f"Database connection error: {e}")
         raise HTTPException(status_code=500, detail="Database connection failed")
 
-# Function to hash IP address for privacy
-def hash_ip(ip_address: str) -> str:
-    """Hash IP address using SHA256 for privacy"""
-    if not ip_address:
-        return None
-    return hashlib.sha256(ip_address.encode()).hexdigest()[:16]
+def get_db_pool():
+    """Return the shared connection pool, creating it on first use"""
+    global db_pool
+    if db_pool is None:
+        with db_pool_lock:
+            if db_pool is None:
+                db_url = os.getenv("DATABASE_URL") or os.getenv("DB_URL")
+                if not db_url:
+                    raise Exception("No database URL found in environment variables")
+                db_pool = create_pool_from_env(db_url)
+    return db_pool
 
-# Function to create database tables if they don't exist
-def create_tables():
-    """Create click_logs table if it doesn't exist"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Create click_logs table
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS click_logs (
-            id SERIAL PRIMARY KEY,
-            page_name TEXT NOT NULL,
-            tag TEXT,
-            time_on_page INTEGER NOT NULL,
-            session_id TEXT NOT NULL,
-            referrer TEXT,
-            user_agent TEXT NOT NULL,
-            ip_hash TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """
-        
-        cursor.execute(create_table_query)
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        print("✓ Database tables created/verified successfully")
-        
-    except Exception as e:
-        print(f"Error creating tables: {e}")
-        # Don't raise - let the app start anyway
+def request_client_ip(request: Request):
+    """
+    Visitor IP for rate limiting, bot rules and ip_hash
+    Behind Railway's proxy uvicorn must run with --proxy-headers and
+    --forwarded-allow-ips so request.client is the visitor from
+    X-Forwarded-For rather than the proxy itself.
+    """
+    return request.client.host if request.client else None
+
+def record_parse_validate(request: Request, endpoint: str):
+    """Record time from request arrival to handler entry (body parsing + validation)"""
+    started = request.scope.get("state", {}).get("metrics_started")
+    if REGISTRY.enabled and started is not None:
+        STAGE_DURATION.observe(time.perf_counter() - started, endpoint=endpoint, stage="parse_validate")
 
 # Health check endpoint
 @app.get("/")
@@ -165,48 +350,126 @@ async def root():
     """Health check endpoint"""
     return {"message": "Portfolio Click Tracker API is running", "status": "healthy"}
 
-# Main click tracking endpoint
+# Main click tracking endpoint (plain def: FastAPI runs it in its thread pool, so pool
+# waits, inserts and commits never block the event loop or the live stream)
 @app.post("/api/track-click")
-async def track_click(click_data: ClickEvent, request: Request):
+def track_click(click_data: ClickEvent, request: Request):
     """
     Track a click event from the portfolio website
     Accepts JSON payload with page info and stores in database
     """
+    record_parse_validate(request, "track_click")
+    timer = REGISTRY.timer
     try:
-        # Get client IP from request if not provided
-        client_ip = click_data.ip or request.client.host
-        ip_hash = hash_ip(client_ip) if client_ip else None
+        # Client IP from the connection only; the body's ip field is not trusted
+        with timer(STAGE_DURATION, endpoint="track_click", stage="ip_hash"):
+            client_ip = request_client_ip(request)
+            ip_hash = hash_ip(client_ip) if client_ip else None
         
-        # Connect to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Floods from one IP or one tab stop here, before any database work
+        with timer(STAGE_DURATION, endpoint="track_click", stage="rate_limit"):
+            limited = ingest_rate_limiter.check(ip_hash, click_data.session_id)
+        if limited:
+            if ingest_rate_limiter.mode == "sample":
+                return {"success": True, "message": "Click sampled out", "dropped": True}
+            raise HTTPException(status_code=429, detail=f"Too many events for this {limited}",
+                                headers={"Retry-After": str(ingest_rate_limiter.retry_after(limited))})
         
-        # Insert click data into click_logs table
+        # Which site this beacon belongs to (API key, then Origin/Referer host)
+        project = resolve_project(request.headers.get("x-api-key"),
+                                  request.headers.get("origin"),
+                                  request.headers.get("referer"))
+        
+        # Crawlers, uptime probes and floods never reach click_logs
+        if BOT_FILTER_MODE != "off":
+            # Rate / zero-time rules count per connection IP (same ip_hash as the rate limiter)
+            with timer(STAGE_DURATION, endpoint="track_click", stage="bot_filter"):
+                bot_reason = ingest_bot_filter.classify(click_data.user_agent, ip_hash, click_data.page_name,
+                                                        click_data.time_on_page, int(time.time() // 60))
+            if bot_reason:
+                if BOT_FILTER_MODE == "side_table":
+                    with get_db_pool().connection() as conn:
+                        record_bot_click(conn, ip_hash, bot_reason, click_data.page_name, click_data.user_agent)
+                return {
+                    "success": True,
+                    "message": "Click tracked successfully",
+                    "filtered": True
+                }
+        
+        # Insert click data into click_logs table (compact row format)
         insert_query = """
         INSERT INTO click_logs (
-            page_name, tag, user_agent, referrer, 
-            session_id, time_on_page, ip_hash
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+            session_id, ip_hash, page_id, referrer_id,
+            user_agent_id, time_on_page, event_type, project_id
+        ) VALUES (%s::uuid, %s, %s, %s, %s, %s, %s, %s)
         RETURNING id, timestamp
         """
         
-        cursor.execute(insert_query, (
-            click_data.page_name,
-            click_data.tag,
-            click_data.user_agent,
-            click_data.referrer,
-            click_data.session_id,
-            click_data.time_on_page,
-            ip_hash
-        ))
+        # Repeats of a recently stored event (reloads, other tabs) add nothing
+        dedup_key = (project, click_data.session_id, click_data.page_name, click_data.tag)
+        if ingest_dedup.is_duplicate(dedup_key, click_data.time_on_page):
+            return {
+                "success": True,
+                "message": "Duplicate event ignored",
+                "duplicate": True
+            }
         
-        # Get the inserted record details
-        result = cursor.fetchone()
+        try:
+            pool = get_db_pool()
+            with timer(STAGE_DURATION, endpoint="track_click", stage="db_acquire"):
+                conn = pool.acquire()
+            try:
+                with timer(STAGE_DURATION, endpoint="track_click", stage="dimensions"):
+                    page_id = page_ids.resolve(conn, click_data.page_name)
+                    referrer_id = referrer_ids.resolve(conn, click_data.referrer)
+                    user_agent_id = user_agent_ids.resolve(conn, click_data.user_agent)
+                    project_id = project_ids.resolve(conn, project)
+                
+                with timer(STAGE_DURATION, endpoint="track_click", stage="insert"):
+                    cursor = conn.cursor()
+                    cursor.execute(insert_query, (
+                        session_uuid(click_data.session_id),
+                        ip_hash,
+                        page_id,
+                        referrer_id,
+                        user_agent_id,
+                        click_data.time_on_page,
+                        encode_event_type(click_data.tag),
+                        project_id
+                    ))
+                
+                    # Get the inserted record details
+                    result = cursor.fetchone()
+                    cursor.close()
+                
+                # Commit transaction and hand the connection back to the pool
+                with timer(STAGE_DURATION, endpoint="track_click", stage="commit"):
+                    conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                pool.release(conn)
+        except Exception:
+            # Not stored, so a client retry must not be treated as a duplicate
+            ingest_dedup.forget(dedup_key, click_data.time_on_page)
+            raise
         
-        # Commit transaction and close connection
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # Exits close a pageview already counted on arrival
+        if encode_event_type(click_data.tag) != EVENT_TYPES["exit"]:
+            live_counters.record(click_data.page_name, click_data.referrer, click_data.user_agent)
+        
+        # Fan out to live stream subscribers (no-op when nobody is listening)
+        click_stream.publish({
+            "id": result["id"],
+            "timestamp": result["timestamp"].isoformat(),
+            "page_name": click_data.page_name,
+            "tag": click_data.tag,
+            "referrer": click_data.referrer,
+            "time_on_page": click_data.time_on_page,
+            "project": project
+        })
         
         return {
             "success": True,
@@ -215,6 +478,13 @@ async def track_click(click_data: ClickEvent, request: Request):
             "timestamp": result["timestamp"].isoformat()
         }
         
+    except HTTPException:
+        raise
+    except UnknownApiKey as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    except PoolTimeout as e:
+        print(f"Database pool exhausted: {e}")
+        raise HTTPException(status_code=503, detail="Database busy, try again")
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         raise HTTPException(status_code=500, detail="Failed to save click data")
@@ -222,61 +492,482 @@ async def track_click(click_data: ClickEvent, request: Request):
         print(f"Unexpected error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Live traffic counters (today's numbers before the nightly aggregation)
+@app.get("/api/live")
+async def live_traffic(minutes: int = 60, top: int = 20):
+    """
+    Pageviews per page, referrer group and device over the last N minutes
+    Served from in-memory counters, no database round-trip
+    """
+    return {
+        "success": True,
+        **live_counters.totals(minutes=max(1, minutes), top=max(1, min(top, 100)))
+    }
+
+# Live click stream (Server-Sent Events)
+@app.get("/api/stream")
+async def stream_clicks(request: Request):
+    """
+    Stream newly tracked clicks as Server-Sent Events
+    Slow consumers are disconnected with an "event: dropped" message
+    """
+    try:
+        subscription = click_stream.subscribe()
+    except TooManySubscribers as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+                yield f"id: {event['id']}\nevent: click\ndata: {json.dumps(event)}\n\n"
+        finally:
+            click_stream.unsubscribe(subscription)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
 # Get recent clicks endpoint (for debugging/testing)
 @app.get("/api/recent-clicks")
-async def get_recent_clicks(limit: int = 10):
+def get_recent_clicks(request: Request, limit: int = recent_clicks.DEFAULT_PAGE_SIZE,
+                      before_id: Optional[int] = None, after_id: Optional[int] = None,
+                      fields: Optional[str] = None, page: Optional[str] = None,
+                      session: Optional[str] = None, tag: Optional[str] = None,
+                      project: Optional[str] = None):
     """
     Get recent click events for debugging purposes
-    Returns last N clicks from the database
+    Newest first, paged by click id: pass next_before_id back as before_id
+    for older clicks, or prev_after_id as after_id for newer ones
     """
+    record_parse_validate(request, "get_recent_clicks")
+    timer = REGISTRY.timer
+    limit = max(1, min(limit, recent_clicks.MAX_PAGE_SIZE))
+    try:
+        selected = recent_clicks.parse_fields(fields)
+        query, params = recent_clicks.build_query(selected, limit, before_id, after_id,
+                                                  page=page, session=session, tag=tag, project=project)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        pool = get_db_pool()
+        with timer(STAGE_DURATION, endpoint="get_recent_clicks", stage="db_acquire"):
+            conn = pool.acquire()
+        try:
+            with timer(STAGE_DURATION, endpoint="get_recent_clicks", stage="query"):
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                clicks = cursor.fetchall()
+                cursor.close()
+            # Read-only, but end the transaction so the pooled connection isn't left idle in one
+            conn.rollback()
+        finally:
+            pool.release(conn)
+    except PoolTimeout as e:
+        print(f"Database pool exhausted: {e}")
+        raise HTTPException(status_code=503, detail="Database busy, try again")
+    except Exception as e:
+        print(f"Error fetching clicks: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch click data")
+    
+    if after_id is not None:
+        clicks.reverse()
+    next_before_id, prev_after_id = recent_clicks.page_cursors(clicks, limit)
+    
+    # Large pages are encoded row by row rather than as one big string
+    if len(clicks) > recent_clicks.STREAM_THRESHOLD:
+        return StreamingResponse(recent_clicks.encode_page(clicks, next_before_id, prev_after_id),
+                                 media_type="application/json")
+    return {
+        "success": True,
+        "clicks": clicks,
+        "count": len(clicks),
+        "next_before_id": next_before_id,
+        "prev_after_id": prev_after_id
+    }
+
+def run_read_query(query, params):
+    """Run a read-only query on a pooled connection and return all rows"""
+    pool = get_db_pool()
+    conn = pool.acquire()
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
-        
-        # Query recent clicks without exposing sensitive data
-        query = """
-        SELECT id, timestamp, page_name, tag, referrer, 
-               time_on_page, session_id
-        FROM click_logs 
-        ORDER BY timestamp DESC 
-        LIMIT %s
-        """
-        
-        cursor.execute(query, (limit,))
-        clicks = cursor.fetchall()
-        
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
         cursor.close()
-        conn.close()
-        
+        conn.rollback()
+        return rows
+    finally:
+        pool.release(conn)
+
+def resolve_date_range(start: Optional[date], end: Optional[date]):
+    """Default to the last 30 days and reject inverted ranges"""
+    end = end or date.today()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+    return start, end
+
+def cached_json_response(request: Request, key, compute):
+    """Serve compute() through the shared TTL cache with ETag / Cache-Control headers"""
+    try:
+        entry = analytics_cache.get_or_compute(key, compute)
+    except PoolTimeout as e:
+        print(f"Database pool exhausted: {e}")
+        raise HTTPException(status_code=503, detail="Database busy, try again")
+    except Exception as e:
+        print(f"Error loading analytics: {e}")
+        raise HTTPException(status_code=500, detail="Failed to load analytics data")
+    
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={ANALYTICS_CACHE_SECONDS}",
+    }
+    if request.headers.get("if-none-match") == entry.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+def category_total(view, column, start, end, project_sql, project_params):
+    """Sum of one dashboard view's count column over a range (for the "(other)" chart row)"""
+    return run_read_query("""
+        SELECT COALESCE(SUM({column}), 0)::int AS total
+        FROM {view}
+        WHERE date BETWEEN %s AND %s{project_sql}
+    """.format(column=column, view=view, project_sql=project_sql), (start, end, *project_params))[0]["total"]
+
+# Analytics read API (backed by the dashboard materialized views)
+@app.get("/api/analytics/summary")
+def analytics_summary(request: Request, start: Optional[date] = None, end: Optional[date] = None,
+                      project: Optional[str] = None, points: int = CHART_MAX_POINTS):
+    """
+    Daily trend, totals and device split for a date range
+    Defaults to the last 30 days and all projects. The daily series is
+    downsampled (LTTB on total_clicks) to at most `points` days; totals
+    always cover every day.
+    """
+    start, end = resolve_date_range(start, end)
+    points = max(3, min(points, 5000))
+    project_sql, project_params = project_filter(project)
+    
+    def compute():
+        daily = run_read_query("""
+            SELECT date, SUM(total_clicks)::int AS total_clicks,
+                   SUM(repeat_visits)::int AS repeat_visits,
+                   ROUND(AVG(avg_time_on_page)::numeric, 2)::float AS avg_time_on_page
+            FROM mv_daily_trend
+            WHERE date BETWEEN %s AND %s{project_sql}
+            GROUP BY date
+            ORDER BY date DESC
+        """.format(project_sql=project_sql), (start, end, *project_params))
+        devices = run_read_query("""
+            SELECT device, SUM(pageviews)::int AS pageviews
+            FROM mv_device_split
+            WHERE date BETWEEN %s AND %s{project_sql}
+            GROUP BY device
+            ORDER BY pageviews DESC
+        """.format(project_sql=project_sql), (start, end, *project_params))
+        times = [row["avg_time_on_page"] for row in daily if row["avg_time_on_page"] is not None]
+        # LTTB walks the series oldest first; the response stays newest first
+        trend = lttb(daily[::-1], points, x=lambda row: row["date"].toordinal(),
+                     y=lambda row: row["total_clicks"])[::-1]
         return {
-            "success": True,
-            "clicks": clicks,
-            "count": len(clicks)
+            "start": start,
+            "end": end,
+            "project": project,
+            "totals": {
+                "total_clicks": sum(row["total_clicks"] for row in daily),
+                "repeat_visits": sum(row["repeat_visits"] for row in daily),
+                "avg_time_on_page": round(sum(times) / len(times), 2) if times else 0,
+                "days": len(daily),
+            },
+            "daily": trend,
+            "daily_downsampled": len(trend) < len(daily),
+            "devices": top_n(devices, CHART_MAX_CATEGORIES, "device", "pageviews"),
         }
-        
-    except Exception as e:
-        print(f"Error fetching clicks: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch click data")
+    
+    return cached_json_response(request, ("summary", start, end, project, points), compute)
 
-# Manual aggregation trigger endpoint (for testing)
-@app.post("/api/trigger-aggregation")
-async def trigger_aggregation():
+@app.get("/api/analytics/pages")
+def analytics_pages(request: Request, start: Optional[date] = None, end: Optional[date] = None,
+                    limit: int = 20, project: Optional[str] = None, other: bool = False):
     """
-    Manually trigger daily aggregation for testing purposes
+    Most visited pages over a date range
+    With other=true the clicks of pages past the limit come back as one "(other)" row
     """
-    try:
-        print("🔧 Manual aggregation triggered via API")
-        run_daily_aggregation()
-        
+    start, end = resolve_date_range(start, end)
+    limit = max(1, min(limit, 100))
+    project_sql, project_params = project_filter(project)
+    
+    def compute():
+        pages = run_read_query("""
+            SELECT page, SUM(clicks)::int AS clicks
+            FROM mv_top_pages
+            WHERE date BETWEEN %s AND %s{project_sql}
+            GROUP BY page
+            ORDER BY clicks DESC
+            LIMIT %s
+        """.format(project_sql=project_sql), (start, end, *project_params, limit))
+        if other and len(pages) == limit:
+            pages = fold_other(pages, category_total("mv_top_pages", "clicks", start, end, project_sql,
+                                                     project_params), "page", "clicks")
+        return {"start": start, "end": end, "project": project, "pages": pages}
+    
+    return cached_json_response(request, ("pages", start, end, limit, project, other), compute)
+
+@app.get("/api/analytics/referrers")
+def analytics_referrers(request: Request, start: Optional[date] = None, end: Optional[date] = None,
+                        limit: int = 15, project: Optional[str] = None, other: bool = False):
+    """
+    Top traffic sources over a date range
+    With other=true the visits of sources past the limit come back as one "(other)" row
+    """
+    start, end = resolve_date_range(start, end)
+    limit = max(1, min(limit, 100))
+    project_sql, project_params = project_filter(project)
+    
+    def compute():
+        referrers = run_read_query("""
+            SELECT referrer, SUM(visits)::int AS visits
+            FROM mv_referrer_ranking
+            WHERE date BETWEEN %s AND %s{project_sql}
+            GROUP BY referrer
+            ORDER BY visits DESC
+            LIMIT %s
+        """.format(project_sql=project_sql), (start, end, *project_params, limit))
+        if other and len(referrers) == limit:
+            referrers = fold_other(referrers, category_total("mv_referrer_ranking", "visits", start, end,
+                                                             project_sql, project_params), "referrer", "visits")
+        return {"start": start, "end": end, "project": project, "referrers": referrers}
+    
+    return cached_json_response(request, ("referrers", start, end, limit, project, other), compute)
+
+def load_transition_matrix(start, end, project):
+    """Daily page_transitions summed over a range, as {(from_page, to_page): sessions}"""
+    import path_analysis
+    project_sql, project_params = project_filter(project, column="pr.name")
+    rows = run_read_query(path_analysis.TRANSITIONS_QUERY.format(project_sql=project_sql),
+                          (start, end, *project_params))
+    return path_analysis.merge_transitions(rows)
+
+@app.get("/api/analytics/funnel")
+def analytics_funnel(request: Request, steps: str, start: Optional[date] = None,
+                     end: Optional[date] = None, project: Optional[str] = None):
+    """
+    Funnel over an ordered, comma-separated list of pages (e.g. steps=home,/projects,/contact)
+    Each step keeps the share of the previous step's pageviews that went straight on to it,
+    estimated from the daily page transition counts of the range
+    """
+    import path_analysis
+    start, end = resolve_date_range(start, end)
+    pages = [page_label(step.strip()) for step in steps.split(",") if step.strip()]
+    if not 2 <= len(pages) <= 10:
+        raise HTTPException(status_code=400, detail="Give between 2 and 10 comma-separated steps")
+    
+    def compute():
+        funnel = path_analysis.funnel(load_transition_matrix(start, end, project), pages)
+        entered = funnel[0]["reached"]
         return {
-            "success": True,
-            "message": "Daily aggregation triggered successfully",
-            "note": "Check logs for execution details"
+            "start": start,
+            "end": end,
+            "project": project,
+            "steps": funnel,
+            "conversion": round(funnel[-1]["reached"] / entered, 4) if entered else 0.0,
         }
-        
+    
+    return cached_json_response(request, ("funnel", start, end, project, tuple(pages)), compute)
+
+@app.get("/api/analytics/paths")
+def analytics_paths(request: Request, page: Optional[str] = None, start: Optional[date] = None,
+                    end: Optional[date] = None, project: Optional[str] = None, limit: int = 10):
+    """
+    Most common previous and next pages of one page, from the daily page transition counts
+    Without a page: the most common entry and exit pages
+    """
+    import path_analysis
+    start, end = resolve_date_range(start, end)
+    limit = max(1, min(limit, 50))
+    
+    def compute():
+        matrix = load_transition_matrix(start, end, project)
+        if page:
+            paths = path_analysis.neighbours(matrix, page_label(page), limit)
+        else:
+            paths = {
+                "entry": path_analysis.neighbours(matrix, path_analysis.ENTRY, limit)["next"],
+                "exit": path_analysis.neighbours(matrix, path_analysis.EXIT, limit)["previous"],
+            }
+        return {"start": start, "end": end, "project": project, "page": page, **paths}
+    
+    return cached_json_response(request, ("paths", start, end, project, page, limit), compute)
+
+@app.get("/api/analytics/sessions")
+def analytics_sessions(request: Request, start: Optional[date] = None, end: Optional[date] = None,
+                       project: Optional[str] = None):
+    """
+    Visit-level metrics (sessions, visitors, duration, bounce rate) for a date range
+    Read from the sessions table built by the sessionizer; a session counts
+    on the day it started.
+    """
+    import sessionizer
+    start, end = resolve_date_range(start, end)
+    
+    def compute():
+        metrics = run_read_query(*sessionizer.session_metrics_query(start, end, project))[0]
+        return {"start": start, "end": end, "project": project, **metrics}
+    
+    return cached_json_response(request, ("sessions", start, end, project), compute)
+
+@app.get("/api/analytics/projects")
+def analytics_projects(request: Request):
+    """Projects (tracked sites) with summaries, for the dashboard's project filter"""
+    def compute():
+        rows = run_read_query("""
+            SELECT project_name, MIN(date) AS first_date, MAX(date) AS last_date
+            FROM mv_daily_trend
+            GROUP BY project_name
+            ORDER BY project_name
+        """, None)
+        return {"projects": rows}
+    
+    return cached_json_response(request, ("projects",), compute)
+
+@app.get("/api/analytics/runs")
+def analytics_runs(request: Request, limit: int = 90):
+    """Recent aggregation run telemetry for the pipeline health panel"""
+    limit = max(1, min(limit, 365))
+    
+    def compute():
+        return {"runs": run_read_query("""
+            SELECT started_at, target_date, engine, status, duration_seconds, rows_scanned,
+                   rows_filtered, pageviews, fetch_seconds, dedupe_seconds, compute_seconds, write_seconds,
+                   peak_memory_kb
+            FROM aggregation_runs
+            ORDER BY started_at DESC
+            LIMIT %s
+        """, (limit,))}
+    
+    return cached_json_response(request, ("runs", limit), compute)
+
+# Prometheus metrics endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Expose request, hot-path stage and pool wait histograms in Prometheus text format
+    Returns 404 when instrumentation is switched off (METRICS_ENABLED=0)
+    """
+    if not REGISTRY.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    
+    # Hot-IP hash cache effectiveness
+    cache = ip_hash_cache_info()
+    REGISTRY.gauge("ip_hash_cache_hits", "Keyed IP hash LRU cache hits").set(cache.hits)
+    REGISTRY.gauge("ip_hash_cache_misses", "Keyed IP hash LRU cache misses").set(cache.misses)
+    REGISTRY.gauge("ip_hash_cache_size", "Entries currently in the IP hash LRU cache").set(cache.currsize)
+    
+    # Analytics response cache effectiveness
+    REGISTRY.gauge("analytics_cache_hits", "Analytics API response cache hits").set(analytics_cache.hits)
+    REGISTRY.gauge("analytics_cache_misses", "Analytics API response cache misses").set(analytics_cache.misses)
+    
+    # Live stream fan-out
+    REGISTRY.gauge("stream_subscribers", "Open /api/stream connections").set(click_stream.subscriber_count)
+    REGISTRY.gauge("stream_dropped_subscribers", "Stream subscribers dropped for falling behind").set(
+        click_stream.dropped_subscribers)
+    
+    # Ingest rate limiting
+    limiter_allowed = REGISTRY.gauge("rate_limit_allowed", "Ingest events under the rate limit", ("key",))
+    limiter_limited = REGISTRY.gauge("rate_limit_limited", "Ingest events over the rate limit", ("key",))
+    limiter_keys = REGISTRY.gauge("rate_limit_buckets", "Token buckets currently tracked", ("key",))
+    for key, limiter in (("ip", ingest_rate_limiter.by_ip), ("session", ingest_rate_limiter.by_session)):
+        limiter_allowed.set(limiter.allowed, key=key)
+        limiter_limited.set(limiter.limited, key=key)
+        limiter_keys.set(len(limiter), key=key)
+    
+    # Ingest deduplication (duplicates dropped = inserts saved)
+    REGISTRY.gauge("ingest_dedup_checked", "Ingest events checked for duplicates").set(ingest_dedup.checked)
+    REGISTRY.gauge("ingest_dedup_dropped", "Duplicate ingest events dropped before insert").set(ingest_dedup.duplicates)
+    REGISTRY.gauge("ingest_dedup_keys", "Event keys in the dedup window").set(len(ingest_dedup))
+    
+    # Bot filtering at ingest
+    bot_filtered = REGISTRY.gauge("bot_filtered_events", "Ingest events classified as bot traffic", ("reason",))
+    for reason, count in ingest_bot_filter.filtered.items():
+        bot_filtered.set(count, reason=reason)
+    REGISTRY.gauge("bot_filter_passed_events", "Ingest events that passed the bot filter").set(ingest_bot_filter.passed)
+    
+    # Scheduler leadership (1 in the one process running the scheduled jobs)
+    REGISTRY.gauge("scheduler_running", "Whether this process runs the scheduled jobs").set(
+        int(scheduler is not None))
+    if leader_election is not None:
+        REGISTRY.gauge("scheduler_elections_won", "Times this process acquired scheduler leadership").set(
+            leader_election.elections_won)
+    
+    # Dimension id cache effectiveness
+    dimension_hits = REGISTRY.gauge("dimension_cache_hits", "Dimension id cache hits", ("table",))
+    dimension_misses = REGISTRY.gauge("dimension_cache_misses", "Dimension id cache misses", ("table",))
+    for dimension_cache in (page_ids, referrer_ids, user_agent_ids, project_ids):
+        dimension_hits.set(dimension_cache.hits, table=dimension_cache.table)
+        dimension_misses.set(dimension_cache.misses, table=dimension_cache.table)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# Manual aggregation trigger endpoint (for testing)
+@app.post("/api/trigger-aggregation", status_code=202)
+async def trigger_aggregation(target_date: Optional[date] = None):
+    """
+    Queue aggregation for a date (default yesterday)
+    Triggers for a date that is already queued or running return the existing job
+    """
+    target_date = target_date or date.today() - timedelta(days=1)
+    try:
+        print(f"🔧 Manual aggregation triggered via API for {target_date}")
+        job, coalesced = submit_aggregation(target_date)
     except Exception as e:
         print(f"Error triggering aggregation: {e}")
         raise HTTPException(status_code=500, detail="Failed to trigger aggregation")
+    
+    return {
+        "success": True,
+        "message": "Aggregation already in progress" if coalesced else "Aggregation queued",
+        "job_id": job.id,
+        "status": job.status,
+        "coalesced": coalesced,
+        "status_url": f"/api/jobs/{job.id}"
+    }
+
+# Background job status and cancellation
+@app.get("/api/jobs")
+async def list_jobs():
+    """Recent aggregation jobs, newest first"""
+    return {"jobs": [job.to_dict() for job in aggregation_jobs.list()]}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and result of one job"""
+    job = aggregation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancel a job
+    Queued jobs are dropped; running jobs stop before their next phase
+    """
+    job = aggregation_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 # Database test function
 def test_connection():
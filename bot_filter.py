@@ -0,0 +1,133 @@
+"""
+Bot and crawler filtering for the Portfolio Click Tracker
+Classifies click events as automated traffic, using the same rules at ingest
+(track_click) and at aggregation time:
+
+- user agent: known crawler / headless / HTTP-library / uptime-probe tokens
+- rate: more than BOT_MAX_EVENTS_PER_MINUTE events from one ip_hash in a minute
+- zero-time flood: more than BOT_MAX_ZERO_TIME_PER_MINUTE repeated zero
+  time_on_page events from one ip_hash in a minute. The tracker sends every
+  arrival with time_on_page 0, so only the second and later zero-time events
+  for the same page count; ordinary pageviews from a shared (NAT/CGNAT) IP
+  never add up to a flood.
+
+The behavioral rules are keyed on the ip_hash of the connection's client IP
+(app.request_client_ip: uvicorn resolves X-Forwarded-For from trusted
+proxies), never on anything in the beacon body, so rotating a payload field
+cannot reset them and visitors behind the proxy do not share one window.
+
+At ingest, BOT_FILTER_MODE decides what happens to filtered events:
+"side_table" (default) writes them to bot_clicks, "drop" discards them and
+"off" disables ingest filtering. Aggregation always excludes them.
+"""
+
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from functools import lru_cache
+
+BOT_FILTER_MODE = os.getenv("BOT_FILTER_MODE", "side_table")
+BOT_MAX_EVENTS_PER_MINUTE = int(os.getenv("BOT_MAX_EVENTS_PER_MINUTE", "60"))
+BOT_MAX_ZERO_TIME_PER_MINUTE = int(os.getenv("BOT_MAX_ZERO_TIME_PER_MINUTE", "20"))
+
+# Case-insensitive tokens seen in crawler, monitoring and scripted user agents
+BOT_UA_TOKENS = (
+    "bot", "crawl", "spider", "slurp", "archiver", "facebookexternalhit", "embedly",
+    "headless", "phantomjs", "puppeteer", "playwright", "selenium", "lighthouse",
+    "python-requests", "python-urllib", "aiohttp", "httpx", "curl", "wget", "go-http-client",
+    "java/", "okhttp", "axios", "node-fetch", "libwww", "scrapy",
+    "uptime", "pingdom", "statuscake", "monitor", "checkly", "site24x7",
+)
+_BOT_UA = re.compile("|".join(re.escape(token) for token in BOT_UA_TOKENS), re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def is_bot_user_agent(user_agent):
+    """True for empty or automated user agents (cached per distinct string)"""
+    if not user_agent or not user_agent.strip():
+        return True
+    return _BOT_UA.search(user_agent) is not None
+
+
+class BehaviorTracker:
+    """Per-ip_hash event counts in one-minute windows, bounded by an LRU"""
+
+    def __init__(self, max_per_minute=BOT_MAX_EVENTS_PER_MINUTE,
+                 max_zero_time_per_minute=BOT_MAX_ZERO_TIME_PER_MINUTE, max_keys=50_000):
+        self.max_per_minute = max_per_minute
+        self.max_zero_time_per_minute = max_zero_time_per_minute
+        self.max_keys = max_keys
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, ip_hash, page, time_on_page, minute):
+        """Count one event from a trusted client ip_hash; returns a reason string if it is over a limit"""
+        if ip_hash is None:
+            return None
+        with self._lock:
+            # [minute, events, repeated zero-time events, pages with a zero-time event]
+            window = self._windows.get(ip_hash)
+            if window is None or window[0] != minute:
+                window = [minute, 0, 0, set()]
+                self._windows[ip_hash] = window
+            self._windows.move_to_end(ip_hash)
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+            window[1] += 1
+            if not time_on_page:
+                if page in window[3]:
+                    window[2] += 1
+                elif len(window[3]) <= self.max_per_minute:
+                    # Past the rate limit the rate rule fires anyway; keep the set bounded
+                    window[3].add(page)
+            events, zero_time = window[1], window[2]
+        if events > self.max_per_minute:
+            return "rate"
+        if zero_time > self.max_zero_time_per_minute:
+            return "zero_time_flood"
+        return None
+
+
+class BotFilter:
+    """User agent and behavioral rules, with counts of what was filtered"""
+
+    def __init__(self, tracker=None):
+        self.tracker = tracker or BehaviorTracker()
+        self.filtered = Counter()
+        self.passed = 0
+
+    def classify(self, user_agent, ip_hash, page, time_on_page, minute):
+        """Reason the event is automated traffic, or None (page: any stable key, name or id)"""
+        if is_bot_user_agent(user_agent):
+            reason = "user_agent"
+        else:
+            reason = self.tracker.observe(ip_hash, page, time_on_page, minute)
+        if reason:
+            self.filtered[reason] += 1
+        else:
+            self.passed += 1
+        return reason
+
+    def filter_clicks(self, clicks, user_agents):
+        """Drop bot events from one day's clicks (ordered by timestamp); user_agents maps id -> string"""
+        kept = []
+        for c in clicks:
+            minute = int(c['timestamp'].timestamp() // 60)
+            if not self.classify(user_agents.get(c['user_agent_id']), c['ip_hash'], c['page_id'],
+                                 c['time_on_page'], minute):
+                kept.append(c)
+        return kept
+
+
+def record_bot_click(conn, ip_hash, reason, page_name, user_agent):
+    """Keep a filtered ingest event in bot_clicks instead of click_logs"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO bot_clicks (ip_hash, reason, page_name, user_agent)
+            VALUES (%s, %s, %s, %s)
+        """, (ip_hash, reason, (page_name or "")[:1024], (user_agent or "")[:1024]))
+        conn.commit()
+    finally:
+        cursor.close()
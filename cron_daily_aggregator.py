@@ -7,7 +7,6 @@ Runs daily at midnight UTC to process previous day's click data
 import os
 import sys
 from datetime import datetime, timezone
-from daily_aggregator import DailyAggregator
 
 def main():
     """Main cron job execution"""
@@ -32,6 +31,14 @@ def main():
     print("=" * 50)
     
     try:
+        # Imported here so the start banner and environment check print before psycopg2
+        # and the aggregation modules load
+        from aggregation_telemetry import start_memory_tracing
+        from daily_aggregator import DailyAggregator
+        
+        # A one-shot process, so tracing its heap for the run telemetry costs nothing else
+        start_memory_tracing()
+        
         # Initialize aggregator
         aggregator = DailyAggregator()
         
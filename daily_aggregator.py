@@ -7,12 +7,51 @@ Processes raw click_logs and creates daily summary statistics
 import os
 import sys
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from datetime import datetime, date, timedelta
 from collections import defaultdict, Counter
 import json
+import hashlib
+from aggregation_telemetry import RunTelemetry, record_run, start_memory_tracing
+from dimensions import PAGES, REFERRERS, USER_AGENTS, PROJECTS, load_names
+from materialized_views import refresh_dashboard_views
+from jobs import JobCancelled
+from projects import DEFAULT_PROJECT
+from bot_filter import BotFilter
+from labels import device_type, referrer_label, page_label
+
+# Advisory lock namespace; the second key is the target date's ordinal so only
+# one process aggregates a given day at a time
+AGGREGATION_LOCK_KEY = 4_037_001
+
+SUMMARY_FIELDS = ('date', 'project_name', 'total_clicks', 'avg_time_on_page', 'device_split',
+                  'top_referrers', 'top_pages', 'repeat_visits', 'tag')
+
+def summary_hash(summary_data):
+    """Stable digest of the stored summary fields, used to skip no-op writes"""
+    canonical = json.dumps({f: summary_data[f] for f in SUMMARY_FIELDS}, sort_keys=True, default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+def summary_row(summary_data):
+    """Values for one daily_click_summary upsert"""
+    return (
+        summary_data['date'],
+        summary_data['project_name'],
+        summary_data['total_clicks'],
+        summary_data['avg_time_on_page'],
+        json.dumps(summary_data['device_split']),
+        json.dumps(summary_data['top_referrers']),
+        json.dumps(summary_data['top_pages']),
+        summary_data['repeat_visits'],
+        summary_data['tag'],
+        summary_hash(summary_data),
+        datetime.now()
+    )
 
 class DailyAggregator:
+    # Recorded in aggregation_runs so runs from different engines can be compared
+    engine = "postgres"
+    
     def __init__(self):
         """Initialize the aggregator with database connection"""
         # Try Railway's database environment variables
@@ -46,141 +85,387 @@ class DailyAggregator:
             print(f"Database connection error: {e}")
             raise
     
-    def aggregate_day(self, target_date):
-        """Aggregate click data for a specific date"""
+    def _fetch_clicks(self, cursor, target_date):
+        """Fetch all raw click events for one day, oldest first
+
+        Reads click_logs_all, so days already moved to click_logs_archive by
+        retention can still be re-aggregated or backfilled (a compacted day
+        has one row per pageview, which dedupes to the same pageviews)
+        """
+        # Half-open range instead of DATE(timestamp) so the timestamp index is usable
+        query = """
+        SELECT project_id, session_id, page_id, referrer_id, user_agent_id,
+               time_on_page, event_type, timestamp, ip_hash
+        FROM click_logs_all 
+        WHERE timestamp >= %s::date AND timestamp < %s::date + 1
+        ORDER BY timestamp
+        """
+        cursor.execute(query, (target_date, target_date))
+        return cursor.fetchall()
+    
+    def _fetch_dimensions(self, cursor, clicks):
+        """Resolve the page/referrer/user agent ids seen in clicks to their text values"""
+        return {
+            'pages': load_names(cursor, PAGES, {c['page_id'] for c in clicks}),
+            'referrers': load_names(cursor, REFERRERS, {c['referrer_id'] for c in clicks}),
+            'user_agents': load_names(cursor, USER_AGENTS, {c['user_agent_id'] for c in clicks}),
+            'projects': load_names(cursor, PROJECTS, {c['project_id'] for c in clicks}),
+        }
+    
+    def _dedupe_pageviews(self, clicks):
+        """Collapse arrival+exit events to one pageview per (session_id, page_id), per project
+
+        Returns {project_id: (pageviews, first_event_for_referrer)} from a single pass.
+        """
+        by_project = {}
+        
+        for c in clicks:
+            project = by_project.get(c['project_id'])
+            if project is None:
+                project = by_project[c['project_id']] = ({}, {})
+            pageviews, first_event_for_referrer = project
+            key = (c['session_id'], c['page_id'])
+            # keep first event for referrer (usually arrival)
+            if key not in first_event_for_referrer:
+                first_event_for_referrer[key] = c
+            prev = pageviews.get(key)
+            # choose the event with the larger time_on_page (exit > arrival)
+            cur_time = c['time_on_page'] or 0
+            prev_time = (prev['time_on_page'] or 0) if prev else -1
+            if prev is None or cur_time > prev_time:
+                pageviews[key] = c
+        
+        return by_project
+    
+    def _compute_summaries(self, target_date, by_project, dims):
+        """One summary per project seen that day, with its page transitions attached"""
+        from path_analysis import count_transitions
+        summaries = []
+        for project_id, (pageviews, first_event_for_referrer) in sorted(by_project.items()):
+            summary_data = self._compute_summary(target_date, pageviews, first_event_for_referrer, dims,
+                                                 dims['projects'].get(project_id, DEFAULT_PROJECT))
+            # Stored in page_transitions, not in daily_click_summary
+            summary_data['project_id'] = project_id
+            summary_data['transitions'] = [
+                (from_page, to_page, count)
+                for (from_page, to_page), count in sorted(count_transitions(pageviews, first_event_for_referrer).items())
+            ]
+            summaries.append(summary_data)
+        return summaries
+    
+    def _compute_summary(self, target_date, pageviews, first_event_for_referrer, dims, project_name=DEFAULT_PROJECT):
+        """Compute the daily summary metrics from deduped pageviews"""
+        # Use deduped pageviews for metrics
+        total_clicks = len(pageviews)  # unique pageviews, not raw rows
+        
+        times = [pv['time_on_page'] for pv in pageviews.values() if (pv['time_on_page'] or 0) > 0]
+        avg_time_on_page = round(sum(times) / len(times), 2) if times else 0
+        
+        # Count by integer id first, then classify each distinct id once
+        ua_counts = Counter(pv['user_agent_id'] for pv in pageviews.values())
+        referrer_id_counts = Counter(first['referrer_id'] for first in first_event_for_referrer.values())
+        page_id_counts = Counter(page_id for (_sid, page_id) in pageviews.keys())
+        
+        # Device split (from chosen pageview event)
+        device_counts = {"Mobile": 0, "Desktop": 0}
+        for ua_id, count in ua_counts.items():
+            device_counts[device_type(dims['user_agents'].get(ua_id))] += count
+        
+        # Top referrers (prefer the first event per pageview, i.e., the arrival)
+        referrer_counts = {}
+        for referrer_id, count in referrer_id_counts.items():
+            referrer = referrer_label(dims['referrers'].get(referrer_id))
+            referrer_counts[referrer] = referrer_counts.get(referrer, 0) + count
+        
+        # Top pages from chosen pageviews
+        page_counts = {}
+        for page_id, count in page_id_counts.items():
+            page_name = page_label(dims['pages'].get(page_id))
+            page_counts[page_name] = page_counts.get(page_name, 0) + count
+        
+        # Repeat visits based on unique sessions
+        unique_sessions = len({sid for (sid, _page) in pageviews.keys() if sid})
+        repeat_visits = total_clicks - unique_sessions if unique_sessions > 0 else 0
+        
+        # Prepare data for insertion
+        return {
+            'date': target_date,
+            'project_name': project_name,
+            'total_clicks': total_clicks,
+            'avg_time_on_page': round(avg_time_on_page, 2),
+            'device_split': dict(device_counts),
+            'top_referrers': dict(referrer_counts),
+            'top_pages': dict(page_counts),
+            'repeat_visits': repeat_visits,
+            'unique_sessions': unique_sessions,
+            'tag': 'general'
+        }
+    
+    def _summarize(self, source, target_date, telemetry, check_cancelled=None):
+        """Fetch, bot-filter, dedupe and compute one day's summaries; None if the day has no clicks
+
+        source is whatever _fetch_clicks/_fetch_dimensions read from (a cursor here)
+        """
+        check_cancelled = check_cancelled or (lambda: None)
+        with telemetry.phase("fetch"):
+            clicks = self._fetch_clicks(source, target_date)
+            dims = self._fetch_dimensions(source, clicks) if clicks else None
+        telemetry.rows_scanned = len(clicks)
+        if not clicks:
+            return None
+        
+        print(f"Found {len(clicks)} raw click events for {target_date}")
+        check_cancelled()
+        with telemetry.phase("dedupe"):
+            bot_filter = BotFilter()
+            clicks = bot_filter.filter_clicks(clicks, dims['user_agents'])
+            by_project = self._dedupe_pageviews(clicks)
+        telemetry.rows_filtered = sum(bot_filter.filtered.values())
+        if telemetry.rows_filtered:
+            reasons = ", ".join(f"{reason} {count}" for reason, count in bot_filter.filtered.most_common())
+            print(f"🤖 Filtered {telemetry.rows_filtered} bot events ({reasons})")
+        
+        check_cancelled()
+        with telemetry.phase("compute"):
+            summaries = self._compute_summaries(target_date, by_project, dims)
+        telemetry.pageviews = sum(summary_data['total_clicks'] for summary_data in summaries)
+        return summaries
+    
+    def _write_summaries(self, cursor, summaries):
+        """Upsert summary rows in one statement; returns (date, project_name) of every row that actually changed
+
+        Rows whose content_hash matches the stored one are left untouched,
+        so re-running a day creates no dead tuples and no read gap.
+        """
+        if not summaries:
+            return []
+        written = execute_values(cursor, """
+        INSERT INTO daily_click_summary 
+        (date, project_name, total_clicks, avg_time_on_page, device_split, 
+         top_referrers, top_pages, repeat_visits, tag, content_hash, created_at)
+        VALUES %s
+        ON CONFLICT (date, project_name, tag) DO UPDATE SET
+            total_clicks = EXCLUDED.total_clicks,
+            avg_time_on_page = EXCLUDED.avg_time_on_page,
+            device_split = EXCLUDED.device_split,
+            top_referrers = EXCLUDED.top_referrers,
+            top_pages = EXCLUDED.top_pages,
+            repeat_visits = EXCLUDED.repeat_visits,
+            content_hash = EXCLUDED.content_hash,
+            created_at = EXCLUDED.created_at
+        WHERE daily_click_summary.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+        RETURNING date, project_name
+        """, [summary_row(summary_data) for summary_data in summaries], fetch=True)
+        return [(row['date'], row['project_name']) for row in written]
+    
+    def _write_transitions(self, cursor, summaries, changed):
+        """Replace the page transitions of the summaries' days and projects, in the caller's transaction
+
+        Only summaries that changed (changed, from _write_summaries) or have no
+        transitions stored yet are rewritten, so an unchanged re-run leaves
+        page_transitions untouched like daily_click_summary.
+        """
+        from path_analysis import write_transitions
+        dates = sorted({summary_data['date'] for summary_data in summaries})
+        if not dates:
+            return
+        cursor.execute("SELECT DISTINCT date, project_id FROM page_transitions WHERE date = ANY(%s)", (dates,))
+        stored = {(row['date'], row['project_id']) for row in cursor.fetchall()}
+        changed = set(changed)
+        write_transitions(cursor, [
+            summary_data for summary_data in summaries
+            if (summary_data['date'], summary_data['project_name']) in changed
+            or (summary_data['date'], summary_data['project_id']) not in stored
+        ])
+    
+    def _record_telemetry(self, telemetry):
+        """Persist run telemetry; never fails the aggregation itself"""
+        print(telemetry.summary_line())
+        try:
+            conn = self.get_db_connection()
+            try:
+                record_run(conn, telemetry)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"⚠️  Could not record aggregation telemetry: {e}")
+    
+    def aggregate_day(self, target_date, check_cancelled=None):
+        """Aggregate click data for a specific date; returns one summary per project
+
+        check_cancelled, if given, is called between phases and may raise to abort
+        """
         print(f"Starting aggregation for {target_date}")
+        check_cancelled = check_cancelled or (lambda: None)
         
         conn = self.get_db_connection()
         cursor = conn.cursor()
+        telemetry = RunTelemetry(target_date, engine=self.engine)
         
         try:
-            # Get all clicks for the target date
-            query = """
-            SELECT * FROM click_logs 
-            WHERE DATE(timestamp) = %s
-            ORDER BY timestamp
-            """
-            cursor.execute(query, (target_date,))
-            clicks = cursor.fetchall()
+            # Held until commit/rollback, so overlapping runs for one date never both scan
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s, %s) AS locked",
+                           (AGGREGATION_LOCK_KEY, target_date.toordinal()))
+            if not cursor.fetchone()["locked"]:
+                print(f"⏭️  Aggregation for {target_date} already running elsewhere, skipping")
+                telemetry.finish("skipped")
+                return None
             
-            if not clicks:
+            summaries = self._summarize(cursor, target_date, telemetry, check_cancelled)
+            if summaries is None:
                 print(f"No clicks found for {target_date}")
-                return
-            
-            print(f"Found {len(clicks)} raw click events for {target_date}")
-            print(f"Deduplicating to unique pageviews (collapsing arrival+exit events)...")
-            
-            # --- NEW: collapse arrival+exit to one pageview per (session_id, page_name) ---
-            pageviews = {}
-            first_event_for_referrer = {}
-            
-            for c in clicks:
-                key = (c.get('session_id'), c.get('page_name'))
-                # keep first event for referrer (usually arrival)
-                if key not in first_event_for_referrer:
-                    first_event_for_referrer[key] = c
-                prev = pageviews.get(key)
-                # choose the event with the larger time_on_page (exit > arrival)
-                cur_time = c.get('time_on_page') or 0
-                prev_time = (prev.get('time_on_page') or 0) if prev else -1
-                if prev is None or cur_time > prev_time:
-                    pageviews[key] = c
+                telemetry.finish("empty")
+                return None
             
-            # Use deduped pageviews for metrics
-            total_clicks = len(pageviews)  # unique pageviews, not raw rows
-            project_name = "lubobali_portfolio"  # Your main project
+            check_cancelled()
+            with telemetry.phase("write"):
+                changed_keys = self._write_summaries(cursor, summaries)
+                self._write_transitions(cursor, summaries, changed_keys)
+                changed = len(changed_keys)
+                conn.commit()
+            if changed < len(summaries):
+                print(f"⏸️  {len(summaries) - changed} of {len(summaries)} project summaries unchanged, write skipped")
             
-            times = [pv.get('time_on_page') or 0 for pv in pageviews.values() if (pv.get('time_on_page') or 0) > 0]
-            avg_time_on_page = round(sum(times) / len(times), 2) if times else 0
-            
-            # Device split (from chosen pageview event)
-            device_counts = {"Mobile": 0, "Desktop": 0}
-            for pv in pageviews.values():
-                ua = (pv.get('user_agent') or '').lower()
-                if 'mobile' in ua or 'android' in ua or 'iphone' in ua:
-                    device_counts['Mobile'] += 1
-                else:
-                    device_counts['Desktop'] += 1
-            
-            # Top referrers (prefer the first event per pageview, i.e., the arrival)
-            referrer_counts = {}
-            for key, first in first_event_for_referrer.items():
-                referrer = (first.get('referrer') or '').strip()
-                if not referrer or referrer == 'null':
-                    referrer = 'Direct Traffic'
-                elif not referrer.startswith('http'):
-                    referrer = 'Direct Traffic'
-                referrer_counts[referrer] = referrer_counts.get(referrer, 0) + 1
-            
-            # Top pages from chosen pageviews
-            page_counts = {}
-            for pv in pageviews.values():
-                page_name = pv.get('page_name', 'unknown') or 'unknown'
-                if page_name == '' or page_name == 'home': page_name = 'home'
-                elif not page_name.startswith('/') and page_name != 'home': page_name = f'/{page_name}'
-                page_counts[page_name] = page_counts.get(page_name, 0) + 1
-            
-            # Repeat visits based on unique sessions
-            session_ids = [sid for (sid, _page) in pageviews.keys() if sid]
-            unique_sessions = len(set(session_ids))
-            repeat_visits = total_clicks - unique_sessions if unique_sessions > 0 else 0
-            
-            # Prepare data for insertion
-            summary_data = {
-                'date': target_date,
-                'project_name': project_name,
-                'total_clicks': total_clicks,
-                'avg_time_on_page': round(avg_time_on_page, 2),
-                'device_split': dict(device_counts),
-                'top_referrers': dict(referrer_counts),
-                'top_pages': dict(page_counts),
-                'repeat_visits': repeat_visits,
-                'tag': 'general'
-            }
-            
-            # Delete existing data for this date (if any)
-            delete_query = "DELETE FROM daily_click_summary WHERE date = %s"
-            cursor.execute(delete_query, (target_date,))
-            
-            # Insert new aggregated data
-            insert_query = """
-            INSERT INTO daily_click_summary 
-            (date, project_name, total_clicks, avg_time_on_page, device_split, 
-             top_referrers, top_pages, repeat_visits, tag, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            cursor.execute(insert_query, (
-                summary_data['date'],
-                summary_data['project_name'],
-                summary_data['total_clicks'],
-                summary_data['avg_time_on_page'],
-                json.dumps(summary_data['device_split']),
-                json.dumps(summary_data['top_referrers']),
-                json.dumps(summary_data['top_pages']),
-                summary_data['repeat_visits'],
-                summary_data['tag'],
-                datetime.now()
-            ))
-            
-            conn.commit()
-            print(f"✅ Successfully aggregated {len(clicks)} raw events → {total_clicks} unique pageviews for {target_date}")
-            print(f"📊 Summary: {total_clicks} pageviews, {len(set(session_ids))} sessions, {avg_time_on_page:.1f}s avg time")
+            telemetry.finish("success")
+            print(f"✅ Successfully aggregated {telemetry.rows_scanned} raw events → {telemetry.pageviews} unique pageviews for {target_date}")
+            for summary_data in summaries:
+                print(f"📊 {summary_data['project_name']}: {summary_data['total_clicks']} pageviews, "
+                      f"{summary_data['unique_sessions']} sessions, {summary_data['avg_time_on_page']:.1f}s avg time")
+            return summaries
             
+        except JobCancelled:
+            telemetry.finish("cancelled")
+            conn.rollback()
+            raise
         except Exception as e:
             print(f"❌ Error during aggregation: {e}")
+            telemetry.finish("failed", e)
             conn.rollback()
             raise
         finally:
             cursor.close()
             conn.close()
+            self._record_telemetry(telemetry)
+    
+    def run_sessionizer(self):
+        """Bring the sessions table up to date; never blocks the daily summary"""
+        try:
+            from sessionizer import Sessionizer
+            Sessionizer(self.get_db_connection).run()
+        except Exception as e:
+            print(f"⚠️  Sessionization failed: {e}")
+    
+    def run_retention(self):
+        """Archive raw clicks of aggregated days past the retention horizon; never fails the run"""
+        try:
+            from retention import apply_retention
+            conn = self.get_db_connection()
+            try:
+                stats = apply_retention(conn)
+            finally:
+                conn.close()
+            if stats["days"]:
+                print(f"🗄️  Retention ({stats['mode']}): {stats['days']} day(s), "
+                      f"{stats['raw_rows']} raw rows → {stats['archived_rows']} archived")
+        except Exception as e:
+            print(f"⚠️  Retention failed: {e}")
+    
+    def refresh_dashboard_views(self):
+        """Refresh the dashboard's materialized views after new summaries are written"""
+        try:
+            conn = self.get_db_connection()
+            try:
+                refresh_dashboard_views(conn)
+                print("🔄 Dashboard views refreshed")
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"⚠️  Could not refresh dashboard views: {e}")
+    
+    def run_for_date(self, target_date, check_cancelled=None):
+        """Sessionize, aggregate one date, archive old raw days and refresh the dashboard views"""
+        self.run_sessionizer()
+        summaries = self.aggregate_day(target_date, check_cancelled)
+        self.run_retention()
+        if summaries:
+            # Views are built from daily_click_summary only; nothing new, nothing to refresh
+            self.refresh_dashboard_views()
+        return summaries
     
     def run_daily_aggregation(self, days_back=1):
         """Run aggregation for the previous day(s)"""
-        target_date = date.today() - timedelta(days=days_back)
-        self.aggregate_day(target_date)
+        return self.run_for_date(date.today() - timedelta(days=days_back))
+
+    def backfill(self, start_date, end_date, batch_days=31):
+        """Recompute summaries for [start_date, end_date], upserting each batch of days in bulk
+
+        Each day takes the same per-date advisory lock as aggregate_day (held until
+        its batch commits) and records its run telemetry; days locked elsewhere are skipped.
+        """
+        conn = self.get_db_connection()
+        cursor = conn.cursor()
+        changed = unchanged = skipped = 0
+        pending = []
+        try:
+            batch = []
+            day = start_date
+            while day <= end_date:
+                cursor.execute("SELECT pg_try_advisory_xact_lock(%s, %s) AS locked",
+                               (AGGREGATION_LOCK_KEY, day.toordinal()))
+                telemetry = RunTelemetry(day, engine=self.engine)
+                if not cursor.fetchone()["locked"]:
+                    print(f"⏭️  Aggregation for {day} already running elsewhere, skipping")
+                    telemetry.finish("skipped")
+                    self._record_telemetry(telemetry)
+                    skipped += 1
+                else:
+                    summaries = self._summarize(cursor, day, telemetry)
+                    # The next day resets the heap peak, so take this day's now
+                    telemetry.sample_memory()
+                    if summaries:
+                        batch.extend(summaries)
+                        pending.append(telemetry)
+                    else:
+                        telemetry.finish("empty")
+                        self._record_telemetry(telemetry)
+                day += timedelta(days=1)
+                if len(pending) >= batch_days or (day > end_date and batch):
+                    # The batch's single write is charged to its last day
+                    with pending[-1].phase("write"):
+                        changed_keys = self._write_summaries(cursor, batch)
+                        self._write_transitions(cursor, batch, changed_keys)
+                        written = len(changed_keys)
+                        conn.commit()
+                    changed += written
+                    unchanged += len(batch) - written
+                    print(f"📦 Upserted {len(batch)} summaries up to {day - timedelta(days=1)}: {written} changed")
+                    for telemetry in pending:
+                        telemetry.finish("success")
+                        self._record_telemetry(telemetry)
+                    batch = []
+                    pending = []
+            # Release the locks of trailing skipped/empty days
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            for telemetry in pending:
+                telemetry.finish("failed", e)
+                self._record_telemetry(telemetry)
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        print(f"✅ Backfill {start_date} → {end_date}: {changed} changed, {unchanged} unchanged, {skipped} skipped")
+        self.refresh_dashboard_views()
+        return changed, unchanged
 
 if __name__ == "__main__":
-    # For manual testing
+    # For manual testing; `--backfill YYYY-MM-DD YYYY-MM-DD` recomputes a range
+    start_memory_tracing()
     aggregator = DailyAggregator()
-    aggregator.run_daily_aggregation(days_back=1)
+    if "--backfill" in sys.argv:
+        i = sys.argv.index("--backfill")
+        start, end = (date.fromisoformat(d) for d in sys.argv[i + 1:i + 3])
+        aggregator.backfill(start, end)
+    else:
+        aggregator.run_daily_aggregation(days_back=1)
@@ -0,0 +1,77 @@
+"""
+Bounded PostgreSQL connection pool for the Portfolio Click Tracker API
+Reuses connections across requests instead of opening one per beacon,
+and records how long callers wait for a free connection.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+from metrics import REGISTRY, DB_POOL_WAIT
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the acquire timeout"""
+
+
+class ConnectionPool:
+    """ThreadedConnectionPool that blocks (with a timeout) instead of failing when exhausted"""
+
+    def __init__(self, db_url, minconn=1, maxconn=10, acquire_timeout=5.0):
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self._pool = ThreadedConnectionPool(minconn, maxconn, db_url, cursor_factory=RealDictCursor)
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def acquire(self):
+        """Borrow a connection, waiting up to acquire_timeout for a free slot"""
+        started = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.acquire_timeout)
+        if REGISTRY.enabled:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+        if not acquired:
+            raise PoolTimeout(f"No database connection available after {self.acquire_timeout}s")
+        try:
+            return self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        """Return a borrowed connection; broken ones are discarded so the next borrower gets a fresh one"""
+        try:
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for a block; rolls back on error and always returns it"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self):
+        self._pool.closeall()
+
+
+def create_pool_from_env(db_url):
+    """Build a pool sized by DB_POOL_MIN / DB_POOL_MAX / DB_POOL_TIMEOUT"""
+    return ConnectionPool(
+        db_url,
+        minconn=int(os.getenv("DB_POOL_MIN", "1")),
+        maxconn=int(os.getenv("DB_POOL_MAX", "10")),
+        acquire_timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+    )
+
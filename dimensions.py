@@ -0,0 +1,115 @@
+"""
+Compact click_logs encoding for the Portfolio Click Tracker
+Page names, referrers and user agents are stored once in small dimension
+tables and referenced by integer id; the tracker tag becomes a smallint
+event type and the session id a fixed-width UUID.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Tracker tags ('arrival' / 'exit' from tracker_production.js); anything else is 0
+EVENT_TYPES = {"arrival": 1, "exit": 2}
+EVENT_TYPE_NAMES = {0: None, 1: "arrival", 2: "exit"}
+
+# Keep values well under the btree row limit of the UNIQUE indexes
+MAX_DIMENSION_LENGTH = 1024
+
+# Dimension tables and their value column
+PAGES = ("pages", "page_name")
+REFERRERS = ("referrers", "referrer")
+USER_AGENTS = ("user_agents", "user_agent")
+PROJECTS = ("projects", "name")
+
+
+def encode_event_type(tag):
+    """Map a tracker tag to its smallint code"""
+    return EVENT_TYPES.get((tag or "").strip().lower(), 0)
+
+
+def decode_event_type(code):
+    """Map a smallint code back to the tracker tag"""
+    return EVENT_TYPE_NAMES.get(code)
+
+
+def session_uuid(session_id):
+    """Fixed-width UUID for a tracker session id (matches md5(session_id)::uuid in SQL)"""
+    digest = hashlib.md5(session_id.encode()).hexdigest()
+    return f"{digest[:8]}-{digest[8:12]}-{digest[12:16]}-{digest[16:20]}-{digest[20:]}"
+
+
+class DimensionCache:
+    """Bounded LRU mapping dimension values to integer ids, backed by get-or-create in Postgres"""
+
+    def __init__(self, dimension, max_size=10000):
+        self.table, self.column = dimension
+        self.max_size = max_size
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, value):
+        """Cached id for a value, or None if it has to be resolved"""
+        with self._lock:
+            dim_id = self._ids.get(value)
+            if dim_id is not None:
+                self._ids.move_to_end(value)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return dim_id
+
+    def _remember(self, value, dim_id):
+        with self._lock:
+            self._ids[value] = dim_id
+            self._ids.move_to_end(value)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def resolve(self, conn, value):
+        """Return the id for value, inserting it on first sight
+
+        Misses are committed immediately, before the caller's own writes,
+        so a later rollback can never leave a cached id without its row.
+        """
+        if value is None:
+            return None
+        value = value[:MAX_DIMENSION_LENGTH]
+        dim_id = self.get(value)
+        if dim_id is not None:
+            return dim_id
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"INSERT INTO {self.table} ({self.column}) VALUES (%s) "
+                f"ON CONFLICT ({self.column}) DO NOTHING RETURNING id",
+                (value,),
+            )
+            row = cursor.fetchone()
+            if row is None:
+                # Another process inserted it first
+                cursor.execute(f"SELECT id FROM {self.table} WHERE {self.column} = %s", (value,))
+                row = cursor.fetchone()
+            conn.commit()
+        finally:
+            cursor.close()
+
+        self._remember(value, row["id"])
+        return row["id"]
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+def load_names(cursor, dimension, ids):
+    """Fetch {id: value} for a set of dimension ids in one query"""
+    table, column = dimension
+    ids = [i for i in ids if i is not None]
+    if not ids:
+        return {}
+    cursor.execute(f"SELECT id, {column} AS value FROM {table} WHERE id = ANY(%s)", (ids,))
+    return {row["id"]: row["value"] for row in cursor.fetchall()}
@@ -0,0 +1,72 @@
+"""
+Chart payload downsampling for the analytics API
+Long date ranges would otherwise ship (and make plotly draw) every point:
+- time series keep at most CHART_MAX_POINTS points, picked with
+  Largest-Triangle-Three-Buckets (LTTB), which keeps peaks and dips
+  instead of averaging them away
+- bar and pie charts keep their top N categories and fold the rest into
+  one "(other)" row, so the chart still adds up to the total
+Totals are always computed before downsampling.
+"""
+
+import os
+
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "365"))
+CHART_MAX_CATEGORIES = int(os.getenv("CHART_MAX_CATEGORIES", "8"))
+
+OTHER = "(other)"
+
+
+def lttb(rows, threshold, x, y):
+    """
+    Pick `threshold` rows of a series sorted by x with Largest-Triangle-Three-Buckets
+    x and y are functions returning a row's numeric coordinates; the first and
+    last rows are always kept. Returns rows unchanged when they already fit.
+    """
+    n = len(rows)
+    if threshold >= n:
+        return list(rows)
+    if threshold < 3:
+        raise ValueError("LTTB needs a threshold of at least 3 points")
+
+    xs = [x(row) for row in rows]
+    ys = [y(row) for row in rows]
+    # Everything but the two end points is split into threshold - 2 buckets
+    every = (n - 2) / (threshold - 2)
+    sampled = [rows[0]]
+    previous = 0
+    for bucket in range(threshold - 2):
+        # Average of the next bucket (the last row, for the final bucket) is the third triangle corner
+        next_start = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            area = abs((xs[previous] - avg_x) * (ys[i] - ys[previous])
+                       - (xs[previous] - xs[i]) * (avg_y - ys[previous]))
+            if area > best_area:
+                best, best_area = i, area
+        sampled.append(rows[best])
+        previous = best
+    sampled.append(rows[-1])
+    return sampled
+
+
+def fold_other(top_rows, total, label, value):
+    """Append an OTHER row holding total minus what top_rows already show (if anything is left)"""
+    rest = total - sum(row[value] for row in top_rows)
+    if rest <= 0:
+        return list(top_rows)
+    return [*top_rows, {label: OTHER, value: rest}]
+
+
+def top_n(rows, n, label, value):
+    """Largest n - 1 rows by value plus one OTHER row for the remainder (rows as-is when they fit)"""
+    if len(rows) <= n:
+        return list(rows)
+    ranked = sorted(rows, key=lambda row: row[value], reverse=True)
+    return fold_other(ranked[:max(n - 1, 1)], sum(row[value] for row in rows), label, value)
@@ -0,0 +1,93 @@
+"""
+In-process pub/sub for live click events
+track_click publishes each stored click here, and every /api/stream
+subscriber gets its own bounded queue. A subscriber that falls a full queue
+behind is dropped rather than slowing ingest or growing memory.
+"""
+
+import asyncio
+import os
+import threading
+
+# Events buffered per subscriber before it is considered too slow
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "256"))
+
+# Upper bound on concurrent stream connections
+STREAM_MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "100"))
+
+
+class TooManySubscribers(Exception):
+    """Raised when STREAM_MAX_SUBSCRIBERS streams are already open"""
+
+
+class Subscription:
+    """One subscriber's bounded queue; None in the queue means it was dropped"""
+
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def _drop(self):
+        # Discard the backlog so the close marker always fits
+        self.dropped = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class EventBus:
+    """Fan-out of events to subscriber queues on the event loop"""
+
+    def __init__(self, queue_size=STREAM_QUEUE_SIZE, max_subscribers=STREAM_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._loop = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """Open a subscription; must be called from the event loop"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers(f"{self.max_subscribers} streams already open")
+            self._loop = asyncio.get_running_loop()
+            subscription = Subscription(self.queue_size)
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event):
+        """Queue event for every subscriber; safe to call from any thread"""
+        if not self._subscribers:
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._fan_out(event)
+        elif self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._fan_out, event)
+
+    def _fan_out(self, event):
+        self.published += 1
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscription._drop()
+                self.unsubscribe(subscription)
+                self.dropped_subscribers += 1
@@ -0,0 +1,76 @@
+"""
+Ingest-side deduplication of repeated tracker events
+The tracker's own sentRequests Set does not survive reloads or span tabs, so
+the same (session, page, tag) event can arrive several times. Events are
+dropped before insert when the same key was seen within DEDUP_TTL_SECONDS
+and the new time_on_page adds nothing: aggregation keeps the largest
+time_on_page per pageview, so only an event more than DEDUP_TIME_TOLERANCE
+seconds longer than the best one seen is worth storing.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEDUP_TTL_SECONDS = float(os.getenv("DEDUP_TTL_SECONDS", "600"))
+DEDUP_TIME_TOLERANCE = int(os.getenv("DEDUP_TIME_TOLERANCE", "5"))
+DEDUP_MAX_KEYS = int(os.getenv("DEDUP_MAX_KEYS", "100000"))
+
+
+class IngestDeduplicator:
+    """Bounded LRU of recent event keys with a TTL
+
+    Each key maps to [seen_at, best time_on_page, best before the last raise],
+    the last item being None when the entry was created by the latest event.
+    """
+
+    def __init__(self, ttl=DEDUP_TTL_SECONDS, tolerance=DEDUP_TIME_TOLERANCE,
+                 max_keys=DEDUP_MAX_KEYS, clock=time.monotonic):
+        self.ttl = ttl
+        self.tolerance = tolerance
+        self.max_keys = max_keys
+        self.clock = clock
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.duplicates = 0
+
+    def is_duplicate(self, key, time_on_page):
+        """Record the event; True if it repeats one seen within the TTL"""
+        now = self.clock()
+        time_on_page = time_on_page or 0
+        with self._lock:
+            self.checked += 1
+            entry = self._seen.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._seen.move_to_end(key)
+                if time_on_page <= entry[1] + self.tolerance:
+                    self.duplicates += 1
+                    return True
+                entry[2], entry[1] = entry[1], time_on_page
+                return False
+            self._seen[key] = [now, time_on_page, None]
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+            return False
+
+    def forget(self, key, time_on_page):
+        """Undo a recorded event that failed to store, so a client retry is not treated as a duplicate
+
+        Only that event is undone: if it raised the key's best time_on_page the
+        previous best comes back, and events recorded after it are kept.
+        """
+        time_on_page = time_on_page or 0
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is None or entry[1] != time_on_page:
+                return
+            if entry[2] is None:
+                del self._seen[key]
+            else:
+                entry[1], entry[2] = entry[2], None
+
+    def __len__(self):
+        return len(self._seen)
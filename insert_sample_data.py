@@ -22,22 +22,7 @@ def insert_sample_daily_data():
         conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
         cursor = conn.cursor()
         
-        # Create daily_click_summary table if it doesn't exist
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS daily_click_summary (
-            id SERIAL PRIMARY KEY,
-            date DATE NOT NULL UNIQUE,
-            total_visits INTEGER NOT NULL DEFAULT 0,
-            unique_sessions INTEGER NOT NULL DEFAULT 0,
-            total_time_spent INTEGER NOT NULL DEFAULT 0,
-            avg_time_per_visit DECIMAL(10,2) DEFAULT 0,
-            top_pages JSONB DEFAULT '[]'::jsonb,
-            referrer_breakdown JSONB DEFAULT '{}'::jsonb,
-            hourly_breakdown JSONB DEFAULT '{}'::jsonb,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """
-        cursor.execute(create_table_query)
+        # daily_click_summary is created by migrations (python migrate.py)
         
         # Sample data for the last 7 days
         today = date.today()
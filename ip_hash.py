@@ -0,0 +1,91 @@
+"""
+Keyed IP address hashing for the Portfolio Click Tracker
+Replaces the unsalted SHA-256 (trivially reversible over the IPv4 space)
+with BLAKE2b keyed by a daily rotating key, cached for hot IPs.
+
+The key for each UTC day is derived from IP_HASH_SECRET, so the same
+visitor hashes identically within a day (rate limiting, bot rules,
+repeat visits) but cannot be linked across days or brute-forced
+without the secret. Hashes are signed 64-bit ints for a BIGINT column.
+
+Without IP_HASH_SECRET the key is random per process, so hashes differ
+across workers and restarts. check_secret() (called at API startup) refuses
+that where IP_HASH_SECRET_REQUIRED is set, which defaults to on under Railway.
+"""
+
+import hashlib
+import os
+import secrets
+import time
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import Optional
+
+# Number of hot IPs kept in the per-process LRU cache
+IP_HASH_CACHE_SIZE = int(os.getenv("IP_HASH_CACHE_SIZE", "4096"))
+
+# Refuse to start with a random key (on by default in Railway deployments)
+IP_HASH_SECRET_REQUIRED = os.getenv(
+    "IP_HASH_SECRET_REQUIRED", "true" if os.getenv("RAILWAY_ENVIRONMENT") else "false"
+).lower() in ("1", "true", "yes")
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+_secret = os.getenv("IP_HASH_SECRET", "").encode()
+SECRET_CONFIGURED = bool(_secret)
+if not SECRET_CONFIGURED:
+    # Still keyed, but hashes won't match across restarts or workers
+    _secret = secrets.token_bytes(32)
+
+# BLAKE2b keys are at most 64 bytes, so condense secrets of any length first
+_master_key = hashlib.blake2b(_secret, digest_size=32, person=b"lubo-ip-master").digest()
+
+
+@lru_cache(maxsize=8)
+def daily_key(day_ordinal: int) -> bytes:
+    """Derive the 32-byte BLAKE2b key for one UTC day from the master secret"""
+    return hashlib.blake2b(
+        str(day_ordinal).encode(),
+        key=_master_key,
+        digest_size=32,
+        person=b"lubo-ip-day-key",
+    ).digest()
+
+
+@lru_cache(maxsize=IP_HASH_CACHE_SIZE)
+def _hash_for_day(ip_address: str, day_ordinal: int) -> int:
+    digest = hashlib.blake2b(ip_address.encode(), key=daily_key(day_ordinal), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def hash_ip(ip_address: Optional[str], now: Optional[datetime] = None) -> Optional[int]:
+    """Hash an IP address with today's key; returns a signed 64-bit int (or None)"""
+    if not ip_address:
+        return None
+    if now is None:
+        # Cheaper than building a datetime on every request
+        day = int(time.time() // 86400) + _EPOCH_ORDINAL
+    else:
+        day = now.astimezone(timezone.utc).date().toordinal()
+    return _hash_for_day(ip_address, day)
+
+
+def check_secret():
+    """Raise if IP_HASH_SECRET is required but missing; warn when falling back to a random key"""
+    if SECRET_CONFIGURED:
+        return
+    if IP_HASH_SECRET_REQUIRED:
+        raise RuntimeError("IP_HASH_SECRET is not set; refusing to hash IPs with a random per-process key")
+    print("⚠️  IP_HASH_SECRET not set - using a random per-process key for IP hashing")
+
+
+def legacy_hash_ip(ip_address: Optional[str]) -> Optional[str]:
+    """Previous unkeyed SHA-256 hash, kept only for benchmarking and migration"""
+    if not ip_address:
+        return None
+    return hashlib.sha256(ip_address.encode()).hexdigest()[:16]
+
+
+def cache_info():
+    """Hit/miss statistics for the hot-IP cache"""
+    return _hash_for_day.cache_info()
@@ -0,0 +1,150 @@
+"""
+Background job runner for aggregation work
+Runs jobs on a bounded worker pool with a single-flight guarantee per key:
+triggering a date that is already queued or running returns the existing
+job instead of starting a second full-day scan. Jobs can be polled and
+cancelled by id; running jobs stop at their next cancellation check.
+"""
+
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+ACTIVE_STATES = ("queued", "running")
+
+# Finished jobs kept for status lookups
+MAX_FINISHED_JOBS = 200
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested"""
+
+
+class Job:
+    """One unit of background work and its outcome"""
+
+    def __init__(self, key, name):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.name = name
+        self.status = "queued"
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.coalesced = 0
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """Call between steps of a long job; raises JobCancelled if cancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "key": str(self.key),
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "coalesced_triggers": self.coalesced,
+            "cancel_requested": self.cancel_requested,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobRunner:
+    """Bounded-concurrency executor with per-key single flight and status tracking"""
+
+    def __init__(self, max_workers=1):
+        # Imported here: daily_aggregator needs JobCancelled, but only the API runs a pool
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active = {}
+
+    def submit(self, key, name, fn):
+        """Queue fn(job) unless a job for key is already active; returns (job, coalesced)"""
+        with self._lock:
+            active = self._active.get(key)
+            if active is not None:
+                active.coalesced += 1
+                return active, True
+
+            job = Job(key, name)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._trim()
+        job.future = self._executor.submit(self._run, job, fn)
+        return job, False
+
+    def _run(self, job, fn):
+        with self._lock:
+            if job.cancel_requested:
+                self._finish(job, "cancelled")
+                return
+            job.status = "running"
+            job.started_at = datetime.now(timezone.utc)
+        try:
+            result = fn(job)
+        except JobCancelled:
+            print(f"🛑 Job {job.name} cancelled")
+            with self._lock:
+                self._finish(job, "cancelled")
+        except Exception as e:
+            print(f"❌ Job {job.name} failed: {e}")
+            with self._lock:
+                job.error = str(e)
+                self._finish(job, "failed")
+        else:
+            with self._lock:
+                job.result = result
+                self._finish(job, "succeeded")
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = datetime.now(timezone.utc)
+        if self._active.get(job.key) is job:
+            del self._active[job.key]
+
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if j.status not in ACTIVE_STATES]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id):
+        """Cancel a queued job immediately or ask a running one to stop; returns the job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in ACTIVE_STATES:
+                return job
+            job._cancel.set()
+            if job.status == "queued" and job.future is not None and job.future.cancel():
+                self._finish(job, "cancelled")
+            return job
+
+    def shutdown(self):
+        """Drop queued jobs and let running ones stop at their next check"""
+        with self._lock:
+            for job in self._active.values():
+                job._cancel.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
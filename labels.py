@@ -0,0 +1,32 @@
+"""
+Display labels shared by the aggregator and the API
+Pure string helpers that normalize pages, referrers and user agents the same
+way in daily summaries, live counters and path queries. Kept free of
+database and aggregation imports so the API can load them at startup.
+"""
+
+
+def device_type(user_agent):
+    """Classify a user agent string as Mobile or Desktop"""
+    ua = (user_agent or '').lower()
+    if 'mobile' in ua or 'android' in ua or 'iphone' in ua:
+        return 'Mobile'
+    return 'Desktop'
+
+
+def referrer_label(referrer):
+    """Normalize a referrer to a full URL or 'Direct Traffic'"""
+    referrer = (referrer or '').strip()
+    if not referrer or referrer == 'null' or not referrer.startswith('http'):
+        return 'Direct Traffic'
+    return referrer
+
+
+def page_label(page_name):
+    """Normalize a page name to 'home' or a /path"""
+    page_name = page_name or 'unknown'
+    if page_name == 'home':
+        return 'home'
+    if not page_name.startswith('/'):
+        return f'/{page_name}'
+    return page_name
@@ -0,0 +1,116 @@
+"""
+Scheduler leader election across API workers and replicas
+Every uvicorn worker (and every replica) runs the ingest endpoints, but only
+one of them may run the scheduled jobs. Leadership is a Postgres session
+advisory lock held on a dedicated connection: the worker that gets it starts
+the scheduler, the others retry every LEADER_RETRY_SECONDS. If the leader
+exits or its connection dies, Postgres releases the lock and a follower takes
+over on its next attempt.
+
+The per-date aggregation lock and the sessionizer lock still guard the jobs
+themselves, so a brief overlap during failover cannot double-aggregate.
+"""
+
+import os
+import threading
+
+import psycopg2
+
+# Session advisory lock held by the worker that runs the scheduler
+SCHEDULER_LOCK_KEY = 4_048_001
+
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "15"))
+
+
+class LeaderElection:
+    """Hold SCHEDULER_LOCK_KEY on a dedicated connection and report gains and losses of leadership"""
+
+    def __init__(self, db_url, on_acquired, on_lost, retry_seconds=LEADER_RETRY_SECONDS):
+        self.db_url = db_url
+        self.on_acquired = on_acquired
+        self.on_lost = on_lost
+        self.retry_seconds = retry_seconds
+        self.is_leader = False
+        self.elections_won = 0
+        self._conn = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Try once right away, then keep checking in a background thread"""
+        self._thread = threading.Thread(target=self._run, name="leader-election", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        # Keepalives so a leader cut off from the database loses the lock in bounded time
+        conn = psycopg2.connect(self.db_url, keepalives=1, keepalives_idle=30,
+                                keepalives_interval=10, keepalives_count=3,
+                                application_name="click-tracker-scheduler-leader")
+        conn.autocommit = True
+        return conn
+
+    def _try_acquire(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self._connect()
+        with self._conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (SCHEDULER_LOCK_KEY,))
+            return cursor.fetchone()[0]
+
+    def _still_connected(self):
+        """The lock lives as long as the session; a failed ping means it may already be gone"""
+        try:
+            with self._conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.is_leader:
+                if not self._still_connected():
+                    print("⚠️  Lost the scheduler leader connection, stepping down")
+                    self._step_down()
+            else:
+                try:
+                    acquired = self._try_acquire()
+                except psycopg2.Error as e:
+                    print(f"⚠️  Scheduler leader election failed: {e}")
+                    self._close()
+                    acquired = False
+                if acquired:
+                    self.is_leader = True
+                    self.elections_won += 1
+                    print(f"👑 Acquired scheduler leadership (pid {os.getpid()})")
+                    try:
+                        self.on_acquired()
+                    except Exception as e:
+                        # Hand the lock to a follower rather than lead without a scheduler
+                        print(f"❌ Error starting leader-only work: {e}")
+                        self._step_down()
+            self._stop.wait(self.retry_seconds)
+
+    def _step_down(self):
+        self.is_leader = False
+        self._close()
+        try:
+            self.on_lost()
+        except Exception as e:
+            print(f"❌ Error stopping leader-only work: {e}")
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+            self._conn = None
+
+    def stop(self):
+        """Release leadership (closing the session frees the lock for a follower at once)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self.is_leader:
+            self._step_down()
+        self._close()
@@ -0,0 +1,167 @@
+"""
+Real-time traffic counters for today's numbers
+The API process keeps pageviews per page, referrer group and device in
+one-minute buckets over a rolling window (24h by default), updated on every
+track_click without touching the database. Memory is bounded: old buckets are
+evicted, and each bucket keeps at most LIVE_MAX_KEYS distinct values per
+dimension, folding the rest into "(other)".
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+from psycopg2.extras import Json
+
+from labels import device_type, page_label
+
+LIVE_WINDOW_MINUTES = int(os.getenv("LIVE_WINDOW_MINUTES", "1440"))
+LIVE_MAX_KEYS = int(os.getenv("LIVE_MAX_KEYS", "200"))
+
+OTHER = "(other)"
+DIMENSIONS = ("pages", "referrers", "devices")
+
+
+def referrer_group(referrer):
+    """Collapse a referrer URL to its host ('Direct Traffic' when missing)"""
+    referrer = (referrer or "").strip()
+    if not referrer.startswith("http"):
+        return "Direct Traffic"
+    host = urlparse(referrer).netloc.lower()
+    return host[4:] if host.startswith("www.") else host or "Direct Traffic"
+
+
+def current_minute():
+    return int(time.time() // 60)
+
+
+class MinuteBucket:
+    """Pageview counts for one minute"""
+
+    __slots__ = ("pageviews", "pages", "referrers", "devices")
+
+    def __init__(self):
+        self.pageviews = 0
+        self.pages = Counter()
+        self.referrers = Counter()
+        self.devices = Counter()
+
+    def add(self, dimension, key, max_keys, count=1):
+        counts = getattr(self, dimension)
+        # One of the max_keys slots is reserved for OTHER
+        if key not in counts and len(counts) >= max_keys - 1:
+            key = OTHER
+        counts[key] += count
+
+    def to_dict(self):
+        return {"pageviews": self.pageviews, **{d: dict(getattr(self, d)) for d in DIMENSIONS}}
+
+
+class LiveCounters:
+    """Rolling minute buckets of pageviews, safe to update from any thread"""
+
+    def __init__(self, window_minutes=LIVE_WINDOW_MINUTES, max_keys=LIVE_MAX_KEYS):
+        self.window_minutes = window_minutes
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _evict(self, minute):
+        oldest = minute - self.window_minutes
+        for stale in [m for m in self._buckets if m <= oldest]:
+            del self._buckets[stale]
+
+    def record(self, page_name, referrer, user_agent, minute=None):
+        """Count one pageview"""
+        minute = current_minute() if minute is None else minute
+        keys = (page_label(page_name), referrer_group(referrer), device_type(user_agent))
+        with self._lock:
+            bucket = self._buckets.get(minute)
+            if bucket is None:
+                if minute <= max(self._buckets, default=minute) - self.window_minutes:
+                    return
+                bucket = self._buckets[minute] = MinuteBucket()
+                self._evict(max(self._buckets))
+            bucket.pageviews += 1
+            for dimension, key in zip(DIMENSIONS, keys):
+                bucket.add(dimension, key, self.max_keys)
+
+    def totals(self, minutes=None, top=20, now=None):
+        """Totals and a per-minute series over the last `minutes` minutes"""
+        now = current_minute() if now is None else now
+        minutes = min(minutes or self.window_minutes, self.window_minutes)
+        since = now - minutes
+        totals = {d: Counter() for d in DIMENSIONS}
+        series = []
+        pageviews = 0
+        with self._lock:
+            for minute in sorted(m for m in self._buckets if since < m <= now):
+                bucket = self._buckets[minute]
+                pageviews += bucket.pageviews
+                series.append((minute * 60, bucket.pageviews))
+                for dimension in DIMENSIONS:
+                    totals[dimension].update(getattr(bucket, dimension))
+        return {
+            "minutes": minutes,
+            "pageviews": pageviews,
+            **{d: totals[d].most_common(top) for d in DIMENSIONS},
+            "per_minute": series,
+        }
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "window_minutes": self.window_minutes,
+                "buckets": {str(m): b.to_dict() for m, b in self._buckets.items()},
+            }
+
+    def load(self, snapshot, now=None, replace=False):
+        """Merge (or with replace=True, swap in) a to_dict() snapshot, skipping buckets that have left the window"""
+        now = current_minute() if now is None else now
+        with self._lock:
+            if replace:
+                self._buckets.clear()
+            for key, data in snapshot.get("buckets", {}).items():
+                minute = int(key)
+                if minute <= now - self.window_minutes or minute > now:
+                    continue
+                bucket = self._buckets.setdefault(minute, MinuteBucket())
+                bucket.pageviews += data.get("pageviews", 0)
+                for dimension in DIMENSIONS:
+                    for value, count in data.get(dimension, {}).items():
+                        bucket.add(dimension, value, self.max_keys, count)
+            self._evict(now)
+
+    @property
+    def bucket_count(self):
+        return len(self._buckets)
+
+
+def save_snapshot(conn, counters):
+    """Persist the counters so a restart doesn't zero today's numbers"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO live_counters_snapshot (id, snapshot, saved_at) VALUES (1, %s, NOW())
+            ON CONFLICT (id) DO UPDATE SET snapshot = EXCLUDED.snapshot, saved_at = EXCLUDED.saved_at
+        """, (Json(counters.to_dict()),))
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def load_snapshot(conn, counters, replace=False):
+    """Restore the last saved snapshot; returns True if one was found"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT snapshot FROM live_counters_snapshot WHERE id = 1")
+        row = cursor.fetchone()
+        conn.commit()
+    finally:
+        cursor.close()
+    if row is None:
+        return False
+    counters.load(row["snapshot"], replace=replace)
+    return True
@@ -0,0 +1,22 @@
+"""
+Materialized views behind the analytics dashboard
+Each view is shaped for one dashboard panel so the dashboard reads tiny,
+ready-to-plot result sets instead of reshaping daily_click_summary JSON.
+The views and the unique indexes REFRESH ... CONCURRENTLY needs are created
+by migrations (migrations/0002_summary_jsonb.sql has the current
+definitions). They are refreshed CONCURRENTLY after each DailyAggregator
+run, so readers are never blocked.
+"""
+
+DASHBOARD_VIEWS = ("mv_daily_trend", "mv_top_pages", "mv_device_split", "mv_referrer_ranking")
+
+
+def refresh_dashboard_views(conn):
+    """Refresh every dashboard view without blocking concurrent readers"""
+    cursor = conn.cursor()
+    try:
+        for name in DASHBOARD_VIEWS:
+            cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}")
+            conn.commit()
+    finally:
+        cursor.close()
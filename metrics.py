@@ -0,0 +1,262 @@
+"""
+Lightweight in-process metrics for the Portfolio Click Tracker API
+Histograms and counters rendered in Prometheus text exposition format.
+
+Instrumentation can be switched off with METRICS_ENABLED=0, in which case
+timers become no-ops. The cost of the instrumentation itself is calibrated
+at startup and exposed as metrics_timer_overhead_seconds.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Bucket upper bounds in seconds, tuned for sub-millisecond to multi-second stages
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value):
+    """Escape a label value for the text exposition format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names, label_values, extra=None):
+    """Render a Prometheus label set like {a="x",b="y"}"""
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    """Render a float the way Prometheus expects"""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Point-in-time value with optional labels"""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [per-bucket counts..., +Inf count, sum]
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def count(self, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        series = self._series.get(key)
+        return sum(series[:-1]) if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            base = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{base} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds all metrics for the process and renders them for /metrics"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._get_or_create(Gauge, name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets)
+
+    @contextmanager
+    def timer(self, histogram, **labels):
+        """Time the wrapped block into histogram (no-op when metrics are disabled)"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - started, **labels)
+
+    def calibrate_overhead(self, iterations=2000):
+        """Measure the per-timer cost of the instrumentation and publish it as a gauge"""
+        scratch = Histogram("calibration", "scratch", ("stage",))
+        was_enabled, self.enabled = self.enabled, True
+        started = time.perf_counter()
+        for _ in range(iterations):
+            with self.timer(scratch, stage="calibration"):
+                pass
+        per_timer = (time.perf_counter() - started) / iterations
+        self.enabled = was_enabled
+        self.gauge(
+            "metrics_timer_overhead_seconds",
+            "Measured cost of one instrumentation timer (enter + exit + observe)",
+        ).set(per_timer)
+        return per_timer
+
+    def render(self):
+        """Render all metrics in Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off")
+
+
+# Process-wide registry shared by the API and the connection pool
+REGISTRY = MetricsRegistry(enabled=_env_flag("METRICS_ENABLED", True))
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Total time spent serving HTTP requests",
+    ("method", "route", "status"),
+)
+STAGE_DURATION = REGISTRY.histogram(
+    "tracker_stage_duration_seconds",
+    "Time spent in each stage of an endpoint's hot path",
+    ("endpoint", "stage"),
+)
+DB_POOL_WAIT = REGISTRY.histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a free connection from the database pool",
+)
+
+
+def _route_label(app, scope):
+    """Resolve the route template for a request so labels stay low-cardinality"""
+    from starlette.routing import Match
+
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording total request time per route"""
+
+    def __init__(self, app, registry=REGISTRY, route_app=None):
+        self.app = app
+        self.registry = registry
+        self.route_app = route_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.registry.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        # Handlers read this to time everything before they were entered (body parse + validation)
+        scope.setdefault("state", {})["metrics_started"] = started
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _route_label(self.route_app, scope) if self.route_app is not None else scope.get("path", "")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=scope.get("method", ""),
+                route=route,
+                status=str(status_code),
+            )
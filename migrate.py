@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for the Portfolio Click Tracker
+Applies the numbered SQL files in migrations/ (NNNN_description.sql) in
+order and records each one in schema_migrations, so every database moves
+forward through the same steps. Runs as its own step before the web and
+cron services start (Railway preDeployCommand); nothing else runs DDL.
+
+    python migrate.py              # apply pending migrations
+    python migrate.py status       # list applied / pending migrations
+    python migrate.py --dry-run    # show what would run
+    python migrate.py --target 3   # stop after version 3
+
+A file whose first line is `-- migrate: no-transaction` runs statement by
+statement outside a transaction (needed for CREATE INDEX CONCURRENTLY);
+every other file runs in a single transaction that waits at most
+MIGRATION_LOCK_TIMEOUT for its table locks, so a migration fails fast
+instead of queueing ingest behind it.
+
+A database still on the original text click_logs layout (page_name/tag
+columns, no page_id) has to be converted first with
+scripts/migrate_compact_click_logs.py; the baseline refuses to run on it.
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from projects import DEFAULT_PROJECT
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+
+# Session advisory lock so two deploys never migrate at the same time
+MIGRATION_LOCK_KEY = 4_047_001
+
+NO_TRANSACTION = "-- migrate: no-transaction"
+FILENAME = re.compile(r"^(\d{4})_([a-z0-9_]+)\.sql$")
+
+# Values available to migrations as %(name)s
+PARAMS = {"default_project": DEFAULT_PROJECT}
+
+CREATE_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    duration_ms FLOAT NOT NULL
+);
+"""
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration:
+    """One migrations/NNNN_name.sql file"""
+
+    def __init__(self, version, name, sql):
+        self.version = version
+        self.name = name
+        self.sql = sql
+        self.transactional = not sql.lstrip().startswith(NO_TRANSACTION)
+        self.checksum = hashlib.blake2b(sql.encode(), digest_size=16).hexdigest()
+
+    def statements(self):
+        """Top-level statements, for files that run outside a transaction (no DO blocks there)"""
+        body = "\n".join(line for line in self.sql.splitlines() if not line.strip().startswith("--"))
+        return [s.strip() for s in body.split(";") if s.strip()]
+
+    def params(self):
+        return PARAMS if "%(" in self.sql else None
+
+    def __repr__(self):
+        return f"{self.version:04d}_{self.name}"
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Migrations in version order; rejects stray files and duplicate versions"""
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".sql"):
+            continue
+        match = FILENAME.match(filename)
+        if not match:
+            raise MigrationError(f"Bad migration file name: {filename} (expected NNNN_description.sql)")
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Duplicate migration version {version}: {filename}")
+        with open(os.path.join(directory, filename)) as f:
+            migrations[version] = Migration(version, match.group(2), f.read())
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def check_click_logs_layout(conn):
+    """Stop before the baseline if click_logs still has the pre-compact text layout"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT to_regclass('click_logs') IS NOT NULL AS present,
+                   EXISTS (SELECT 1 FROM information_schema.columns
+                           WHERE table_name = 'click_logs' AND column_name = 'page_id') AS compact
+        """)
+        row = cursor.fetchone()
+        conn.commit()
+    finally:
+        cursor.close()
+    if row["present"] and not row["compact"]:
+        raise MigrationError(
+            "click_logs still uses the legacy text layout (no page_id column). Convert it first with "
+            "`python scripts/migrate_compact_click_logs.py --measure-days 0`, then run migrate.py again")
+
+
+def applied_migrations(conn):
+    """{version: checksum} of migrations already recorded in schema_migrations"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CREATE_MIGRATIONS_TABLE)
+        cursor.execute("SELECT version, checksum FROM schema_migrations")
+        applied = {row["version"]: row["checksum"] for row in cursor.fetchall()}
+        conn.commit()
+        return applied
+    finally:
+        cursor.close()
+
+
+def apply_migration(conn, migration):
+    """Run one migration and record it; returns its duration in ms"""
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        if migration.transactional:
+            cursor.execute("SET LOCAL lock_timeout = %s", (MIGRATION_LOCK_TIMEOUT,))
+            cursor.execute(migration.sql, migration.params())
+        else:
+            # CONCURRENTLY only takes locks that don't block writes, so it may wait as long as it needs
+            conn.commit()
+            conn.autocommit = True
+            try:
+                for statement in migration.statements():
+                    cursor.execute(statement, migration.params())
+            finally:
+                conn.autocommit = False
+        duration_ms = (time.perf_counter() - started) * 1000
+        cursor.execute("""
+            INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+            VALUES (%s, %s, %s, %s)
+        """, (migration.version, migration.name, migration.checksum, round(duration_ms, 1)))
+        conn.commit()
+        return duration_ms
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def migrate(conn, target=None, dry_run=False, migrations=None):
+    """Apply pending migrations up to target (default: all); returns the versions applied"""
+    migrations = load_migrations() if migrations is None else migrations
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    conn.commit()
+    try:
+        applied = applied_migrations(conn)
+        for migration in migrations:
+            checksum = applied.get(migration.version)
+            if checksum is not None and checksum != migration.checksum:
+                print(f"⚠️  {migration} was edited after it was applied; add a new migration instead")
+
+        pending = [m for m in migrations
+                   if m.version not in applied and (target is None or m.version <= target)]
+        if not pending:
+            print("✓ Database schema is up to date")
+            return []
+        if pending[0].version == 1:
+            check_click_logs_layout(conn)
+        for migration in pending:
+            if dry_run:
+                mode = "transaction" if migration.transactional else "no transaction"
+                print(f"  would apply {migration} ({mode})")
+                continue
+            print(f"  ▶ {migration}...")
+            duration_ms = apply_migration(conn, migration)
+            print(f"  ✓ {migration} ({duration_ms:.0f}ms)")
+        return [m.version for m in pending]
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        conn.commit()
+        cursor.close()
+
+
+def print_status(conn):
+    applied = applied_migrations(conn)
+    for migration in load_migrations():
+        state = "applied" if migration.version in applied else "pending"
+        print(f"  {'✓' if state == 'applied' else '·'} {migration} ({state})")
+
+
+def database_url():
+    return os.getenv("DATABASE_URL") or os.getenv("DB_URL")
+
+
+def migrate_database(target=None, dry_run=False):
+    """Connect with DATABASE_URL and apply pending migrations"""
+    db_url = database_url()
+    if not db_url:
+        raise MigrationError("No database URL found in environment variables")
+    conn = psycopg2.connect(db_url, cursor_factory=RealDictCursor)
+    try:
+        return migrate(conn, target, dry_run)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    parser.add_argument("command", nargs="?", choices=("up", "status"), default="up")
+    parser.add_argument("--target", type=int, help="Last version to apply")
+    parser.add_argument("--dry-run", action="store_true", help="List pending migrations without applying them")
+    args = parser.parse_args()
+
+    if not database_url():
+        sys.exit("❌ No database URL found in environment variables")
+    if args.command == "status":
+        conn = psycopg2.connect(database_url(), cursor_factory=RealDictCursor)
+        try:
+            print_status(conn)
+        finally:
+            conn.close()
+        return
+
+    print("🛠️  Applying database migrations...")
+    try:
+        migrate_database(args.target, args.dry_run)
+    except Exception as e:
+        sys.exit(f"❌ Migration failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+-- Baseline: the schema as the API, aggregator and scheduler jobs created it
+-- before versioned migrations. Every statement is idempotent so this applies
+-- cleanly both to an empty database and to one set up by the old ad-hoc
+-- CREATE TABLE calls; ADD COLUMN IF NOT EXISTS covers columns those added later.
+
+-- Dimension tables for the compact click_logs row format
+CREATE TABLE IF NOT EXISTS pages (
+    id SERIAL PRIMARY KEY,
+    page_name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS referrers (
+    id SERIAL PRIMARY KEY,
+    referrer TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS user_agents (
+    id SERIAL PRIMARY KEY,
+    user_agent TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS projects (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+INSERT INTO projects (id, name) VALUES (1, %(default_project)s) ON CONFLICT DO NOTHING;
+SELECT setval('projects_id_seq', GREATEST((SELECT max(id) FROM projects), 1));
+
+-- Raw tracker events
+CREATE TABLE IF NOT EXISTS click_logs (
+    id BIGSERIAL PRIMARY KEY,
+    timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    session_id UUID NOT NULL,
+    ip_hash BIGINT,
+    page_id INT NOT NULL REFERENCES pages(id),
+    referrer_id INT REFERENCES referrers(id),
+    user_agent_id INT NOT NULL REFERENCES user_agents(id),
+    time_on_page INT NOT NULL,
+    event_type SMALLINT NOT NULL DEFAULT 0,
+    project_id INT NOT NULL DEFAULT 1 REFERENCES projects(id)
+);
+ALTER TABLE click_logs ADD COLUMN IF NOT EXISTS project_id INT NOT NULL DEFAULT 1 REFERENCES projects(id);
+CREATE INDEX IF NOT EXISTS idx_click_logs_timestamp ON click_logs (timestamp);
+CREATE INDEX IF NOT EXISTS idx_click_logs_project_timestamp ON click_logs (project_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_click_logs_page_id ON click_logs (page_id, id);
+CREATE INDEX IF NOT EXISTS idx_click_logs_session_id ON click_logs (session_id, id);
+CREATE OR REPLACE VIEW click_logs_expanded AS
+SELECT c.id, c.timestamp, p.page_name,
+       CASE c.event_type WHEN 1 THEN 'arrival' WHEN 2 THEN 'exit' END AS tag,
+       u.user_agent, r.referrer, c.session_id, c.time_on_page, c.ip_hash,
+       pr.name AS project
+FROM click_logs c
+JOIN pages p ON p.id = c.page_id
+JOIN user_agents u ON u.id = c.user_agent_id
+JOIN projects pr ON pr.id = c.project_id
+LEFT JOIN referrers r ON r.id = c.referrer_id;
+
+-- Bot/crawler events kept out of click_logs (BOT_FILTER_MODE=side_table)
+CREATE TABLE IF NOT EXISTS bot_clicks (
+    id BIGSERIAL PRIMARY KEY,
+    timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    ip_hash BIGINT,
+    reason TEXT NOT NULL,
+    page_name TEXT,
+    user_agent TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_bot_clicks_timestamp ON bot_clicks (timestamp);
+
+-- Raw clicks of aggregated days past the retention horizon
+CREATE TABLE IF NOT EXISTS click_logs_archive (
+    id BIGINT PRIMARY KEY,
+    timestamp TIMESTAMPTZ NOT NULL,
+    session_id UUID NOT NULL,
+    ip_hash BIGINT,
+    page_id INT NOT NULL,
+    referrer_id INT,
+    user_agent_id INT NOT NULL,
+    time_on_page INT NOT NULL,
+    event_type SMALLINT NOT NULL,
+    project_id INT NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_click_logs_archive_timestamp ON click_logs_archive (timestamp);
+CREATE INDEX IF NOT EXISTS idx_click_logs_archive_page_id ON click_logs_archive (page_id, id);
+CREATE INDEX IF NOT EXISTS idx_click_logs_archive_session_id ON click_logs_archive (session_id, id);
+CREATE OR REPLACE VIEW click_logs_all AS
+SELECT id, timestamp, session_id, ip_hash, page_id, referrer_id, user_agent_id, time_on_page, event_type, project_id
+FROM click_logs
+UNION ALL
+SELECT id, timestamp, session_id, ip_hash, page_id, referrer_id, user_agent_id, time_on_page, event_type, project_id
+FROM click_logs_archive;
+
+-- Aggregated analytics, one row per (date, project, tag)
+CREATE TABLE IF NOT EXISTS daily_click_summary (
+    id SERIAL PRIMARY KEY,
+    date DATE NOT NULL,
+    project_name TEXT NOT NULL,
+    total_clicks INT NOT NULL DEFAULT 0,
+    avg_time_on_page FLOAT,
+    device_split JSON,
+    top_referrers JSON,
+    top_pages JSON,
+    repeat_visits INT NOT NULL DEFAULT 0,
+    tag TEXT,
+    content_hash TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+ALTER TABLE daily_click_summary ADD COLUMN IF NOT EXISTS top_pages JSON;
+ALTER TABLE daily_click_summary ADD COLUMN IF NOT EXISTS content_hash TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS daily_click_summary_date_project_name_tag_key
+    ON daily_click_summary (date, project_name, tag);
+
+-- Aggregation run telemetry
+CREATE TABLE IF NOT EXISTS aggregation_runs (
+    id SERIAL PRIMARY KEY,
+    target_date DATE NOT NULL,
+    engine TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL,
+    duration_seconds FLOAT NOT NULL,
+    rows_scanned INT NOT NULL DEFAULT 0,
+    pageviews INT NOT NULL DEFAULT 0,
+    rows_filtered INT NOT NULL DEFAULT 0,
+    fetch_seconds FLOAT NOT NULL DEFAULT 0,
+    dedupe_seconds FLOAT NOT NULL DEFAULT 0,
+    compute_seconds FLOAT NOT NULL DEFAULT 0,
+    write_seconds FLOAT NOT NULL DEFAULT 0,
+    peak_memory_kb BIGINT,
+    error TEXT
+);
+ALTER TABLE aggregation_runs ADD COLUMN IF NOT EXISTS rows_filtered INT NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_aggregation_runs_started_at ON aggregation_runs (started_at);
+
+-- Visits built incrementally by sessionizer.py
+CREATE TABLE IF NOT EXISTS sessions (
+    id BIGSERIAL PRIMARY KEY,
+    visitor_id UUID NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    ended_at TIMESTAMPTZ NOT NULL,
+    pageviews INT NOT NULL DEFAULT 0,
+    entry_page_id INT REFERENCES pages(id),
+    exit_page_id INT REFERENCES pages(id),
+    duration_seconds INT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_visitor_ended ON sessions (visitor_id, ended_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_started_at ON sessions (started_at);
+CREATE TABLE IF NOT EXISTS sessionizer_state (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    last_click_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+INSERT INTO sessionizer_state (id, last_click_id) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+
+-- Snapshot of the API's in-memory live counters
+CREATE TABLE IF NOT EXISTS live_counters_snapshot (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    snapshot JSONB NOT NULL,
+    saved_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Dashboard materialized views, one per panel
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_daily_trend AS
+SELECT date, project_name,
+       SUM(total_clicks)::int AS total_clicks,
+       SUM(repeat_visits)::int AS repeat_visits,
+       ROUND(AVG(avg_time_on_page)::numeric, 2)::float AS avg_time_on_page
+FROM daily_click_summary
+GROUP BY date, project_name;
+CREATE UNIQUE INDEX IF NOT EXISTS mv_daily_trend_key ON mv_daily_trend (date, project_name);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_top_pages AS
+SELECT s.date, s.project_name, p.key AS page, SUM(p.value::int)::int AS clicks
+FROM daily_click_summary s
+CROSS JOIN LATERAL json_each_text(s.top_pages) AS p
+WHERE s.top_pages IS NOT NULL
+GROUP BY s.date, s.project_name, p.key;
+CREATE UNIQUE INDEX IF NOT EXISTS mv_top_pages_key ON mv_top_pages (date, project_name, page);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_device_split AS
+SELECT s.date, s.project_name, d.key AS device, SUM(d.value::int)::int AS pageviews
+FROM daily_click_summary s
+CROSS JOIN LATERAL json_each_text(s.device_split) AS d
+WHERE s.device_split IS NOT NULL
+GROUP BY s.date, s.project_name, d.key;
+CREATE UNIQUE INDEX IF NOT EXISTS mv_device_split_key ON mv_device_split (date, project_name, device);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_referrer_ranking AS
+SELECT s.date, s.project_name, r.key AS referrer, SUM(r.value::int)::int AS visits
+FROM daily_click_summary s
+CROSS JOIN LATERAL json_each_text(s.top_referrers) AS r
+WHERE s.top_referrers IS NOT NULL
+GROUP BY s.date, s.project_name, r.key;
+CREATE UNIQUE INDEX IF NOT EXISTS mv_referrer_ranking_key ON mv_referrer_ranking (date, project_name, referrer);
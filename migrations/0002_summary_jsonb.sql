@@ -0,0 +1,40 @@
+-- daily_click_summary JSON columns -> JSONB
+-- JSONB is stored parsed, so the dashboard views no longer re-parse every
+-- row's text on refresh, and the columns can be indexed or queried with
+-- containment operators. The views depend on the columns, so they are
+-- rebuilt (with jsonb_each_text) in the same transaction; readers see the
+-- old views until commit. The table is one row per day and project, so the
+-- rewrite is short.
+
+DROP MATERIALIZED VIEW IF EXISTS mv_top_pages;
+DROP MATERIALIZED VIEW IF EXISTS mv_device_split;
+DROP MATERIALIZED VIEW IF EXISTS mv_referrer_ranking;
+
+ALTER TABLE daily_click_summary
+    ALTER COLUMN device_split TYPE JSONB USING device_split::jsonb,
+    ALTER COLUMN top_referrers TYPE JSONB USING top_referrers::jsonb,
+    ALTER COLUMN top_pages TYPE JSONB USING top_pages::jsonb;
+
+CREATE MATERIALIZED VIEW mv_top_pages AS
+SELECT s.date, s.project_name, p.key AS page, SUM(p.value::int)::int AS clicks
+FROM daily_click_summary s
+CROSS JOIN LATERAL jsonb_each_text(s.top_pages) AS p
+WHERE s.top_pages IS NOT NULL
+GROUP BY s.date, s.project_name, p.key;
+CREATE UNIQUE INDEX mv_top_pages_key ON mv_top_pages (date, project_name, page);
+
+CREATE MATERIALIZED VIEW mv_device_split AS
+SELECT s.date, s.project_name, d.key AS device, SUM(d.value::int)::int AS pageviews
+FROM daily_click_summary s
+CROSS JOIN LATERAL jsonb_each_text(s.device_split) AS d
+WHERE s.device_split IS NOT NULL
+GROUP BY s.date, s.project_name, d.key;
+CREATE UNIQUE INDEX mv_device_split_key ON mv_device_split (date, project_name, device);
+
+CREATE MATERIALIZED VIEW mv_referrer_ranking AS
+SELECT s.date, s.project_name, r.key AS referrer, SUM(r.value::int)::int AS visits
+FROM daily_click_summary s
+CROSS JOIN LATERAL jsonb_each_text(s.top_referrers) AS r
+WHERE s.top_referrers IS NOT NULL
+GROUP BY s.date, s.project_name, r.key;
+CREATE UNIQUE INDEX mv_referrer_ranking_key ON mv_referrer_ranking (date, project_name, referrer);
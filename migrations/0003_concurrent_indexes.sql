@@ -0,0 +1,14 @@
+-- migrate: no-transaction
+-- Indexes for the lookups retention and the analytics API make on every run.
+-- CONCURRENTLY builds them without blocking inserts; it cannot run inside a
+-- transaction, so each statement runs on its own. A build that fails leaves
+-- an INVALID index behind: drop it and re-run `python migrate.py`.
+
+-- retention._is_aggregated: has this day got a successful run?
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_aggregation_runs_target_date
+    ON aggregation_runs (target_date, status);
+
+-- Project-filtered date ranges over daily_click_summary
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_daily_click_summary_project_date
+    ON daily_click_summary (project_name, date);
+
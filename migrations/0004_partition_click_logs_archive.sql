@@ -0,0 +1,56 @@
+-- click_logs_archive -> monthly range partitions on timestamp
+-- Whole months can then be detached, dumped or dropped as single tables
+-- instead of by large DELETEs. retention.py creates a month's partition
+-- before moving the first day into it. The archive is written only by the
+-- nightly retention run, never by ingest, so swapping the table here does
+-- not hold up /api/track-click.
+
+ALTER TABLE click_logs_archive RENAME TO click_logs_archive_unpartitioned;
+
+CREATE TABLE click_logs_archive (
+    id BIGINT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
+    session_id UUID NOT NULL,
+    ip_hash BIGINT,
+    page_id INT NOT NULL,
+    referrer_id INT,
+    user_agent_id INT NOT NULL,
+    time_on_page INT NOT NULL,
+    event_type SMALLINT NOT NULL,
+    project_id INT NOT NULL DEFAULT 1
+) PARTITION BY RANGE (timestamp);
+
+DO $$
+DECLARE
+    month DATE;
+BEGIN
+    FOR month IN
+        SELECT DISTINCT date_trunc('month', timestamp)::date FROM click_logs_archive_unpartitioned
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF click_logs_archive FOR VALUES FROM (%L) TO (%L)',
+            'click_logs_archive_' || to_char(month, 'YYYYMM'), month, (month + INTERVAL '1 month')::date
+        );
+    END LOOP;
+END
+$$;
+
+INSERT INTO click_logs_archive
+    (id, timestamp, session_id, ip_hash, page_id, referrer_id, user_agent_id, time_on_page, event_type, project_id)
+SELECT id, timestamp, session_id, ip_hash, page_id, referrer_id, user_agent_id, time_on_page, event_type, project_id
+FROM click_logs_archive_unpartitioned;
+
+CREATE OR REPLACE VIEW click_logs_all AS
+SELECT id, timestamp, session_id, ip_hash, page_id, referrer_id, user_agent_id, time_on_page, event_type, project_id
+FROM click_logs
+UNION ALL
+SELECT id, timestamp, session_id, ip_hash, page_id, referrer_id, user_agent_id, time_on_page, event_type, project_id
+FROM click_logs_archive;
+
+DROP TABLE click_logs_archive_unpartitioned;
+
+-- Built on the parent so every current and future partition gets them
+ALTER TABLE click_logs_archive ADD PRIMARY KEY (id, timestamp);
+CREATE INDEX idx_click_logs_archive_timestamp ON click_logs_archive (timestamp);
+CREATE INDEX idx_click_logs_archive_page_id ON click_logs_archive (page_id, id);
+CREATE INDEX idx_click_logs_archive_session_id ON click_logs_archive (session_id, id);
@@ -0,0 +1,15 @@
+-- Daily page-to-page transition counts per project (path_analysis.py)
+-- One row per (day, project, from page, to page) with the number of
+-- sessions that moved between them; page id 0 stands for the session's
+-- entry (from) or exit (to). Funnel and path queries sum these rows over a
+-- date range instead of rescanning click_logs. Written by the nightly
+-- aggregation in the same transaction as daily_click_summary.
+
+CREATE TABLE page_transitions (
+    date DATE NOT NULL,
+    project_id INT NOT NULL,
+    from_page_id INT NOT NULL,
+    to_page_id INT NOT NULL,
+    transitions INT NOT NULL,
+    PRIMARY KEY (date, project_id, from_page_id, to_page_id)
+);
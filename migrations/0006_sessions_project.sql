@@ -0,0 +1,18 @@
+-- Project of each session (sessionizer.py)
+-- Sessions are now built per visitor and project, so session metrics can be
+-- filtered like every other analytics read. Existing sessions take the
+-- project of their first event; the sessionizer fills the column from here on.
+
+ALTER TABLE sessions ADD COLUMN project_id INT;
+
+UPDATE sessions s
+SET project_id = (
+    SELECT c.project_id
+    FROM click_logs_all c
+    WHERE c.session_id = s.visitor_id
+      AND c.timestamp BETWEEN s.started_at AND s.ended_at
+    ORDER BY c.timestamp
+    LIMIT 1
+);
+
+CREATE INDEX idx_sessions_project_started_at ON sessions (project_id, started_at);
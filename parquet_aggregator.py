@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Offline aggregation over columnar exports of click_logs
+Runs DailyAggregator's bot-filter/dedupe/compute logic against the
+date-partitioned files written by scripts/export_parquet.py (Parquet, Arrow
+or CSV) instead of a live Postgres, one worker process per day. Parquet and
+Arrow files are memory-mapped. Summaries can be printed, saved as JSON or
+upserted back into daily_click_summary in bulk.
+
+    python parquet_aggregator.py exports/ 2025-01-01 2025-03-31 --processes 4
+    python parquet_aggregator.py exports/ 2025-01-01 2025-03-31 --json summaries.json
+    python parquet_aggregator.py exports/ 2025-01-01 2025-03-31 --write-back
+"""
+
+import argparse
+import json
+import os
+from datetime import date, timedelta
+from multiprocessing import Pool
+
+from aggregation_telemetry import RunTelemetry, record_run
+from daily_aggregator import DailyAggregator
+
+EXPORT_SUFFIXES = ("parquet", "arrow", "csv")
+CLICK_COLUMNS = ["project_id", "session_id", "page_id", "referrer_id", "user_agent_id",
+                 "time_on_page", "event_type", "timestamp", "ip_hash"]
+# dims key -> (export file, value column)
+DIMENSION_FILES = {
+    "pages": ("pages", "page_name"),
+    "referrers": ("referrers", "referrer"),
+    "user_agents": ("user_agents", "user_agent"),
+    "projects": ("projects", "name"),
+}
+
+
+def find_export(*parts):
+    """First existing export file for a path without suffix, or None"""
+    for suffix in EXPORT_SUFFIXES:
+        path = f"{os.path.join(*parts)}.{suffix}"
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_table(path, columns=None):
+    """Read one exported file as a pyarrow Table; Parquet and Arrow are memory-mapped"""
+    import pyarrow as pa
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns, memory_map=True)
+    if path.endswith(".arrow"):
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    else:
+        import pyarrow.csv as pacsv
+        table = pacsv.read_csv(path)
+    return table.select(columns) if columns else table
+
+
+class ParquetAggregator(DailyAggregator):
+    """DailyAggregator whose source is an export directory rather than a database cursor"""
+    engine = "parquet"
+
+    def __init__(self, export_dir):
+        # No database needed to compute; write_back() connects on its own
+        self.export_dir = export_dir
+        self._dimensions = None
+
+    def _fetch_clicks(self, source, target_date):
+        path = find_export(self.export_dir, "click_logs", f"date={target_date.isoformat()}", "part-0")
+        if path is None:
+            return []
+        return read_table(path, CLICK_COLUMNS).sort_by("timestamp").to_pylist()
+
+    def _fetch_dimensions(self, source, clicks):
+        """Whole dimension tables, loaded once per process"""
+        if self._dimensions is None:
+            self._dimensions = {}
+            for key, (name, column) in DIMENSION_FILES.items():
+                path = find_export(self.export_dir, "dimensions", name)
+                if path is None:
+                    raise FileNotFoundError(f"Missing dimension export {name} in {self.export_dir}")
+                table = read_table(path, ["id", column])
+                self._dimensions[key] = dict(zip(table.column("id").to_pylist(), table.column(column).to_pylist()))
+        return self._dimensions
+
+    def summarize_day(self, target_date):
+        """(summaries, telemetry) for one day; summaries is empty when the day has no export"""
+        telemetry = RunTelemetry(target_date, engine=self.engine)
+        try:
+            summaries = self._summarize(None, target_date, telemetry) or []
+        except Exception as e:
+            telemetry.finish("failed", e)
+            raise
+        telemetry.finish("success" if summaries else "empty")
+        return summaries, telemetry
+
+    def aggregate_range(self, start_date, end_date, processes=None):
+        """Summaries for [start_date, end_date], computed in a pool of worker processes"""
+        days = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+        if processes == 1:
+            results = [self.summarize_day(day) for day in days]
+        else:
+            with Pool(processes, initializer=_init_worker, initargs=(self.export_dir,)) as pool:
+                results = pool.map(_summarize_in_worker, days)
+
+        summaries, telemetries = [], []
+        for day_summaries, telemetry in results:
+            print(f"📅 {telemetry.target_date}: {telemetry.rows_scanned} events → "
+                  f"{telemetry.pageviews} pageviews {telemetry.summary_line()}")
+            summaries.extend(day_summaries)
+            telemetries.append(telemetry)
+        return summaries, telemetries
+
+    def write_back(self, summaries, telemetries=(), batch_size=500):
+        """Upsert summaries into daily_click_summary in bulk and record the runs; returns rows changed"""
+        target = DailyAggregator()
+        conn = target.get_db_connection()
+        cursor = conn.cursor()
+        changed = 0
+        try:
+            for i in range(0, len(summaries), batch_size):
+                changed_keys = target._write_summaries(cursor, summaries[i:i + batch_size])
+                target._write_transitions(cursor, summaries[i:i + batch_size], changed_keys)
+                changed += len(changed_keys)
+                conn.commit()
+            for telemetry in telemetries:
+                record_run(conn, telemetry)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        print(f"✅ Wrote back {len(summaries)} summaries: {changed} changed, {len(summaries) - changed} unchanged")
+        target.refresh_dashboard_views()
+        return changed
+
+
+# One aggregator per worker process, so dimension tables are read once per process
+_worker_aggregator = None
+
+
+def _init_worker(export_dir):
+    global _worker_aggregator
+    _worker_aggregator = ParquetAggregator(export_dir)
+
+
+def _summarize_in_worker(target_date):
+    return _worker_aggregator.summarize_day(target_date)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate exported click_logs without Postgres")
+    parser.add_argument("export_dir", help="Directory written by scripts/export_parquet.py")
+    parser.add_argument("start", type=date.fromisoformat)
+    parser.add_argument("end", type=date.fromisoformat)
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--json", help="Write the summaries to this JSON file")
+    parser.add_argument("--write-back", action="store_true", help="Upsert the summaries into daily_click_summary")
+    args = parser.parse_args()
+
+    aggregator = ParquetAggregator(args.export_dir)
+    summaries, telemetries = aggregator.aggregate_range(args.start, args.end, args.processes)
+    print(f"📊 {len(summaries)} project summaries over {len(telemetries)} day(s)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summaries, f, indent=2, default=str)
+        print(f"💾 Saved summaries to {args.json}")
+    if args.write_back:
+        aggregator.write_back(summaries, telemetries)
+
+
+if __name__ == "__main__":
+    main()
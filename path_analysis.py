@@ -0,0 +1,137 @@
+"""
+Page paths and funnels from daily transition counts
+For each day and project the aggregator orders every session's deduped
+pageviews by arrival time and counts page-to-page transitions, plus the
+session's entry and exit pages, into page_transitions. Queries over any
+date range sum those daily matrices and never touch click_logs.
+
+A pageview is one (session, page) as in daily_click_summary, so a page
+revisited within a session counts at its first arrival only. Arrival is the
+first event's timestamp minus its time_on_page: exact for arrival events
+(time_on_page 0), and it recovers the arrival of a pageview whose only row
+is its exit, e.g. a day compacted by retention (that row keeps the timestamp
+of the longest, i.e. exit, event).
+
+page_transitions is filled by the nightly run from migration 0005 onward;
+earlier days, archived ones included, are filled by
+`python daily_aggregator.py --backfill FIRST_DAY LAST_DAY`. Funnels are
+first-order estimates: each step keeps the share of the previous step's
+pageviews that moved straight on to the next page.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from psycopg2.extras import execute_values
+
+from labels import page_label
+
+# page id / label standing for "before the first page" and "after the last page"
+ENTRY_EXIT = 0
+ENTRY = "(entry)"
+EXIT = "(exit)"
+
+TRANSITIONS_QUERY = """
+    SELECT fp.page_name AS from_page, tp.page_name AS to_page, SUM(t.transitions)::int AS transitions
+    FROM page_transitions t
+    JOIN projects pr ON pr.id = t.project_id
+    LEFT JOIN pages fp ON fp.id = t.from_page_id
+    LEFT JOIN pages tp ON tp.id = t.to_page_id
+    WHERE t.date BETWEEN %s AND %s{project_sql}
+    GROUP BY fp.page_name, tp.page_name
+"""
+
+
+def count_transitions(pageviews, first_event_for_referrer):
+    """Counter of (from_page_id, to_page_id) over one project's deduped pageviews for a day"""
+    sessions = defaultdict(list)
+    for (session_id, page_id) in pageviews:
+        if session_id:
+            first = first_event_for_referrer[(session_id, page_id)]
+            arrived = first['timestamp'] - timedelta(seconds=first['time_on_page'] or 0)
+            sessions[session_id].append((arrived, page_id))
+
+    counts = Counter()
+    for visits in sessions.values():
+        path = [page_id for _, page_id in sorted(visits)]
+        counts[(ENTRY_EXIT, path[0])] += 1
+        counts.update(zip(path, path[1:]))
+        counts[(path[-1], ENTRY_EXIT)] += 1
+    return counts
+
+
+def transition_rows(summaries):
+    """page_transitions rows from the transitions DailyAggregator attaches to each summary"""
+    return [
+        (summary_data['date'], summary_data['project_id'], from_page, to_page, count)
+        for summary_data in summaries
+        for from_page, to_page, count in summary_data['transitions']
+    ]
+
+
+def write_transitions(cursor, summaries):
+    """Replace the stored transitions of the summaries' days and projects (caller commits)"""
+    keys = sorted({(summary_data['date'], summary_data['project_id']) for summary_data in summaries})
+    if not keys:
+        return
+    cursor.execute("""
+        DELETE FROM page_transitions
+        WHERE (date, project_id) IN (SELECT * FROM unnest(%s::date[], %s::int[]))
+    """, ([d for d, _ in keys], [p for _, p in keys]))
+    rows = transition_rows(summaries)
+    if rows:
+        execute_values(cursor, """
+            INSERT INTO page_transitions (date, project_id, from_page_id, to_page_id, transitions)
+            VALUES %s
+        """, rows, page_size=1000)
+
+
+def merge_transitions(rows):
+    """{(from_label, to_label): count} from TRANSITIONS_QUERY rows, pages normalized like the summaries"""
+    matrix = Counter()
+    for row in rows:
+        from_page = ENTRY if row["from_page"] is None else page_label(row["from_page"])
+        to_page = EXIT if row["to_page"] is None else page_label(row["to_page"])
+        matrix[(from_page, to_page)] += row["transitions"]
+    return matrix
+
+
+def pageviews_by_page(matrix):
+    """Pageviews per page: every pageview is entered exactly once, from the entry or another page"""
+    views = Counter()
+    for (_from_page, to_page), count in matrix.items():
+        if to_page != EXIT:
+            views[to_page] += count
+    return views
+
+
+def funnel(matrix, steps):
+    """Estimated sessions reaching each step of an ordered list of pages"""
+    views = pageviews_by_page(matrix)
+    result = []
+    reached = views[steps[0]]
+    for i, page in enumerate(steps):
+        if i == 0:
+            step_rate = None
+        else:
+            previous = steps[i - 1]
+            step_rate = matrix[(previous, page)] / views[previous] if views[previous] else 0.0
+            reached *= step_rate
+        result.append({
+            "page": page,
+            "pageviews": views[page],
+            "from_previous": matrix[(steps[i - 1], page)] if i else None,
+            "step_rate": round(step_rate, 4) if step_rate is not None else None,
+            "reached": round(reached, 1),
+        })
+    return result
+
+
+def neighbours(matrix, page, limit=10):
+    """Most common pages before and after `page` (including entry and exit)"""
+    before = Counter({src: count for (src, dst), count in matrix.items() if dst == page})
+    after = Counter({dst: count for (src, dst), count in matrix.items() if src == page})
+    return {
+        "previous": [{"page": p, "transitions": c} for p, c in before.most_common(limit)],
+        "next": [{"page": p, "transitions": c} for p, c in after.most_common(limit)],
+    }
@@ -0,0 +1,63 @@
+"""
+Project (site) resolution for multi-tenant ingest
+Each tracked site is a project. A beacon's project comes from its API key
+(X-API-Key header) when one is sent, otherwise from the Origin/Referer host,
+otherwise DEFAULT_PROJECT. Projects are stored as a small dimension table and
+click_logs carries the integer project_id.
+
+    PROJECT_API_KEYS="k3y1=portfolio,k3y2=blog"
+    PROJECT_ORIGINS="lubobali.com=portfolio,blog.lubobali.com=blog"
+"""
+
+import os
+from urllib.parse import urlparse
+
+# Existing rows (project_id 1) belong to the original portfolio site
+DEFAULT_PROJECT = os.getenv("DEFAULT_PROJECT", "lubobali_portfolio")
+DEFAULT_PROJECT_ID = 1
+
+
+class UnknownApiKey(Exception):
+    """Raised when a beacon sends an API key that maps to no project"""
+
+
+def parse_mapping(value):
+    """Parse 'a=b,c=d' into {'a': 'b', 'c': 'd'}"""
+    mapping = {}
+    for pair in (value or "").split(","):
+        if "=" in pair:
+            key, project = pair.split("=", 1)
+            if key.strip() and project.strip():
+                mapping[key.strip()] = project.strip()
+    return mapping
+
+
+PROJECT_API_KEYS = parse_mapping(os.getenv("PROJECT_API_KEYS"))
+PROJECT_ORIGINS = {host.lower(): project for host, project in parse_mapping(os.getenv("PROJECT_ORIGINS")).items()}
+
+
+def origin_host(url):
+    """Lower-cased host of an Origin/Referer URL, without a leading www."""
+    host = (urlparse(url).hostname or "") if url else ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def resolve_project(api_key=None, origin=None, referer=None):
+    """Project name for a beacon; unknown origins fall back to DEFAULT_PROJECT"""
+    if api_key:
+        project = PROJECT_API_KEYS.get(api_key)
+        if project is None:
+            raise UnknownApiKey("Unknown API key")
+        return project
+    for url in (origin, referer):
+        project = PROJECT_ORIGINS.get(origin_host(url))
+        if project:
+            return project
+    return DEFAULT_PROJECT
+
+
+def project_filter(project, column="project_name"):
+    """SQL fragment and params restricting a read to one project (empty when project is None)"""
+    if not project:
+        return "", ()
+    return f" AND {column} = %s", (project,)
@@ -0,0 +1,119 @@
+"""
+In-process rate limiting for the ingest endpoint
+Token buckets keyed by ip_hash and by tracker session id, held in bounded
+LRUs, stop floods from turning into one database insert per request. The
+ip_hash comes from the connection (uvicorn resolves X-Forwarded-For from
+trusted proxies), never from the beacon body.
+Excess events are rejected with 429 (RATE_LIMIT_MODE=reject) or sampled,
+keeping one in RATE_LIMIT_SAMPLE_EVERY (RATE_LIMIT_MODE=sample).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RATE_LIMIT_MODE = os.getenv("RATE_LIMIT_MODE", "reject")
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "120"))
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "60"))
+RATE_LIMIT_SESSION_PER_MINUTE = float(os.getenv("RATE_LIMIT_SESSION_PER_MINUTE", "60"))
+RATE_LIMIT_SESSION_BURST = float(os.getenv("RATE_LIMIT_SESSION_BURST", "30"))
+RATE_LIMIT_SAMPLE_EVERY = int(os.getenv("RATE_LIMIT_SAMPLE_EVERY", "10"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+class TokenBucketLimiter:
+    """Token bucket per key; the least recently seen keys are evicted past max_keys"""
+
+    def __init__(self, per_minute, burst, max_keys=RATE_LIMIT_MAX_KEYS, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+
+    def allow(self, key):
+        """Take one token for key; False when its bucket is empty"""
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # A new (or evicted) key starts with a full bucket
+                bucket = self._buckets[key] = [self.burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.allowed += 1
+                return True
+            self.limited += 1
+            return False
+
+    def refund(self, key):
+        """Give back the token taken by allow() for an event that was rejected elsewhere"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(self.burst, bucket[0] + 1)
+                self.allowed -= 1
+
+    def retry_after(self):
+        """Seconds until an empty bucket has a token again"""
+        return max(1, int(1 / self.rate + 0.999)) if self.rate else 60
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class IngestRateLimiter:
+    """Per-ip_hash and per-session limits for track_click"""
+
+    def __init__(self, mode=RATE_LIMIT_MODE, sample_every=RATE_LIMIT_SAMPLE_EVERY, clock=time.monotonic):
+        self.mode = mode
+        self.sample_every = max(1, sample_every)
+        self.by_ip = TokenBucketLimiter(RATE_LIMIT_IP_PER_MINUTE, RATE_LIMIT_IP_BURST, clock=clock)
+        self.by_session = TokenBucketLimiter(RATE_LIMIT_SESSION_PER_MINUTE, RATE_LIMIT_SESSION_BURST, clock=clock)
+        self._excess = 0
+        self.sampled_in = 0
+
+    def check(self, ip_hash, session_id):
+        """None if the event may be stored, else the key that is over its limit ('ip' / 'session')"""
+        if self.mode == "off":
+            return None
+        if ip_hash is not None and not self.by_ip.allow(ip_hash):
+            reason = "ip"
+        elif not self.by_session.allow(session_id):
+            reason = "session"
+            # The event is not stored, so it must not use up the IP's budget
+            if ip_hash is not None:
+                self.by_ip.refund(ip_hash)
+        else:
+            return None
+        if self.mode == "sample":
+            self._excess += 1
+            if self._excess % self.sample_every == 0:
+                self.sampled_in += 1
+                return None
+        return reason
+
+    def retry_after(self, reason):
+        return (self.by_ip if reason == "ip" else self.by_session).retry_after()
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "ip": {"allowed": self.by_ip.allowed, "limited": self.by_ip.limited,
+                   "keys": len(self.by_ip), "evictions": self.by_ip.evictions},
+            "session": {"allowed": self.by_session.allowed, "limited": self.by_session.limited,
+                        "keys": len(self.by_session), "evictions": self.by_session.evictions},
+            "sampled_in": self.sampled_in,
+        }
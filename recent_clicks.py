@@ -0,0 +1,115 @@
+"""
+Keyset-paginated reads of raw click_logs for /api/recent-clicks
+Pages walk the click_logs primary key (newest first), so every page is an
+index range scan of at most MAX_PAGE_SIZE rows no matter how large the table is.
+Only the dimension tables needed by the requested fields are joined. Reads go
+through click_logs_all, so days moved to click_logs_archive stay visible.
+"""
+
+import json
+import uuid
+
+from dimensions import EVENT_TYPES, session_uuid
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 1000
+
+# Pages larger than this are encoded row by row instead of as one JSON string
+STREAM_THRESHOLD = 100
+
+# Exposed field -> (SQL expression, join it needs); user_agent and ip_hash stay private
+FIELDS = {
+    "id": ("c.id", None),
+    "timestamp": ("c.timestamp", None),
+    "page_name": ("p.page_name", "JOIN pages p ON p.id = c.page_id"),
+    "tag": ("CASE c.event_type WHEN 1 THEN 'arrival' WHEN 2 THEN 'exit' END", None),
+    "referrer": ("r.referrer", "LEFT JOIN referrers r ON r.id = c.referrer_id"),
+    "time_on_page": ("c.time_on_page", None),
+    "session_id": ("c.session_id", None),
+}
+DEFAULT_FIELDS = ("id", "timestamp", "page_name", "tag", "referrer", "time_on_page", "session_id")
+
+
+def parse_fields(fields):
+    """Validate a comma-separated field list; id is always included for the cursor"""
+    if not fields:
+        return list(DEFAULT_FIELDS)
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return ["id"] + [f for f in dict.fromkeys(names) if f != "id"]
+
+
+def session_filter_value(session):
+    """Accept either the stored UUID or the tracker's original session id"""
+    try:
+        return str(uuid.UUID(session))
+    except ValueError:
+        return session_uuid(session)
+
+
+def build_query(fields, limit, before_id=None, after_id=None, page=None, session=None, tag=None, project=None):
+    """SQL and params for one page of clicks
+
+    after_id pages walk forward (ascending), so callers reverse those rows
+    to keep the newest-first order.
+    """
+    if before_id is not None and after_id is not None:
+        raise ValueError("Use either before_id or after_id, not both")
+
+    where, params = [], []
+    if before_id is not None:
+        where.append("c.id < %s")
+        params.append(before_id)
+    if after_id is not None:
+        where.append("c.id > %s")
+        params.append(after_id)
+    if page is not None:
+        where.append("c.page_id = (SELECT id FROM pages WHERE page_name = %s)")
+        params.append(page)
+    if project is not None:
+        where.append("c.project_id = (SELECT id FROM projects WHERE name = %s)")
+        params.append(project)
+    if session is not None:
+        where.append("c.session_id = %s::uuid")
+        params.append(session_filter_value(session))
+    if tag is not None:
+        code = EVENT_TYPES.get(tag.strip().lower())
+        if code is None:
+            raise ValueError(f"Unknown tag: {tag}")
+        where.append("c.event_type = %s")
+        params.append(code)
+
+    joins = dict.fromkeys(FIELDS[f][1] for f in fields if FIELDS[f][1])
+    columns = ", ".join(f"{FIELDS[f][0]} AS {f}" for f in fields)
+    query = f"SELECT {columns} FROM click_logs_all c {' '.join(joins)}"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += f" ORDER BY c.id {'ASC' if after_id is not None else 'DESC'} LIMIT %s"
+    params.append(limit)
+    return query, params
+
+
+def page_cursors(clicks, limit):
+    """next_before_id continues to older clicks; prev_after_id returns to newer ones"""
+    if not clicks:
+        return None, None
+    next_before_id = clicks[-1]["id"] if len(clicks) == limit else None
+    return next_before_id, clicks[0]["id"]
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_page(clicks, next_before_id, prev_after_id):
+    """Yield the response JSON in chunks, one row at a time"""
+    dumps = json.JSONEncoder(default=_json_default, separators=(",", ":")).encode
+    yield b'{"success":true,"clicks":['
+    for i, click in enumerate(clicks):
+        yield (b"," if i else b"") + dumps(click).encode()
+    yield (f'],"count":{len(clicks)},"next_before_id":{dumps(next_before_id)},'
+           f'"prev_after_id":{dumps(prev_after_id)}}}').encode()
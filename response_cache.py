@@ -0,0 +1,83 @@
+"""
+In-process TTL cache for read API responses
+Stores serialized JSON bodies with their ETag so every dashboard viewer
+shares one computation per key, and unchanged data can be answered with 304.
+Concurrent misses for the same key compute once (single-flight).
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachedResponse:
+    """Serialized response body plus its validator"""
+
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body, ttl):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+
+
+class ResponseCache:
+    """Bounded TTL cache keyed by request identity"""
+
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                return entry
+            return None
+
+    def get_or_compute(self, key, compute):
+        """Return the cached response for key, computing (once) if missing or expired"""
+        entry = self._fresh(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another caller may have filled it while we waited
+            entry = self._fresh(key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            try:
+                body = json.dumps(compute(), default=str, separators=(",", ":")).encode()
+            except Exception:
+                # Nothing cached for this key, so don't keep its lock around either
+                with self._lock:
+                    if key not in self._entries:
+                        self._key_locks.pop(key, None)
+                raise
+            entry = CachedResponse(body, self.ttl)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._key_locks.pop(evicted, None)
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
@@ -0,0 +1,142 @@
+"""
+Retention for raw click_logs after aggregation
+Once a day is older than RETENTION_DAYS and has been aggregated, its raw
+arrival/exit rows are moved out of click_logs into click_logs_archive, so the
+hot table (and its indexes, vacuum work) only holds recent traffic:
+
+- "compact" (default): one row per pageview, i.e. per (project, session_id,
+  page_id), keeping the event with the largest time_on_page and the referrer
+  of the first event, exactly what DailyAggregator counts
+- "archive": rows are moved unchanged
+- "off": nothing is moved
+
+click_logs_archive is range-partitioned by month (migrations/0004); the
+month's partition is created just before its first day is moved in.
+click_logs_all is a UNION ALL view over both tables; drill-down reads
+(/api/recent-clicks, exports) go through it and never notice the move.
+"""
+
+import os
+from datetime import date, timedelta
+
+from daily_aggregator import AGGREGATION_LOCK_KEY
+
+RETENTION_MODE = os.getenv("RETENTION_MODE", "compact")
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "90"))
+# Bounds the work done by one nightly run, e.g. the first run on a large table
+RETENTION_MAX_DAYS_PER_RUN = int(os.getenv("RETENTION_MAX_DAYS_PER_RUN", "31"))
+
+CLICK_COLUMNS = ("id, timestamp, session_id, ip_hash, page_id, referrer_id, "
+                 "user_agent_id, time_on_page, event_type, project_id")
+
+# One day's rows leave click_logs and land in the archive in a single statement
+MOVE_DAY = {
+    "archive": f"""
+        WITH moved AS (
+            DELETE FROM click_logs
+            WHERE timestamp >= %(day)s::date AND timestamp < %(day)s::date + 1
+            RETURNING {CLICK_COLUMNS}
+        ),
+        inserted AS (
+            INSERT INTO click_logs_archive ({CLICK_COLUMNS})
+            SELECT {CLICK_COLUMNS} FROM moved
+            RETURNING 1
+        )
+        SELECT (SELECT count(*) FROM moved) AS raw_rows, (SELECT count(*) FROM inserted) AS archived_rows
+    """,
+    "compact": f"""
+        WITH moved AS (
+            DELETE FROM click_logs
+            WHERE timestamp >= %(day)s::date AND timestamp < %(day)s::date + 1
+            RETURNING {CLICK_COLUMNS}
+        ),
+        ranked AS (
+            SELECT moved.*,
+                   first_value(referrer_id) OVER (
+                       PARTITION BY project_id, session_id, page_id ORDER BY timestamp, id
+                   ) AS first_referrer_id,
+                   row_number() OVER (
+                       PARTITION BY project_id, session_id, page_id ORDER BY time_on_page DESC, timestamp, id
+                   ) AS pick
+            FROM moved
+        ),
+        inserted AS (
+            INSERT INTO click_logs_archive ({CLICK_COLUMNS})
+            SELECT id, timestamp, session_id, ip_hash, page_id, first_referrer_id,
+                   user_agent_id, time_on_page, event_type, project_id
+            FROM ranked
+            WHERE pick = 1
+            RETURNING 1
+        )
+        SELECT (SELECT count(*) FROM moved) AS raw_rows, (SELECT count(*) FROM inserted) AS archived_rows
+    """,
+}
+
+
+def ensure_archive_partition(cursor, day):
+    """Create the monthly click_logs_archive partition that `day` lands in"""
+    month = day.replace(day=1)
+    next_month = (month + timedelta(days=32)).replace(day=1)
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS click_logs_archive_{month:%Y%m} "
+        "PARTITION OF click_logs_archive FOR VALUES FROM (%s) TO (%s)",
+        (month, next_month),
+    )
+
+
+def _is_aggregated(cursor, day):
+    cursor.execute("""
+        SELECT EXISTS (SELECT 1 FROM daily_click_summary WHERE date = %(day)s)
+            OR EXISTS (
+                SELECT 1 FROM aggregation_runs WHERE target_date = %(day)s AND status = 'success'
+            ) AS aggregated
+    """, {"day": day})
+    return cursor.fetchone()["aggregated"]
+
+
+def _next_day_with_clicks(cursor, after, cutoff):
+    """First day after `after` (or overall) that still has raw rows before cutoff; skips gaps via the index"""
+    cursor.execute("""
+        SELECT min(timestamp)::date AS day FROM click_logs
+        WHERE timestamp < %(cutoff)s::date
+          AND timestamp >= COALESCE((%(after)s::date + 1)::timestamptz, '-infinity')
+    """, {"cutoff": cutoff, "after": after})
+    return cursor.fetchone()["day"]
+
+
+def apply_retention(conn, mode=RETENTION_MODE, retention_days=RETENTION_DAYS,
+                    max_days=RETENTION_MAX_DAYS_PER_RUN, today=None):
+    """Move aggregated days older than retention_days into the archive; returns run stats"""
+    stats = {"mode": mode, "days": 0, "raw_rows": 0, "archived_rows": 0, "skipped_days": 0}
+    if mode == "off":
+        return stats
+    if mode not in MOVE_DAY:
+        raise ValueError(f"Unknown RETENTION_MODE: {mode}")
+
+    cutoff = (today or date.today()) - timedelta(days=retention_days)
+    cursor = conn.cursor()
+    try:
+        day = _next_day_with_clicks(cursor, None, cutoff)
+        while day is not None and stats["days"] < max_days:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s, %s) AS locked",
+                           (AGGREGATION_LOCK_KEY, day.toordinal()))
+            if cursor.fetchone()["locked"] and _is_aggregated(cursor, day):
+                ensure_archive_partition(cursor, day)
+                cursor.execute(MOVE_DAY[mode], {"day": day})
+                moved = cursor.fetchone()
+                conn.commit()
+                stats["days"] += 1
+                stats["raw_rows"] += moved["raw_rows"]
+                stats["archived_rows"] += moved["archived_rows"]
+                print(f"🗄️  {day}: {moved['raw_rows']} raw events → {moved['archived_rows']} archived rows ({mode})")
+            else:
+                # Not summarized yet (or being aggregated right now): keep its raw rows
+                stats["skipped_days"] += 1
+                conn.rollback()
+            day = _next_day_with_clicks(cursor, day, cutoff)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return stats
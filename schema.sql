@@ -2,19 +2,77 @@
 -- Goal: Track clicks, sessions, referrer sources, device info, time spent
 -- Tables: click_logs (raw), daily_click_summary (aggregated)
 -- Used for: Analytics dashboard built in Streamlit
+-- Reference snapshot of the current schema. The source of truth is the
+-- versioned files in migrations/, applied by `python migrate.py`.
+
+-- Versions applied by migrate.py
+CREATE TABLE schema_migrations (
+    version INT PRIMARY KEY,
+    name TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    duration_ms FLOAT NOT NULL
+);
+
+-- Define dimension tables for the compact click_logs row format
+-- Each distinct page name, referrer and user agent is stored once and referenced by id
+CREATE TABLE pages (
+    id SERIAL PRIMARY KEY,
+    page_name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE referrers (
+    id SERIAL PRIMARY KEY,
+    referrer TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE user_agents (
+    id SERIAL PRIMARY KEY,
+    user_agent TEXT NOT NULL UNIQUE
+);
+
+-- Tracked sites; id 1 is the original portfolio, which existing rows default to
+CREATE TABLE projects (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+INSERT INTO projects (id, name) VALUES (1, 'lubobali_portfolio');
+SELECT setval('projects_id_seq', 1);
+
 -- Define click_logs table to store raw page tracking info from my portfolio
--- Needs: serial id, timestamp, page_name, tag, user_agent, referrer, session_id, time_on_page, ip_hash
+-- Fixed-width columns first to avoid alignment padding
+-- event_type: 0 = other, 1 = arrival, 2 = exit (the tracker's tag)
+-- session_id: md5(tracker session id)::uuid
 CREATE TABLE click_logs (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL PRIMARY KEY,
     timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-    page_name TEXT NOT NULL,
-    tag TEXT,
-    user_agent TEXT NOT NULL,
-    referrer TEXT,
-    session_id TEXT NOT NULL,
+    session_id UUID NOT NULL,
+    ip_hash BIGINT,  -- keyed BLAKE2b (daily rotating key), see ip_hash.py
+    page_id INT NOT NULL REFERENCES pages(id),
+    referrer_id INT REFERENCES referrers(id),
+    user_agent_id INT NOT NULL REFERENCES user_agents(id),
     time_on_page INT NOT NULL,
-    ip_hash TEXT
+    event_type SMALLINT NOT NULL DEFAULT 0,
+    project_id INT NOT NULL DEFAULT 1 REFERENCES projects(id)  -- from API key or Origin, see projects.py
 );
+CREATE INDEX idx_click_logs_timestamp ON click_logs (timestamp);
+CREATE INDEX idx_click_logs_project_timestamp ON click_logs (project_id, timestamp);
+
+-- Keyset pagination of /api/recent-clicks filtered by page or session
+CREATE INDEX idx_click_logs_page_id ON click_logs (page_id, id);
+CREATE INDEX idx_click_logs_session_id ON click_logs (session_id, id);
+
+-- Readable view of click_logs with the text columns resolved
+CREATE VIEW click_logs_expanded AS
+SELECT c.id, c.timestamp, p.page_name,
+       CASE c.event_type WHEN 1 THEN 'arrival' WHEN 2 THEN 'exit' END AS tag,
+       u.user_agent, r.referrer, c.session_id, c.time_on_page, c.ip_hash,
+       pr.name AS project
+FROM click_logs c
+JOIN pages p ON p.id = c.page_id
+JOIN user_agents u ON u.id = c.user_agent_id
+JOIN projects pr ON pr.id = c.project_id
+LEFT JOIN referrers r ON r.id = c.referrer_id;
 
 -- Define daily_click_summary table for aggregated analytics data
 -- Aggregates clicks by date and project for dashboard visualization
@@ -25,10 +83,155 @@ CREATE TABLE daily_click_summary (
     project_name TEXT NOT NULL,
     total_clicks INT NOT NULL DEFAULT 0,
     avg_time_on_page FLOAT,
-    device_split JSON,
-    top_referrers JSON,
+    device_split JSONB,
+    top_referrers JSONB,
+    top_pages JSONB,
     repeat_visits INT NOT NULL DEFAULT 0,
     tag TEXT,
+    -- Digest of the summary fields; upserts skip rows whose hash is unchanged
+    content_hash TEXT,
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     UNIQUE(date, project_name, tag)
-);
\ No newline at end of file
+);
+CREATE INDEX idx_daily_click_summary_project_date ON daily_click_summary (project_name, date);
+
+-- Define aggregation_runs table for pipeline telemetry
+-- One row per aggregate_day run: phase timings, volumes and peak memory
+-- Used by scripts/aggregation_report.py and the dashboard's pipeline health panel
+CREATE TABLE aggregation_runs (
+    id SERIAL PRIMARY KEY,
+    target_date DATE NOT NULL,
+    engine TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL,
+    duration_seconds FLOAT NOT NULL,
+    rows_scanned INT NOT NULL DEFAULT 0,
+    pageviews INT NOT NULL DEFAULT 0,
+    rows_filtered INT NOT NULL DEFAULT 0,  -- bot/crawler events excluded, see bot_filter.py
+    fetch_seconds FLOAT NOT NULL DEFAULT 0,
+    dedupe_seconds FLOAT NOT NULL DEFAULT 0,
+    compute_seconds FLOAT NOT NULL DEFAULT 0,
+    write_seconds FLOAT NOT NULL DEFAULT 0,
+    peak_memory_kb BIGINT,
+    error TEXT
+);
+CREATE INDEX idx_aggregation_runs_started_at ON aggregation_runs (started_at);
+CREATE INDEX idx_aggregation_runs_target_date ON aggregation_runs (target_date, status);
+
+
+-- Define sessions table built incrementally by sessionizer.py
+-- visitor_id is the tracker's persistent localStorage id; a session ends after
+-- SESSION_GAP_MINUTES of inactivity, regardless of calendar day
+CREATE TABLE sessions (
+    id BIGSERIAL PRIMARY KEY,
+    visitor_id UUID NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    ended_at TIMESTAMPTZ NOT NULL,
+    pageviews INT NOT NULL DEFAULT 0,
+    entry_page_id INT REFERENCES pages(id),
+    exit_page_id INT REFERENCES pages(id),
+    duration_seconds INT NOT NULL DEFAULT 0
+);
+CREATE INDEX idx_sessions_visitor_ended ON sessions (visitor_id, ended_at);
+CREATE INDEX idx_sessions_started_at ON sessions (started_at);
+
+-- Watermark of the last click_logs id folded into sessions
+CREATE TABLE sessionizer_state (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    last_click_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+
+-- Dashboard materialized views (one per panel), refreshed CONCURRENTLY after
+-- each aggregation run by materialized_views.refresh_dashboard_views()
+CREATE MATERIALIZED VIEW mv_daily_trend AS
+SELECT date, project_name,
+       SUM(total_clicks)::int AS total_clicks,
+       SUM(repeat_visits)::int AS repeat_visits,
+       ROUND(AVG(avg_time_on_page)::numeric, 2)::float AS avg_time_on_page
+FROM daily_click_summary
+GROUP BY date, project_name;
+CREATE UNIQUE INDEX mv_daily_trend_key ON mv_daily_trend (date, project_name);
+
+CREATE MATERIALIZED VIEW mv_top_pages AS
+SELECT s.date, s.project_name, p.key AS page, SUM(p.value::int)::int AS clicks
+FROM daily_click_summary s
+CROSS JOIN LATERAL jsonb_each_text(s.top_pages) AS p
+WHERE s.top_pages IS NOT NULL
+GROUP BY s.date, s.project_name, p.key;
+CREATE UNIQUE INDEX mv_top_pages_key ON mv_top_pages (date, project_name, page);
+
+CREATE MATERIALIZED VIEW mv_device_split AS
+SELECT s.date, s.project_name, d.key AS device, SUM(d.value::int)::int AS pageviews
+FROM daily_click_summary s
+CROSS JOIN LATERAL jsonb_each_text(s.device_split) AS d
+WHERE s.device_split IS NOT NULL
+GROUP BY s.date, s.project_name, d.key;
+CREATE UNIQUE INDEX mv_device_split_key ON mv_device_split (date, project_name, device);
+
+CREATE MATERIALIZED VIEW mv_referrer_ranking AS
+SELECT s.date, s.project_name, r.key AS referrer, SUM(r.value::int)::int AS visits
+FROM daily_click_summary s
+CROSS JOIN LATERAL jsonb_each_text(s.top_referrers) AS r
+WHERE s.top_referrers IS NOT NULL
+GROUP BY s.date, s.project_name, r.key;
+CREATE UNIQUE INDEX mv_referrer_ranking_key ON mv_referrer_ranking (date, project_name, referrer);
+
+-- Periodic snapshot of the API's in-memory live counters (restored on restart)
+CREATE TABLE live_counters_snapshot (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    snapshot JSONB NOT NULL,
+    saved_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Ingest events classified as bot/crawler traffic (BOT_FILTER_MODE=side_table)
+CREATE TABLE bot_clicks (
+    id BIGSERIAL PRIMARY KEY,
+    timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    ip_hash BIGINT,
+    reason TEXT NOT NULL,
+    page_name TEXT,
+    user_agent TEXT
+);
+CREATE INDEX idx_bot_clicks_timestamp ON bot_clicks (timestamp);
+
+-- Raw clicks of aggregated days past RETENTION_DAYS, moved out of click_logs
+-- (one row per pageview with RETENTION_MODE=compact), see retention.py.
+-- Partitioned by month: click_logs_archive_YYYYMM, created by retention.py
+CREATE TABLE click_logs_archive (
+    id BIGINT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
+    session_id UUID NOT NULL,
+    ip_hash BIGINT,
+    page_id INT NOT NULL,
+    referrer_id INT,
+    user_agent_id INT NOT NULL,
+    time_on_page INT NOT NULL,
+    event_type SMALLINT NOT NULL,
+    project_id INT NOT NULL DEFAULT 1,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+CREATE INDEX idx_click_logs_archive_timestamp ON click_logs_archive (timestamp);
+CREATE INDEX idx_click_logs_archive_page_id ON click_logs_archive (page_id, id);
+CREATE INDEX idx_click_logs_archive_session_id ON click_logs_archive (session_id, id);
+
+-- Hot and archived clicks together, for drill-down reads
+CREATE VIEW click_logs_all AS
+SELECT id, timestamp, session_id, ip_hash, page_id, referrer_id, user_agent_id, time_on_page, event_type, project_id
+FROM click_logs
+UNION ALL
+SELECT id, timestamp, session_id, ip_hash, page_id, referrer_id, user_agent_id, time_on_page, event_type, project_id
+FROM click_logs_archive;
+
+-- Sessions moving between pages per day and project (path_analysis.py);
+-- page id 0 is the session's entry (from) or exit (to)
+CREATE TABLE page_transitions (
+    date DATE NOT NULL,
+    project_id INT NOT NULL,
+    from_page_id INT NOT NULL,
+    to_page_id INT NOT NULL,
+    transitions INT NOT NULL,
+    PRIMARY KEY (date, project_id, from_page_id, to_page_id)
+);
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Aggregation run report
+Prints recent rows from aggregation_runs with phase timings, and a simple
+trend of run time per 1k scanned rows so a slowing job is easy to spot.
+
+    python scripts/aggregation_report.py --limit 30
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daily_aggregator import DailyAggregator
+
+
+def fetch_runs(limit):
+    """Load the most recent aggregation runs, oldest first"""
+    aggregator = DailyAggregator()
+    conn = aggregator.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT target_date, engine, status, started_at, duration_seconds,
+                   rows_scanned, rows_filtered, pageviews, fetch_seconds, dedupe_seconds,
+                   compute_seconds, write_seconds, peak_memory_kb
+            FROM aggregation_runs
+            ORDER BY started_at DESC
+            LIMIT %s
+        """, (limit,))
+        runs = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+    return list(reversed(runs))
+
+
+def ms_per_1k_rows(run):
+    """Normalised run cost so days with different traffic are comparable"""
+    if not run["rows_scanned"]:
+        return None
+    return run["duration_seconds"] * 1000 / (run["rows_scanned"] / 1000)
+
+
+def print_report(runs):
+    print(f"{'started':<20} {'date':<11} {'engine':<9} {'status':<8} {'rows':>8} {'bots':>6} {'pviews':>7} "
+          f"{'total s':>8} {'fetch':>7} {'dedupe':>7} {'compute':>8} {'write':>7} {'mem MB':>7} {'ms/1k':>8}")
+    for run in runs:
+        per_1k = ms_per_1k_rows(run)
+        mem_mb = (run["peak_memory_kb"] or 0) / 1024
+        print(f"{run['started_at']:%Y-%m-%d %H:%M:%S}  {str(run['target_date']):<11} {run['engine']:<9} "
+              f"{run['status']:<8} {run['rows_scanned']:>8} {run['rows_filtered']:>6} {run['pageviews']:>7} "
+              f"{run['duration_seconds']:>8.3f} {run['fetch_seconds']:>7.3f} {run['dedupe_seconds']:>7.3f} "
+              f"{run['compute_seconds']:>8.3f} {run['write_seconds']:>7.3f} {mem_mb:>7.1f} "
+              f"{(f'{per_1k:.1f}' if per_1k is not None else '-'):>8}")
+
+    # Compare the first and second half of the window to flag a trend
+    costs = [c for c in (ms_per_1k_rows(r) for r in runs if r["status"] == "success") if c is not None]
+    if len(costs) >= 4:
+        half = len(costs) // 2
+        older = sum(costs[:half]) / half
+        newer = sum(costs[half:]) / (len(costs) - half)
+        change = (newer - older) / older * 100 if older else 0.0
+        icon = "⚠️ " if change > 20 else "✅"
+        print(f"\n{icon} Cost per 1k rows: {older:.1f}ms → {newer:.1f}ms ({change:+.1f}%) over {len(costs)} runs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show aggregation run telemetry")
+    parser.add_argument("--limit", type=int, default=30, help="Number of recent runs to show")
+    args = parser.parse_args()
+
+    runs = fetch_runs(args.limit)
+    if not runs:
+        print("No aggregation runs recorded yet")
+        return
+    print_report(runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark IP hashing strategies for the ingest hot path
+Compares the legacy unkeyed SHA-256 hex digest with the keyed BLAKE2b
+hash, uncached and behind the hot-IP LRU cache, over a realistic mix
+where a minority of visitors send most of the beacons.
+
+    python scripts/benchmark_ip_hash.py --events 200000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("IP_HASH_SECRET", "benchmark-secret")
+
+import ip_hash
+
+
+def make_traffic(events, visitors, seed):
+    """IPs drawn with a Zipf-like skew: repeat visitors send many arrival/exit beacons"""
+    rng = random.Random(seed)
+    pool = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+            for _ in range(visitors)]
+    weights = [1 / (rank + 1) for rank in range(visitors)]
+    return rng.choices(pool, weights=weights, k=events)
+
+
+def time_strategy(fn, traffic):
+    started = time.perf_counter()
+    for ip in traffic:
+        fn(ip)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IP hashing strategies")
+    parser.add_argument("--events", type=int, default=200_000, help="Number of hashed requests")
+    parser.add_argument("--visitors", type=int, default=5_000, help="Distinct IPs in the traffic")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    traffic = make_traffic(args.events, args.visitors, args.seed)
+    day = int(time.time() // 86400) + ip_hash._EPOCH_ORDINAL
+    uncached = ip_hash._hash_for_day.__wrapped__
+
+    strategies = [
+        ("legacy sha256[:16] (TEXT)", ip_hash.legacy_hash_ip),
+        ("blake2b keyed, uncached (BIGINT)", lambda ip: uncached(ip, day)),
+        ("blake2b keyed + LRU (BIGINT)", ip_hash.hash_ip),
+    ]
+
+    print(f"🧪 Hashing {args.events:,} requests from {args.visitors:,} distinct IPs")
+    baseline = None
+    for name, fn in strategies:
+        # Warm up once so the LRU numbers reflect steady state
+        time_strategy(fn, traffic[:1000])
+        elapsed = time_strategy(fn, traffic)
+        per_call_ns = elapsed / len(traffic) * 1e9
+        baseline = baseline or per_call_ns
+        print(f"  {name:<34} {per_call_ns:>8.0f} ns/call  ({baseline / per_call_ns:.2f}x vs legacy)")
+
+    info = ip_hash.cache_info()
+    hit_rate = info.hits / (info.hits + info.misses) if (info.hits + info.misses) else 0
+    print(f"\n📦 LRU cache: {info.currsize}/{info.maxsize} entries, {hit_rate:.1%} hit rate")
+    print("💾 Storage: TEXT hex(16) = 17 bytes + tuple overhead vs BIGINT = 8 bytes fixed width")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark the ingest rate limiter's per-request overhead
+Replays skewed traffic (a few heavy IPs and tabs, a long tail of visitors)
+through IngestRateLimiter.check and reports the cost per call, with the
+bucket LRU both below and at its key limit.
+
+    python scripts/benchmark_rate_limiter.py --events 500000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_limiter
+from rate_limiter import IngestRateLimiter
+
+
+def make_traffic(events, visitors, seed):
+    """(ip_hash, session_id) pairs with a Zipf-like skew towards a few heavy visitors"""
+    rng = random.Random(seed)
+    pool = [(rng.getrandbits(63), f"session_{n}_{rng.getrandbits(32):x}") for n in range(visitors)]
+    weights = [1 / (rank + 1) for rank in range(visitors)]
+    return rng.choices(pool, weights=weights, k=events)
+
+
+def run(limiter, traffic):
+    check = limiter.check
+    started = time.perf_counter()
+    for ip_hash, session_id in traffic:
+        check(ip_hash, session_id)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingest rate limiter")
+    parser.add_argument("--events", type=int, default=500_000, help="Number of checked requests")
+    parser.add_argument("--visitors", type=int, default=20_000, help="Distinct IP/session pairs")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    traffic = make_traffic(args.events, args.visitors, args.seed)
+    print(f"🧪 Checking {args.events:,} requests from {args.visitors:,} distinct visitors")
+
+    cases = [
+        ("LRU below key limit", rate_limiter.RATE_LIMIT_MAX_KEYS),
+        ("LRU at key limit (evicting)", max(1, args.visitors // 4)),
+    ]
+    for name, max_keys in cases:
+        limiter = IngestRateLimiter(mode="reject")
+        limiter.by_ip.max_keys = limiter.by_session.max_keys = max_keys
+        run(limiter, traffic[:10_000])
+        elapsed = run(limiter, traffic)
+        per_call_us = elapsed / len(traffic) * 1e6
+        stats = limiter.stats()
+        print(f"  {name:<30} {per_call_us:>6.2f} µs/request  "
+              f"(limited ip {stats['ip']['limited']:,}, session {stats['session']['limited']:,}, "
+              f"evictions {stats['ip']['evictions'] + stats['session']['evictions']:,})")
+
+
+if __name__ == "__main__":
+    main()
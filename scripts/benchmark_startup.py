@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark for the API and cron entry points
+Imports each entry point in a fresh interpreter (as Railway does on every
+deploy and cron run) and reports the median import time plus the slowest
+imports from `python -X importtime`. With --serve it also starts uvicorn and
+times the first answered request.
+
+    python scripts/benchmark_startup.py --runs 5 --json startup.json
+    python scripts/benchmark_startup.py --serve --compare startup.json
+
+Save a run with --json and compare two runs on the same machine with --compare.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# daily_aggregator is what the cron job loads once it starts working (cron_daily_aggregator defers it)
+ENTRY_POINTS = ("app", "cron_daily_aggregator", "daily_aggregator", "migrate")
+
+
+def parse_importtime(stderr, module):
+    """{module: cumulative µs} for the modules imported directly by the entry point"""
+    children = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        indent = len(name) - len(name.lstrip())
+        if indent == 1:
+            # A top-level import closes the block of children listed before it
+            if name.strip() == module:
+                return children
+            children = {}
+        elif indent == 3:
+            children[name.strip()] = int(cumulative)
+    return children
+
+
+def time_import(module, runs):
+    """Median wall time of `import module` in fresh interpreters, plus one importtime profile"""
+    wall = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], cwd=REPO_ROOT,
+                       capture_output=True, check=True)
+        wall.append(time.perf_counter() - started)
+    profile = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return {"wall_ms": round(statistics.median(wall) * 1000, 1), "imports_us": parse_importtime(profile.stderr, module)}
+
+
+def time_first_request(port, timeout=30):
+    """Seconds from spawning uvicorn to the first answered GET /"""
+    cmd = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+           "--log-level", "warning"]
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            try:
+                conn.request("GET", "/")
+                if conn.getresponse().status == 200:
+                    return round((time.perf_counter() - started) * 1000, 1)
+            except OSError:
+                pass
+            finally:
+                conn.close()
+            time.sleep(0.02)
+        raise SystemExit("❌ Server did not answer within the timeout")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def print_report(results, top):
+    for module, r in results["imports"].items():
+        print(f"\n📦 import {module}: {r['wall_ms']:.1f} ms (median)")
+        slowest = sorted(r["imports_us"].items(), key=lambda item: item[1], reverse=True)[:top]
+        for name, us in slowest:
+            print(f"  {us / 1000:>8.1f} ms  {name}")
+    if "first_request_ms" in results:
+        print(f"\n🚀 uvicorn spawn → first response: {results['first_request_ms']:.1f} ms")
+
+
+def print_comparison(baseline, results):
+    """Compare the current run against a saved baseline run"""
+    def delta(new, old):
+        return (new - old) / old * 100 if old else 0.0
+
+    print("\n🔁 Comparison against baseline")
+    for module, r in results["imports"].items():
+        base = baseline["imports"].get(module)
+        if base:
+            print(f"  import {module:<24} {base['wall_ms']:>7.1f} → {r['wall_ms']:>7.1f} ms "
+                  f"({delta(r['wall_ms'], base['wall_ms']):+.1f}%)")
+    if "first_request_ms" in results and "first_request_ms" in baseline:
+        print(f"  first request                 {baseline['first_request_ms']:>7.1f} → "
+              f"{results['first_request_ms']:>7.1f} ms "
+              f"({delta(results['first_request_ms'], baseline['first_request_ms']):+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start of the API and cron entry points")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--top", type=int, default=8, help="Slowest direct imports to list")
+    parser.add_argument("--serve", action="store_true", help="Also time uvicorn spawn to first response")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file from a previous run")
+    args = parser.parse_args()
+
+    print(f"⏱️  Timing cold imports ({args.runs} runs each): {', '.join(ENTRY_POINTS)}")
+    results = {
+        "python": sys.version.split()[0],
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "imports": {module: time_import(module, args.runs) for module in ENTRY_POINTS
+                    if os.path.exists(os.path.join(REPO_ROOT, f"{module}.py"))},
+    }
+    if args.serve:
+        results["first_request_ms"] = time_first_request(args.port)
+
+    print_report(results, args.top)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
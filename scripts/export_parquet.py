@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Export click_logs and daily_click_summary to date-partitioned Parquet / Arrow files
+Each day is streamed out of Postgres with COPY TO STDOUT and converted in
+fixed-size blocks, so memory stays flat however large the day is. Days that
+already have a partition are skipped, so re-running only exports new days.
+Dimension tables (pages, referrers, user_agents, projects) are re-exported
+whole on every run; they are small.
+
+    python scripts/export_parquet.py --out exports/
+    python scripts/export_parquet.py --out exports/ --start 2025-01-01 --end 2025-01-31 --format arrow
+
+Layout:
+    exports/click_logs/date=2025-01-01/part-0.parquet
+    exports/daily_click_summary/date=2025-01-01/part-0.parquet
+    exports/dimensions/pages.parquet, ...
+
+click_logs is read through click_logs_all, so archived days export too
+(compacted days have one row per pageview). Timestamps are written as UTC. Needs pyarrow (pip install pyarrow).
+"""
+
+import argparse
+import os
+import sys
+import threading
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daily_aggregator import DailyAggregator
+
+# Export name -> (per-day SELECT, column types for the CSV reader)
+DAILY_EXPORTS = {
+    "click_logs": (
+        """
+        SELECT id, timestamp AT TIME ZONE 'UTC' AS timestamp, project_id, session_id, ip_hash,
+               page_id, referrer_id, user_agent_id, time_on_page, event_type
+        FROM click_logs_all
+        WHERE timestamp >= {day}::date AND timestamp < {day}::date + 1
+        ORDER BY id
+        """,
+        {"id": "int64", "timestamp": "timestamp", "project_id": "int32", "session_id": "string",
+         "ip_hash": "int64", "page_id": "int32", "referrer_id": "int32", "user_agent_id": "int32",
+         "time_on_page": "int32", "event_type": "int16"},
+    ),
+    "daily_click_summary": (
+        """
+        SELECT date, project_name, total_clicks, avg_time_on_page, device_split::text AS device_split,
+               top_referrers::text AS top_referrers, top_pages::text AS top_pages,
+               repeat_visits, tag, content_hash
+        FROM daily_click_summary
+        WHERE date = {day}::date
+        ORDER BY project_name, tag
+        """,
+        {"date": "date", "project_name": "string", "total_clicks": "int32", "avg_time_on_page": "float64",
+         "device_split": "string", "top_referrers": "string", "top_pages": "string",
+         "repeat_visits": "int32", "tag": "string", "content_hash": "string"},
+    ),
+}
+
+DIMENSION_EXPORTS = {
+    "pages": ("SELECT id, page_name FROM pages ORDER BY id", {"id": "int32", "page_name": "string"}),
+    "referrers": ("SELECT id, referrer FROM referrers ORDER BY id", {"id": "int32", "referrer": "string"}),
+    "user_agents": ("SELECT id, user_agent FROM user_agents ORDER BY id", {"id": "int32", "user_agent": "string"}),
+    "projects": ("SELECT id, name FROM projects ORDER BY id", {"id": "int32", "name": "string"}),
+}
+
+
+def arrow_types(pa, column_types):
+    mapping = {
+        "int16": pa.int16(), "int32": pa.int32(), "int64": pa.int64(), "float64": pa.float64(),
+        "string": pa.string(), "date": pa.date32(), "timestamp": pa.timestamp("us"),
+    }
+    return {name: mapping[kind] for name, kind in column_types.items()}
+
+
+def open_writer(pa, path, schema, fmt):
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(path, schema, compression="zstd")
+    return pa.ipc.new_file(path, schema)
+
+
+def copy_to_file(conn, query, column_types, path, fmt, block_size):
+    """Stream COPY (query) TO STDOUT into a columnar file; returns rows written (None if empty)"""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    read_fd, write_fd = os.pipe()
+    reader, writer = os.fdopen(read_fd, "rb"), os.fdopen(write_fd, "wb")
+    errors = []
+
+    def produce():
+        cursor = conn.cursor()
+        try:
+            cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", writer)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            cursor.close()
+            writer.close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    tmp_path = path + ".tmp"
+    out = None
+    rows = 0
+    try:
+        batches = pacsv.open_csv(
+            reader,
+            read_options=pacsv.ReadOptions(block_size=block_size),
+            convert_options=pacsv.ConvertOptions(column_types=arrow_types(pa, column_types),
+                                                 strings_can_be_null=True),
+        )
+        for batch in batches:
+            if batch.num_rows == 0:
+                continue
+            if out is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                out = open_writer(pa, tmp_path, batch.schema, fmt)
+            out.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        # Unblock the producer if we stopped reading early
+        reader.close()
+        producer.join()
+        if out is not None:
+            out.close()
+    if errors:
+        if out is not None:
+            os.remove(tmp_path)
+        raise errors[0]
+    if out is None:
+        return None
+    os.replace(tmp_path, path)
+    return rows
+
+
+def partition_path(out_dir, table, day, fmt):
+    return os.path.join(out_dir, table, f"date={day.isoformat()}", f"part-0.{fmt}")
+
+
+def first_click_date(conn):
+    cursor = conn.cursor()
+    # Archived history counts too; min() over the view uses each table's timestamp index
+    cursor.execute("SELECT min(timestamp)::date AS first_day FROM click_logs_all")
+    first_day = cursor.fetchone()["first_day"]
+    cursor.close()
+    conn.rollback()
+    return first_day
+
+
+def export(conn, out_dir, start, end, fmt="parquet", block_size=4 << 20, force=False):
+    """Export [start, end] day by day, skipping days that already have partitions"""
+    cursor = conn.cursor()
+    cursor.execute("SET TIME ZONE 'UTC'")
+    for name, (query, column_types) in DIMENSION_EXPORTS.items():
+        path = os.path.join(out_dir, "dimensions", f"{name}.{fmt}")
+        rows = copy_to_file(conn, query, column_types, path, fmt, block_size)
+        print(f"📚 {name}: {rows or 0} rows")
+
+    exported = skipped = 0
+    day = start
+    while day <= end:
+        for table, (query, column_types) in DAILY_EXPORTS.items():
+            path = partition_path(out_dir, table, day, fmt)
+            if os.path.exists(path) and not force:
+                skipped += 1
+                continue
+            rows = copy_to_file(conn, query.format(day=cursor.mogrify("%s", (day,)).decode()),
+                                column_types, path, fmt, block_size)
+            if rows:
+                exported += 1
+                print(f"📦 {table} {day}: {rows:,} rows → {path}")
+        day += timedelta(days=1)
+    cursor.close()
+    conn.rollback()
+    print(f"✅ Exported {exported} partition(s), skipped {skipped} already present")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export click data to date-partitioned columnar files")
+    parser.add_argument("--out", default="exports", help="Output directory")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day (default: first day with clicks)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day (default: yesterday, the last complete day)")
+    parser.add_argument("--format", choices=("parquet", "arrow"), default="parquet")
+    parser.add_argument("--block-size", type=int, default=4 << 20, help="CSV bytes converted per batch")
+    parser.add_argument("--force", action="store_true", help="Re-export days that already have partitions")
+    args = parser.parse_args()
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        sys.exit("❌ pyarrow is required: pip install pyarrow")
+
+    conn = DailyAggregator().get_db_connection()
+    try:
+        start = args.start or first_click_date(conn)
+        end = args.end or date.today() - timedelta(days=1)
+        if start is None:
+            print("ℹ️  click_logs is empty, nothing to export")
+            return
+        print(f"🚚 Exporting {start} → {end} to {args.out} ({args.format})")
+        export(conn, args.out, start, end, args.format, args.block_size, args.force)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Migrate click_logs to the compact row format
+Moves page names, referrers and user agents into dimension tables, codes the
+tracker tag as a smallint event type and the session id as a UUID, then swaps
+the new table in. The old table is kept as click_logs_legacy until --drop-legacy.
+Run it before the first `python migrate.py` on a database with the text
+layout: the baseline migration needs page_id and stops without it.
+
+Prints a before/after comparison of table size and aggregation time:
+
+    python scripts/migrate_compact_click_logs.py --measure-days 7
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daily_aggregator import DailyAggregator
+from labels import device_type, referrer_label, page_label
+
+DIMENSIONS_DDL = """
+CREATE TABLE IF NOT EXISTS pages (
+    id SERIAL PRIMARY KEY,
+    page_name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS referrers (
+    id SERIAL PRIMARY KEY,
+    referrer TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS user_agents (
+    id SERIAL PRIMARY KEY,
+    user_agent TEXT NOT NULL UNIQUE
+);
+"""
+
+COMPACT_TABLE_DDL = """
+CREATE TABLE click_logs_compact (
+    id BIGSERIAL PRIMARY KEY,
+    timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    session_id UUID NOT NULL,
+    ip_hash BIGINT,
+    page_id INT NOT NULL REFERENCES pages(id),
+    referrer_id INT REFERENCES referrers(id),
+    user_agent_id INT NOT NULL REFERENCES user_agents(id),
+    time_on_page INT NOT NULL,
+    event_type SMALLINT NOT NULL DEFAULT 0
+);
+"""
+
+EXPANDED_VIEW_DDL = """
+CREATE OR REPLACE VIEW click_logs_expanded AS
+SELECT c.id, c.timestamp, p.page_name,
+       CASE c.event_type WHEN 1 THEN 'arrival' WHEN 2 THEN 'exit' END AS tag,
+       u.user_agent, r.referrer, c.session_id, c.time_on_page, c.ip_hash
+FROM click_logs c
+JOIN pages p ON p.id = c.page_id
+JOIN user_agents u ON u.id = c.user_agent_id
+LEFT JOIN referrers r ON r.id = c.referrer_id;
+"""
+
+
+def table_exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL AS present", (name,))
+    return cursor.fetchone()["present"]
+
+
+def column_type(cursor, table, column):
+    cursor.execute("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_name = %s AND column_name = %s
+    """, (table, column))
+    row = cursor.fetchone()
+    return row["data_type"] if row else None
+
+
+def relation_size(cursor, *tables):
+    total = 0
+    for table in tables:
+        if table_exists(cursor, table):
+            cursor.execute("SELECT pg_total_relation_size(%s) AS size", (table,))
+            total += cursor.fetchone()["size"]
+    return total
+
+
+def migrate(conn):
+    """Copy click_logs into the compact layout and swap the tables in one transaction"""
+    cursor = conn.cursor()
+    legacy_ip_type = column_type(cursor, "click_logs", "ip_hash")
+    if legacy_ip_type == "bigint":
+        ip_expr = "ip_hash"
+    else:
+        ip_expr = """CASE WHEN ip_hash ~ '^[0-9a-f]{16}$'
+                          THEN ('x' || ip_hash)::bit(64)::bigint END"""
+
+    # Block ingest until the swap commits: an insert landing between the copy and the
+    # rename would end up in click_logs_legacy and be lost. Reads keep working.
+    print("🔒 Locking click_logs against writes...")
+    cursor.execute("LOCK TABLE click_logs IN SHARE ROW EXCLUSIVE MODE")
+
+    print("🔧 Creating dimension tables...")
+    cursor.execute(DIMENSIONS_DDL)
+    cursor.execute("""
+        INSERT INTO pages (page_name)
+        SELECT DISTINCT left(page_name, 1024) FROM click_logs WHERE page_name IS NOT NULL
+        ON CONFLICT (page_name) DO NOTHING
+    """)
+    cursor.execute("""
+        INSERT INTO referrers (referrer)
+        SELECT DISTINCT left(referrer, 1024) FROM click_logs WHERE referrer IS NOT NULL
+        ON CONFLICT (referrer) DO NOTHING
+    """)
+    cursor.execute("""
+        INSERT INTO user_agents (user_agent)
+        SELECT DISTINCT left(coalesce(user_agent, ''), 1024) FROM click_logs
+        ON CONFLICT (user_agent) DO NOTHING
+    """)
+
+    print("📦 Copying rows into the compact layout...")
+    cursor.execute(COMPACT_TABLE_DDL)
+    cursor.execute(f"""
+        INSERT INTO click_logs_compact
+            (id, timestamp, session_id, ip_hash, page_id, referrer_id,
+             user_agent_id, time_on_page, event_type)
+        SELECT c.id, c.timestamp, md5(c.session_id)::uuid, {ip_expr},
+               p.id, r.id, u.id, c.time_on_page,
+               CASE lower(c.tag) WHEN 'arrival' THEN 1 WHEN 'exit' THEN 2 ELSE 0 END
+        FROM click_logs c
+        JOIN pages p ON p.page_name = left(c.page_name, 1024)
+        JOIN user_agents u ON u.user_agent = left(coalesce(c.user_agent, ''), 1024)
+        LEFT JOIN referrers r ON r.referrer = left(c.referrer, 1024)
+    """)
+    copied = cursor.rowcount
+
+    print("🔀 Swapping tables...")
+    cursor.execute("ALTER TABLE click_logs RENAME TO click_logs_legacy")
+    cursor.execute("ALTER SEQUENCE IF EXISTS click_logs_id_seq RENAME TO click_logs_legacy_id_seq")
+    cursor.execute("ALTER TABLE click_logs_compact RENAME TO click_logs")
+    cursor.execute("ALTER SEQUENCE click_logs_compact_id_seq RENAME TO click_logs_id_seq")
+    cursor.execute("SELECT setval('click_logs_id_seq', coalesce((SELECT max(id) FROM click_logs), 0) + 1, false)")
+    cursor.execute("CREATE INDEX idx_click_logs_timestamp ON click_logs (timestamp)")
+    cursor.execute(EXPANDED_VIEW_DDL)
+    conn.commit()
+    cursor.execute("ANALYZE click_logs")
+    conn.commit()
+    cursor.close()
+    print(f"✅ Migrated {copied} rows")
+
+
+def legacy_aggregate(cursor, target_date):
+    """The pre-migration aggregation path: text rows, text keys, per-row classification"""
+    cursor.execute("SELECT * FROM click_logs_legacy WHERE DATE(timestamp) = %s ORDER BY timestamp", (target_date,))
+    clicks = cursor.fetchall()
+    pageviews, first = {}, {}
+    for c in clicks:
+        key = (c["session_id"], c["page_name"])
+        first.setdefault(key, c)
+        prev = pageviews.get(key)
+        if prev is None or (c["time_on_page"] or 0) > (prev["time_on_page"] or 0):
+            pageviews[key] = c
+    devices = [device_type(pv["user_agent"]) for pv in pageviews.values()]
+    referrers = [referrer_label(f["referrer"]) for f in first.values()]
+    pages = [page_label(pv["page_name"]) for pv in pageviews.values()]
+    return len(clicks), len(devices) + len(referrers) + len(pages)
+
+
+def compact_aggregate(aggregator, cursor, target_date):
+    """The current aggregation path without the summary write"""
+    clicks = aggregator._fetch_clicks(cursor, target_date)
+    if not clicks:
+        return 0
+    dims = aggregator._fetch_dimensions(cursor, clicks)
+    aggregator._compute_summaries(target_date, aggregator._dedupe_pageviews(clicks), dims)
+    return len(clicks)
+
+
+def measure(aggregator, conn, days):
+    """Compare storage and aggregation time between click_logs_legacy and click_logs"""
+    cursor = conn.cursor()
+    if not table_exists(cursor, "click_logs_legacy"):
+        print("ℹ️  No click_logs_legacy table to compare against")
+        return
+
+    legacy_size = relation_size(cursor, "click_logs_legacy")
+    compact_size = relation_size(cursor, "click_logs", "pages", "referrers", "user_agents")
+    cursor.execute("SELECT count(*) AS n, max(timestamp)::date AS last_day FROM click_logs_legacy")
+    stats = cursor.fetchone()
+    rows = stats["n"] or 1
+
+    print("\n📏 Storage")
+    print(f"  legacy  click_logs:        {legacy_size / 1024:>10.0f} KB  ({legacy_size / rows:.0f} B/row)")
+    print(f"  compact click_logs + dims: {compact_size / 1024:>10.0f} KB  ({compact_size / rows:.0f} B/row)")
+    if legacy_size:
+        print(f"  → {(1 - compact_size / legacy_size) * 100:.1f}% smaller")
+
+    if not stats["last_day"]:
+        return
+    print(f"\n⏱️  Aggregation (fetch + dedupe + compute) over the last {days} day(s)")
+    legacy_total = compact_total = 0.0
+    for offset in range(days):
+        day = stats["last_day"] - timedelta(days=offset)
+        started = time.perf_counter()
+        n_legacy, _ = legacy_aggregate(cursor, day)
+        legacy_s = time.perf_counter() - started
+        started = time.perf_counter()
+        compact_aggregate(aggregator, cursor, day)
+        compact_s = time.perf_counter() - started
+        legacy_total += legacy_s
+        compact_total += compact_s
+        print(f"  {day}: {n_legacy:>7} rows  legacy {legacy_s * 1000:>8.1f}ms  compact {compact_s * 1000:>8.1f}ms")
+    if compact_total:
+        print(f"  → total {legacy_total:.3f}s vs {compact_total:.3f}s ({legacy_total / compact_total:.2f}x)")
+    conn.rollback()
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert click_logs to the compact row format")
+    parser.add_argument("--measure-days", type=int, default=7, help="Days to time before/after")
+    parser.add_argument("--measure-only", action="store_true", help="Skip the migration, just compare")
+    parser.add_argument("--drop-legacy", action="store_true", help="Drop click_logs_legacy afterwards")
+    args = parser.parse_args()
+
+    aggregator = DailyAggregator()
+    conn = aggregator.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        already_compact = column_type(cursor, "click_logs", "page_id") is not None
+        cursor.close()
+
+        if already_compact:
+            print("✓ click_logs already uses the compact row format")
+        elif not args.measure_only:
+            migrate(conn)
+
+        measure(aggregator, conn, args.measure_days)
+
+        if args.drop_legacy:
+            cursor = conn.cursor()
+            cursor.execute("DROP TABLE IF EXISTS click_logs_legacy")
+            conn.commit()
+            cursor.close()
+            print("🗑️  Dropped click_logs_legacy")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Convert click_logs.ip_hash from 16-char hex TEXT to a fixed-width BIGINT
+Legacy values are unkeyed SHA-256 hashes, reversible over the IPv4 space,
+so they are NULLed by default. Pass --keep-legacy to convert them instead
+(they are the first 64 bits of the digest, so the conversion is lossless).
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daily_aggregator import DailyAggregator
+
+
+def column_type(cursor):
+    cursor.execute("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'click_logs' AND column_name = 'ip_hash'
+    """)
+    row = cursor.fetchone()
+    return row["data_type"] if row else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shrink click_logs.ip_hash to BIGINT")
+    parser.add_argument("--keep-legacy", action="store_true",
+                        help="Convert existing unkeyed hashes instead of NULLing them")
+    args = parser.parse_args()
+
+    conn = DailyAggregator().get_db_connection()
+    cursor = conn.cursor()
+    try:
+        current = column_type(cursor)
+        if current == "bigint":
+            print("✓ click_logs.ip_hash is already BIGINT")
+            return
+
+        cursor.execute("SELECT pg_total_relation_size('click_logs') AS size")
+        before = cursor.fetchone()["size"]
+
+        if args.keep_legacy:
+            # 16 hex chars = 64 bits; anything malformed becomes NULL
+            using = """CASE WHEN ip_hash ~ '^[0-9a-f]{16}$'
+                            THEN ('x' || ip_hash)::bit(64)::bigint
+                            ELSE NULL END"""
+        else:
+            using = "NULL::bigint"
+
+        print(f"🔧 Converting click_logs.ip_hash {current} → BIGINT ...")
+        cursor.execute(f"ALTER TABLE click_logs ALTER COLUMN ip_hash TYPE BIGINT USING {using}")
+        conn.commit()
+
+        cursor.execute("SELECT pg_total_relation_size('click_logs') AS size")
+        after = cursor.fetchone()["size"]
+        print(f"✅ Done. click_logs size: {before / 1024:.0f} KB → {after / 1024:.0f} KB")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
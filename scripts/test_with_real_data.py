@@ -22,38 +22,17 @@ def get_db_connection():
         print(f"Database connection error: {e}")
         raise
 
-def create_daily_summary_table():
-    """Create daily_click_summary table if it doesn't exist"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS daily_click_summary (
-            id SERIAL PRIMARY KEY,
-            date DATE NOT NULL,
-            project_name TEXT NOT NULL,
-            total_clicks INT NOT NULL DEFAULT 0,
-            avg_time_on_page FLOAT,
-            device_split JSON,
-            top_referrers JSON,
-            repeat_visits INT NOT NULL DEFAULT 0,
-            tag TEXT,
-            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-            UNIQUE(date, project_name, tag)
-        );
-        """
-        
-        cursor.execute(create_table_query)
-        conn.commit()
-        print("✓ daily_click_summary table created/verified")
-        
-        cursor.close()
-        conn.close()
-        
-    except Exception as e:
-        print(f"Error creating daily_click_summary table: {e}")
-        raise
+def check_daily_summary_table():
+    """Make sure migrations have created daily_click_summary"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass('daily_click_summary') IS NOT NULL AS present")
+    present = cursor.fetchone()["present"]
+    cursor.close()
+    conn.close()
+    if not present:
+        raise RuntimeError("daily_click_summary is missing; run `python migrate.py` first")
+    print("✓ daily_click_summary table verified")
 
 def insert_sample_data():
     """Insert sample aggregated data for testing"""
@@ -198,8 +177,8 @@ if __name__ == "__main__":
     print("=" * 50)
     
     try:
-        # Create table if needed
-        create_daily_summary_table()
+        # Table comes from migrations
+        check_daily_summary_table()
         
         # Insert sample data
         insert_sample_data()
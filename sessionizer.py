@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Server-side sessionization for the Portfolio Click Tracker
+Turns click events into visits in the sessions table using an
+inactivity-gap rule, incrementally from the last processed click id. Events
+are read through click_logs_all, so a rebuild also covers days retention
+has moved to click_logs_archive (compacted days keep one row per pageview).
+
+The tracker's session_id lives in localStorage and is reused forever, so
+here it identifies the visitor; a new session starts whenever that visitor
+is inactive for longer than SESSION_GAP_MINUTES (midnight doesn't matter).
+Sessions belong to one project: a visitor's events on two tracked sites
+make two separate sessions.
+"""
+
+import os
+import sys
+from datetime import timedelta
+
+from psycopg2.extras import execute_values
+
+# Default inactivity gap that closes a session (GA-style 30 minutes)
+SESSION_GAP_MINUTES = int(os.getenv("SESSION_GAP_MINUTES", "30"))
+
+# Advisory lock key so only one sessionizer runs at a time across processes
+SESSIONIZER_LOCK_KEY = 4_031_001
+
+class Session:
+    """In-memory state of one visit while events are being applied"""
+
+    __slots__ = ("id", "visitor_id", "project_id", "started_at", "ended_at", "pageviews",
+                 "entry_page_id", "exit_page_id", "dirty")
+
+    def __init__(self, visitor_id, project_id, started_at, ended_at, pageviews=0,
+                 entry_page_id=None, exit_page_id=None, session_id=None):
+        self.id = session_id
+        self.visitor_id = visitor_id
+        self.project_id = project_id
+        self.started_at = started_at
+        self.ended_at = ended_at
+        self.pageviews = pageviews
+        self.entry_page_id = entry_page_id
+        self.exit_page_id = exit_page_id
+        self.dirty = session_id is None
+
+    def apply(self, event):
+        """Fold one click event into the session"""
+        page_id = event["page_id"]
+        # An arrival always starts a pageview; an exit only does if its arrival was never seen
+        if event["event_type"] == 1 or page_id != self.exit_page_id:
+            self.pageviews += 1
+        if self.entry_page_id is None or event["timestamp"] < self.started_at:
+            self.entry_page_id = page_id
+            self.started_at = min(self.started_at, event["timestamp"])
+        if event["timestamp"] >= self.ended_at:
+            self.ended_at = event["timestamp"]
+            self.exit_page_id = page_id
+        self.dirty = True
+
+    @property
+    def duration_seconds(self):
+        return int((self.ended_at - self.started_at).total_seconds())
+
+
+def sessionize_events(events, open_sessions, gap):
+    """
+    Apply events (sorted by visitor, project, timestamp) to open sessions; returns touched sessions
+    open_sessions maps (visitor_id, project_id) to that visitor's latest session in the project.
+    """
+    touched = []
+    current = {}
+    for event in events:
+        visitor = (event["session_id"], event["project_id"])
+        session = current.get(visitor) or open_sessions.get(visitor)
+        if session is None or event["timestamp"] - session.ended_at > gap:
+            session = Session(event["session_id"], event["project_id"], event["timestamp"], event["timestamp"])
+            touched.append(session)
+        elif session.id is not None and visitor not in current:
+            touched.append(session)
+        current[visitor] = session
+        session.apply(event)
+    return [s for s in touched if s.dirty]
+
+
+class Sessionizer:
+    """Incrementally builds the sessions table from new click_logs rows"""
+
+    def __init__(self, get_connection, gap_minutes=SESSION_GAP_MINUTES, batch_size=50_000):
+        self.get_connection = get_connection
+        self.gap = timedelta(minutes=gap_minutes)
+        self.batch_size = batch_size
+
+    def _load_open_sessions(self, cursor, visitor_ids):
+        """Latest session per visitor and project, which new events may extend"""
+        cursor.execute("""
+            SELECT DISTINCT ON (visitor_id, project_id)
+                   id, visitor_id, project_id, started_at, ended_at, pageviews, entry_page_id, exit_page_id
+            FROM sessions
+            WHERE visitor_id = ANY(%s::uuid[])
+            ORDER BY visitor_id, project_id, ended_at DESC
+        """, (list(visitor_ids),))
+        return {
+            (row["visitor_id"], row["project_id"]): Session(
+                row["visitor_id"], row["project_id"], row["started_at"], row["ended_at"],
+                row["pageviews"], row["entry_page_id"], row["exit_page_id"], session_id=row["id"])
+            for row in cursor.fetchall()
+        }
+
+    def _write_sessions(self, cursor, sessions):
+        updates = [s for s in sessions if s.id is not None]
+        inserts = [s for s in sessions if s.id is None]
+        if updates:
+            execute_values(cursor, """
+                UPDATE sessions AS s SET
+                    started_at = v.started_at, ended_at = v.ended_at, pageviews = v.pageviews,
+                    entry_page_id = v.entry_page_id, exit_page_id = v.exit_page_id,
+                    duration_seconds = v.duration_seconds
+                FROM (VALUES %s) AS v (id, started_at, ended_at, pageviews,
+                                       entry_page_id, exit_page_id, duration_seconds)
+                WHERE s.id = v.id
+            """, [(s.id, s.started_at, s.ended_at, s.pageviews, s.entry_page_id,
+                   s.exit_page_id, s.duration_seconds) for s in updates],
+                template="(%s, %s::timestamptz, %s::timestamptz, %s, %s::int, %s::int, %s)")
+        if inserts:
+            execute_values(cursor, """
+                INSERT INTO sessions (visitor_id, project_id, started_at, ended_at, pageviews,
+                                      entry_page_id, exit_page_id, duration_seconds)
+                VALUES %s
+            """, [(str(s.visitor_id), s.project_id, s.started_at, s.ended_at, s.pageviews,
+                   s.entry_page_id, s.exit_page_id, s.duration_seconds) for s in inserts],
+                template="(%s::uuid, %s, %s, %s, %s, %s, %s, %s)")
+        return len(inserts), len(updates)
+
+    def run_batch(self, conn):
+        """Process one batch of new events; returns the number of events consumed"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (SESSIONIZER_LOCK_KEY,))
+            if not cursor.fetchone()["locked"]:
+                print("⏭️  Sessionizer already running elsewhere, skipping")
+                conn.rollback()
+                return 0
+
+            cursor.execute("SELECT last_click_id FROM sessionizer_state WHERE id = 1 FOR UPDATE")
+            last_click_id = cursor.fetchone()["last_click_id"]
+
+            cursor.execute("""
+                SELECT id, timestamp, session_id, project_id, page_id, event_type,
+                       timestamp >= NOW() - interval '1 minute' AS recent
+                FROM click_logs_all
+                WHERE id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (last_click_id, self.batch_size))
+            events = cursor.fetchall()
+            # Stop at the first event under a minute old: ingest transactions still in
+            # flight may commit lower ids, and the watermark must not pass them
+            for i, event in enumerate(events):
+                if event["recent"]:
+                    events = events[:i]
+                    break
+            if not events:
+                conn.rollback()
+                return 0
+
+            events.sort(key=lambda e: (e["session_id"], e["project_id"], e["timestamp"]))
+            open_sessions = self._load_open_sessions(cursor, {e["session_id"] for e in events})
+            touched = sessionize_events(events, open_sessions, self.gap)
+            created, extended = self._write_sessions(cursor, touched)
+
+            cursor.execute("""
+                UPDATE sessionizer_state SET last_click_id = %s, updated_at = NOW() WHERE id = 1
+            """, (max(e["id"] for e in events),))
+            conn.commit()
+            print(f"🧩 Sessionized {len(events)} events: {created} new sessions, {extended} extended")
+            return len(events)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def run(self):
+        """Process all pending events in batches"""
+        conn = self.get_connection()
+        try:
+            total = 0
+            while True:
+                consumed = self.run_batch(conn)
+                total += consumed
+                if consumed < self.batch_size:
+                    return total
+        finally:
+            conn.close()
+
+    def rebuild(self):
+        """Drop all sessions and re-sessionize every click (archived days included) from the beginning"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("TRUNCATE sessions")
+            cursor.execute("UPDATE sessionizer_state SET last_click_id = 0, updated_at = NOW() WHERE id = 1")
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+        return self.run()
+
+
+def session_metrics_query(start_date, end_date, project=None):
+    """Query and params for session-level metrics over [start_date, end_date], optionally one project"""
+    project_sql = ""
+    params = (start_date, end_date)
+    if project:
+        project_sql = " AND project_id = (SELECT id FROM projects WHERE name = %s)"
+        params += (project,)
+    return """
+        WITH in_range AS (
+            SELECT visitor_id, project_id, pageviews, duration_seconds, started_at
+            FROM sessions
+            WHERE started_at >= %s::date AND started_at < %s::date + 1{project_sql}
+        )
+        SELECT count(*)::int AS sessions,
+               count(DISTINCT visitor_id)::int AS visitors,
+               round(coalesce(avg(duration_seconds), 0), 1)::float AS avg_duration_seconds,
+               round(coalesce(avg(pageviews), 0), 2)::float AS avg_pageviews,
+               round(coalesce(avg((pageviews <= 1)::int), 0), 4)::float AS bounce_rate,
+               count(*) FILTER (WHERE EXISTS (
+                   SELECT 1 FROM sessions prev
+                   WHERE prev.visitor_id = in_range.visitor_id
+                     AND prev.project_id IS NOT DISTINCT FROM in_range.project_id
+                     AND prev.ended_at < in_range.started_at
+               ))::int AS repeat_visits
+        FROM in_range
+    """.format(project_sql=project_sql), params
+
+
+def session_metrics(cursor, start_date, end_date, project=None):
+    """Session-level metrics for [start_date, end_date] from the sessions table"""
+    cursor.execute(*session_metrics_query(start_date, end_date, project))
+    return cursor.fetchone()
+
+
+if __name__ == "__main__":
+    from daily_aggregator import DailyAggregator
+
+    sessionizer = Sessionizer(DailyAggregator().get_db_connection)
+    if "--rebuild" in sys.argv:
+        print(f"♻️  Rebuilt sessions from {sessionizer.rebuild()} events")
+    else:
+        print(f"✅ Sessionized {sessionizer.run()} new events")
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Tests for aggregation run telemetry
+Peak memory is measured per run, not the process-lifetime peak. No database needed.
+"""
+
+import tracemalloc
+from datetime import date
+
+from aggregation_telemetry import RunTelemetry
+
+
+def test_peak_memory_covers_only_the_run():
+    tracemalloc.start()
+    try:
+        ballast = bytearray(8 * 1024 * 1024)
+        del ballast  # an earlier peak that a process-wide measure would keep reporting
+
+        telemetry = RunTelemetry(date(2025, 1, 1), engine="python")
+        rows = [bytes(1024) for _ in range(1024)]
+        telemetry.finish("success")
+        del rows
+
+        # The next run (e.g. the next backfilled day) starts from a fresh peak
+        quiet = RunTelemetry(date(2025, 1, 2), engine="python")
+        quiet.finish("success")
+    finally:
+        tracemalloc.stop()
+
+    assert 1024 <= telemetry.peak_memory_kb < 8 * 1024
+    assert quiet.peak_memory_kb < 512
+
+
+def test_no_peak_without_tracing():
+    telemetry = RunTelemetry(date(2025, 1, 1), engine="python")
+    telemetry.finish("success")
+    assert telemetry.peak_memory_kb is None
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Tests for bot and crawler filtering
+Covers the user agent rule and the per-IP behavioral rules. No database needed.
+"""
+
+from bot_filter import BehaviorTracker, BotFilter
+
+BROWSER_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+
+
+def test_crawler_user_agents_are_filtered():
+    bots = BotFilter()
+    assert bots.classify("Googlebot/2.1", 1, "home", 0, 0) == "user_agent"
+    assert bots.classify("", 1, "home", 0, 0) == "user_agent"
+    assert bots.classify(BROWSER_UA, 1, "home", 0, 0) is None
+
+
+def test_arrivals_from_a_shared_ip_are_not_a_zero_time_flood():
+    """A NAT IP sending many ordinary pageviews (each arrival has time_on_page 0) passes"""
+    tracker = BehaviorTracker(max_per_minute=100, max_zero_time_per_minute=5)
+    assert all(tracker.observe(1, f"/page-{i}", 0, minute=7) is None for i in range(50))
+
+
+def test_repeated_zero_time_events_for_one_page_are_a_flood():
+    tracker = BehaviorTracker(max_per_minute=100, max_zero_time_per_minute=5)
+    reasons = [tracker.observe(1, "home", 0, minute=7) for _ in range(7)]
+    assert reasons[:6] == [None] * 6
+    assert reasons[6] == "zero_time_flood"
+    # A new minute starts a new window
+    assert tracker.observe(1, "home", 0, minute=8) is None
+
+
+def test_rate_limit_per_ip():
+    tracker = BehaviorTracker(max_per_minute=3, max_zero_time_per_minute=100)
+    reasons = [tracker.observe(1, "home", 30, minute=7) for _ in range(4)]
+    assert reasons == [None, None, None, "rate"]
+    assert tracker.observe(2, "home", 30, minute=7) is None
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for chart payload downsampling
+Covers the LTTB point budget (ends and spikes kept) and the top-N +
+"(other)" folding used by bar and pie charts. No database needed.
+"""
+
+import math
+
+import pytest
+
+from downsample import OTHER, fold_other, lttb, top_n
+
+
+def series(n):
+    return [{"x": i, "y": math.sin(i / 10) * 100} for i in range(n)]
+
+
+def test_lttb_respects_budget_and_keeps_ends():
+    rows = series(1000)
+    sampled = lttb(rows, 50, x=lambda r: r["x"], y=lambda r: r["y"])
+    assert len(sampled) == 50
+    assert sampled[0] is rows[0] and sampled[-1] is rows[-1]
+    xs = [r["x"] for r in sampled]
+    assert xs == sorted(xs) and len(set(xs)) == len(xs)
+
+
+def test_lttb_keeps_a_single_spike():
+    rows = [{"x": i, "y": 1} for i in range(500)]
+    rows[321]["y"] = 10_000
+    sampled = lttb(rows, 20, x=lambda r: r["x"], y=lambda r: r["y"])
+    assert rows[321] in sampled
+
+
+def test_lttb_returns_short_series_unchanged():
+    rows = series(10)
+    assert lttb(rows, 50, x=lambda r: r["x"], y=lambda r: r["y"]) == rows
+    with pytest.raises(ValueError):
+        lttb(series(100), 2, x=lambda r: r["x"], y=lambda r: r["y"])
+
+
+def test_top_n_folds_the_rest_into_other():
+    rows = [{"device": f"d{i}", "pageviews": 10 * i} for i in range(1, 11)]
+    folded = top_n(rows, 4, "device", "pageviews")
+    assert [r["device"] for r in folded] == ["d10", "d9", "d8", OTHER]
+    assert sum(r["pageviews"] for r in folded) == sum(r["pageviews"] for r in rows)
+    assert top_n(rows[:3], 4, "device", "pageviews") == rows[:3]
+
+
+def test_fold_other_skips_empty_remainder():
+    top = [{"page": "/a", "clicks": 5}, {"page": "/b", "clicks": 3}]
+    assert fold_other(top, 8, "page", "clicks") == top
+    assert fold_other(top, 10, "page", "clicks")[-1] == {"page": OTHER, "clicks": 2}
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Tests for ingest-side event deduplication
+Covers the time_on_page tolerance and undoing events that failed to
+store. No database needed.
+"""
+
+from ingest_dedup import IngestDeduplicator
+
+KEY = ("portfolio", "session-1", "home", "exit")
+
+
+def test_repeat_within_tolerance_is_a_duplicate():
+    dedup = IngestDeduplicator(ttl=600, tolerance=5, clock=lambda: 0)
+    assert not dedup.is_duplicate(KEY, 10)
+    assert dedup.is_duplicate(KEY, 14)
+    assert not dedup.is_duplicate(KEY, 30)
+
+
+def test_forget_undoes_only_the_failed_event():
+    dedup = IngestDeduplicator(ttl=600, tolerance=5, clock=lambda: 0)
+    assert not dedup.is_duplicate(KEY, 10)
+    assert not dedup.is_duplicate(KEY, 30)
+    dedup.forget(KEY, 30)
+    # The stored 10s event still dedupes, the failed 30s one can be retried
+    assert dedup.is_duplicate(KEY, 12)
+    assert not dedup.is_duplicate(KEY, 30)
+
+    dedup.forget(KEY, 10)  # superseded by the stored 30s event: nothing to undo
+    assert dedup.is_duplicate(KEY, 30)
+
+
+def test_forget_drops_a_key_its_event_created():
+    dedup = IngestDeduplicator(ttl=600, tolerance=5, clock=lambda: 0)
+    assert not dedup.is_duplicate(KEY, 0)
+    dedup.forget(KEY, None)
+    assert len(dedup) == 0
+    assert not dedup.is_duplicate(KEY, 0)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory live traffic counters
+Covers exact counts under concurrent updates and the memory bounds
+(rolling window and per-bucket key cap). No database needed.
+"""
+
+import threading
+
+from live_counters import LiveCounters, OTHER, referrer_group
+
+MOBILE_UA = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148"
+DESKTOP_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+
+
+def test_concurrent_records_are_not_lost():
+    """Counts stay exact when many threads record into the same minutes"""
+    counters = LiveCounters(window_minutes=60)
+    threads_count, per_thread = 8, 2000
+    start = threading.Barrier(threads_count)
+
+    def worker(n):
+        start.wait()
+        for i in range(per_thread):
+            ua = MOBILE_UA if i % 2 else DESKTOP_UA
+            counters.record(f"/project-{n % 4}", "https://www.linkedin.com/feed", ua, minute=1000 + i % 5)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(threads_count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    totals = counters.totals(now=1004)
+    expected = threads_count * per_thread
+    assert totals["pageviews"] == expected
+    assert sum(count for _, count in totals["pages"]) == expected
+    assert dict(totals["referrers"]) == {"linkedin.com": expected}
+    assert dict(totals["devices"]) == {"Mobile": expected // 2, "Desktop": expected // 2}
+    assert len(totals["per_minute"]) == 5
+
+
+def test_concurrent_reads_during_writes():
+    """totals() and to_dict() can run while other threads keep recording"""
+    counters = LiveCounters(window_minutes=30)
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        minute = 0
+        while not stop.is_set():
+            counters.record("home", None, DESKTOP_UA, minute=minute)
+            minute += 1
+
+    def reader():
+        try:
+            for _ in range(200):
+                counters.totals(now=10**9)
+                counters.to_dict()
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    w = threading.Thread(target=writer)
+    w.start()
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for r in readers:
+        r.start()
+    for r in readers:
+        r.join()
+    stop.set()
+    w.join()
+    assert not errors
+    assert counters.bucket_count <= 30
+
+
+def test_window_evicts_old_buckets():
+    """Never more than window_minutes buckets, however long the process runs"""
+    counters = LiveCounters(window_minutes=1440)
+    for minute in range(5000):
+        counters.record("home", None, DESKTOP_UA, minute=minute)
+    assert counters.bucket_count == 1440
+    totals = counters.totals(now=4999)
+    assert totals["pageviews"] == 1440
+
+    # Late events older than the window are ignored rather than resurrecting buckets
+    counters.record("home", None, DESKTOP_UA, minute=10)
+    assert counters.bucket_count == 1440
+
+
+def test_distinct_keys_per_bucket_are_capped():
+    """Unbounded page names fold into (other) once a bucket hits max_keys"""
+    counters = LiveCounters(window_minutes=10, max_keys=50)
+    for i in range(10_000):
+        counters.record(f"/page-{i}", f"https://site-{i}.example/", DESKTOP_UA, minute=1)
+
+    snapshot = counters.to_dict()["buckets"]["1"]
+    assert len(snapshot["pages"]) == 50
+    assert len(snapshot["referrers"]) == 50
+    assert snapshot["pages"][OTHER] == 10_000 - 49
+    assert sum(snapshot["pages"].values()) == 10_000
+
+
+def test_snapshot_round_trip_skips_expired_buckets():
+    """A restored snapshot keeps in-window buckets and drops the rest"""
+    counters = LiveCounters(window_minutes=60)
+    counters.record("home", "https://google.com/search", MOBILE_UA, minute=100)
+    counters.record("/blog", None, DESKTOP_UA, minute=150)
+
+    restored = LiveCounters(window_minutes=60)
+    restored.load(counters.to_dict(), now=170)
+    totals = restored.totals(now=170)
+    assert totals["pageviews"] == 1
+    assert dict(totals["pages"]) == {"/blog": 1}
+
+
+def test_snapshot_replace_drops_current_counts():
+    """Restoring with replace=True swaps the counters for the snapshot instead of adding to them"""
+    saved = LiveCounters(window_minutes=60)
+    saved.record("home", None, DESKTOP_UA, minute=150)
+
+    counters = LiveCounters(window_minutes=60)
+    counters.record("home", None, DESKTOP_UA, minute=150)
+    counters.record("/blog", None, DESKTOP_UA, minute=160)
+    counters.load(saved.to_dict(), now=170, replace=True)
+    totals = counters.totals(now=170)
+    assert totals["pageviews"] == 1
+    assert dict(totals["pages"]) == {"home": 1}
+
+
+def test_referrer_group():
+    assert referrer_group(None) == "Direct Traffic"
+    assert referrer_group("null") == "Direct Traffic"
+    assert referrer_group("https://www.LinkedIn.com/in/someone") == "linkedin.com"
+    assert referrer_group("http://news.ycombinator.com/item?id=1") == "news.ycombinator.com"
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for page transition counting and funnels
+Transitions are built from DailyAggregator's deduped pageviews, and
+funnels merge the resulting matrices. No database needed.
+"""
+
+from datetime import datetime, timedelta
+
+from daily_aggregator import DailyAggregator
+from path_analysis import ENTRY, ENTRY_EXIT, EXIT, count_transitions, funnel, merge_transitions, neighbours
+
+T0 = datetime(2025, 1, 1, 12, 0)
+
+
+def click(session, page, minute, time_on_page=0):
+    return {"project_id": 1, "session_id": session, "page_id": page, "referrer_id": None,
+            "user_agent_id": 1, "time_on_page": time_on_page, "timestamp": T0 + timedelta(minutes=minute)}
+
+
+def dedupe(clicks):
+    # No database needed to dedupe, so skip __init__'s connection settings
+    return DailyAggregator.__new__(DailyAggregator)._dedupe_pageviews(clicks)[1]
+
+
+def test_transitions_follow_arrival_order():
+    clicks = [
+        click("a", 1, 0), click("a", 1, 3, time_on_page=180),   # arrival + exit of page 1
+        click("a", 2, 4), click("a", 3, 6),
+        click("b", 2, 1), click("b", 3, 2),
+        click("c", 1, 5),
+    ]
+    counts = count_transitions(*dedupe(clicks))
+    assert counts == {
+        (ENTRY_EXIT, 1): 2, (ENTRY_EXIT, 2): 1,
+        (1, 2): 1, (2, 3): 2,
+        (3, ENTRY_EXIT): 2, (1, ENTRY_EXIT): 1,
+    }
+
+
+def test_compacted_rows_are_ordered_by_arrival():
+    """Retention keeps one row per pageview stamped at its exit; the order is still by arrival"""
+    clicks = [
+        click("a", 1, 10, time_on_page=600),   # arrived at minute 0, left at minute 10
+        click("a", 2, 3, time_on_page=60),     # arrived at minute 2 (opened in another tab)
+    ]
+    assert count_transitions(*dedupe(clicks)) == {(ENTRY_EXIT, 1): 1, (1, 2): 1, (2, ENTRY_EXIT): 1}
+
+
+def test_revisits_count_once_at_first_arrival():
+    clicks = [click("a", 1, 0), click("a", 2, 1), click("a", 1, 2)]
+    assert count_transitions(*dedupe(clicks)) == {(ENTRY_EXIT, 1): 1, (1, 2): 1, (2, ENTRY_EXIT): 1}
+
+
+def test_funnel_merges_days_and_normalizes_pages():
+    rows = [
+        # day 1 ("projects" and "/projects" are the same page once labelled)
+        {"from_page": None, "to_page": "home", "transitions": 10},
+        {"from_page": "home", "to_page": "projects", "transitions": 6},
+        {"from_page": "home", "to_page": None, "transitions": 4},
+        {"from_page": "projects", "to_page": "/contact", "transitions": 3},
+        {"from_page": "projects", "to_page": None, "transitions": 3},
+        {"from_page": "/contact", "to_page": None, "transitions": 3},
+        # day 2
+        {"from_page": None, "to_page": "home", "transitions": 10},
+        {"from_page": "home", "to_page": "/projects", "transitions": 4},
+        {"from_page": "home", "to_page": None, "transitions": 6},
+        {"from_page": "/projects", "to_page": None, "transitions": 4},
+    ]
+    matrix = merge_transitions(rows)
+    steps = funnel(matrix, ["home", "/projects", "/contact"])
+    assert [s["pageviews"] for s in steps] == [20, 10, 3]
+    assert [s["step_rate"] for s in steps] == [None, 0.5, 0.3]
+    assert [s["reached"] for s in steps] == [20, 10, 3]
+
+    paths = neighbours(matrix, "/projects")
+    assert paths["previous"] == [{"page": "home", "transitions": 10}]
+    assert paths["next"] == [{"page": EXIT, "transitions": 7}, {"page": "/contact", "transitions": 3}]
+    assert neighbours(matrix, ENTRY)["next"] == [{"page": "home", "transitions": 20}]
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Tests for the analytics response cache
+Covers single-flight hits and that failed computations leave nothing
+behind. No database needed.
+"""
+
+import pytest
+
+from response_cache import ResponseCache
+
+
+def test_second_request_is_a_hit():
+    cache = ResponseCache(ttl=60)
+    first = cache.get_or_compute("k", lambda: {"a": 1})
+    assert cache.get_or_compute("k", lambda: {"a": 2}) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_failed_compute_keeps_no_key_lock():
+    cache = ResponseCache(ttl=60)
+
+    def fail():
+        raise RuntimeError("database down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", fail)
+    assert cache._key_locks == {}
+
+    cache.get_or_compute("k", lambda: {"a": 1})
+    cache.clear()
+    assert cache._key_locks == {}
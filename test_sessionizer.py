@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests for server-side sessionization
+Covers the inactivity-gap split, visits spanning midnight, extending a
+stored session and keeping projects apart. No database needed.
+"""
+
+from datetime import datetime, timedelta
+
+from sessionizer import Session, sessionize_events
+
+GAP = timedelta(minutes=30)
+VISITOR = "5b0e7a8c-0000-4000-8000-000000000001"
+
+
+def event(minute, page, event_type=1, project=1, start=datetime(2025, 1, 1, 23, 0)):
+    return {"session_id": VISITOR, "project_id": project, "page_id": page,
+            "event_type": event_type, "timestamp": start + timedelta(minutes=minute)}
+
+
+def test_gap_longer_than_threshold_starts_a_new_session():
+    events = [event(0, 1), event(10, 2), event(45, 1), event(50, 3)]
+    first, second = sessionize_events(events, {}, GAP)
+    assert (first.pageviews, first.entry_page_id, first.exit_page_id) == (2, 1, 2)
+    assert (second.pageviews, second.entry_page_id, second.exit_page_id) == (2, 1, 3)
+    assert first.duration_seconds == 600 and second.duration_seconds == 300
+
+
+def test_visit_spanning_midnight_stays_one_session():
+    events = [event(50, 1), event(65, 2), event(80, 2, event_type=2)]
+    (session,) = sessionize_events(events, {}, GAP)
+    assert session.started_at.date() != session.ended_at.date()
+    assert session.pageviews == 2
+    assert session.duration_seconds == 30 * 60
+
+
+def test_new_events_extend_the_stored_session():
+    stored = Session(VISITOR, 1, event(0, 1)["timestamp"], event(5, 1)["timestamp"],
+                     pageviews=1, entry_page_id=1, exit_page_id=1, session_id=7)
+    (session,) = sessionize_events([event(20, 2)], {(VISITOR, 1): stored}, GAP)
+    assert session is stored
+    assert (session.pageviews, session.exit_page_id, session.duration_seconds) == (2, 2, 20 * 60)
+
+
+def test_projects_get_separate_sessions():
+    events = [event(0, 1, project=1), event(5, 1, project=1), event(2, 4, project=2)]
+    events.sort(key=lambda e: (e["session_id"], e["project_id"], e["timestamp"]))
+    sessions = sessionize_events(events, {}, GAP)
+    assert sorted((s.project_id, s.pageviews) for s in sessions) == [(1, 2), (2, 1)]